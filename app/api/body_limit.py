@@ -0,0 +1,60 @@
+from starlette.responses import JSONResponse
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class BodyLimitMiddleware:
+    def __init__(self, app, path: str, max_bytes: int, detail: str):
+        """
+        Pure ASGI middleware capping the request body of POSTs to one path.
+        A declared Content-Length over max_bytes is refused before anything
+        is read; chunked bodies are counted as they arrive and refused once
+        they pass the cap. Either way the client gets 413 with detail.
+        Other requests pass through untouched (no BaseHTTPMiddleware
+        wrapping of every request and response).
+        """
+        self.app = app
+        self.path = path
+        self.max_bytes = max_bytes
+        self.detail = detail
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            await self._reject(scope, receive, send)
+            return
+
+        received = 0
+        exceeded = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise BodyTooLarge()
+            return message
+
+        async def guarded_send(message):
+            # The body parser may turn the error into its own response; the 413 replaces it
+            if not exceeded:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded:
+            await self._reject(scope, receive, send)
+
+    async def _reject(self, scope, receive, send):
+        await JSONResponse(status_code=413, content={"detail": self.detail})(scope, receive, send)
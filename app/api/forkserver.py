@@ -0,0 +1,57 @@
+import logging
+import os
+import signal
+import socket
+from typing import List
+
+import uvicorn
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def serve_forked(app, host: str, port: int, workers: int):
+    """
+    Pre-fork server: bind once, then fork workers that all accept on the
+    shared socket. Anything loaded in the parent before this call (e.g. the
+    embedding model) is shared copy-on-write, unlike uvicorn --workers which
+    spawns fresh interpreters that each load their own copy.
+    """
+    sock = bind_socket(host, port)
+    children: List[int] = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            server = uvicorn.Server(uvicorn.Config(app, log_level="info"))
+            server.run(sockets=[sock])
+            os._exit(0)
+        children.append(pid)
+    logging.info(f"🚀 Serving on {host}:{port} with {workers} forked workers.")
+
+    def forward(signum, _frame):
+        for pid in children:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for pid in children:
+        while True:
+            try:
+                os.waitpid(pid, 0)
+                break
+            except InterruptedError:
+                continue
+            except ChildProcessError:
+                break
+    sock.close()
@@ -0,0 +1,167 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Optional
+
+from app.utils.metrics import profile_capture
+
+# Stages reported by DocumentProcessor.process_file, in pipeline order
+PIPELINE_STAGES = ["loading", "chunking", "embedding", "storing"]
+
+
+class JobQueueFull(Exception):
+    """Raised when the ingestion queue is at capacity."""
+
+
+class IngestionJob:
+    def __init__(self, job_id: str, filename: str, path: str, source: Optional[str] = None, profile: bool = False,
+                 content_hash: Optional[str] = None, data: Optional[bytes] = None, doc_id: Optional[str] = None):
+        self.id = job_id
+        self.filename = filename
+        self.path = path
+        self.source = source
+        self.profile = profile
+        self.content_hash = content_hash
+        # File content already in memory (small uploads); released once the job has run
+        self.data = data
+        # Stored document this file replaces, if any
+        self.doc_id = doc_id
+        self.profile_paths: Dict[str, str] = {}
+        self.status = "queued"
+        self.stage: Optional[str] = None
+        self.stage_timings: Dict[str, float] = {}
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.future: Optional[Future] = None
+        self._stage_started: Optional[float] = None
+
+    def enter_stage(self, stage: str):
+        """Close the timing of the current stage and start the next one."""
+        self.close_stage()
+        self.stage = stage
+        self._stage_started = time.perf_counter()
+
+    def close_stage(self):
+        if self.stage is not None and self._stage_started is not None:
+            self.stage_timings[self.stage] = time.perf_counter() - self._stage_started
+        self._stage_started = None
+
+    def progress(self) -> Dict[str, Any]:
+        if self.status == "completed":
+            fraction = 1.0
+        elif self.stage in PIPELINE_STAGES:
+            fraction = PIPELINE_STAGES.index(self.stage) / len(PIPELINE_STAGES)
+        else:
+            fraction = 0.0
+        now = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": fraction,
+            "elapsed_seconds": now - (self.started_at or self.created_at),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = self.progress()
+        data.update({
+            "filename": self.filename,
+            "stage_timings": dict(self.stage_timings),
+            "queued_seconds": (self.started_at or time.time()) - self.created_at,
+            "result": self.result,
+            "error": self.error,
+        })
+        if self.profile:
+            data["profile"] = self.profile_paths
+        return data
+
+
+class JobManager:
+    def __init__(self, process_file: Callable[..., tuple], max_workers: int = 2, max_pending: int = 16,
+                 history_size: int = 1000):
+        """
+        Bounded in-process ingestion queue.
+        At most max_workers files are processed at once and at most max_pending
+        jobs may be queued or running, so a burst of uploads cannot grab the
+        threadpool that /query depends on.
+        """
+        self.process_file = process_file
+        self.max_pending = max_pending
+        self.history_size = history_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._jobs = OrderedDict()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, path: str, filename: str, source: Optional[str] = None, profile: bool = False,
+               content_hash: Optional[str] = None, data: Optional[bytes] = None,
+               doc_id: Optional[str] = None) -> IngestionJob:
+        """
+        Queue a file for ingestion. content_hash and data (the file content,
+        if already in memory) are passed on so the file is not read again.
+        doc_id names a stored document the file replaces.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"Ingestion queue is full ({self.max_pending} jobs pending).")
+            self._pending += 1
+            job = IngestionJob(str(uuid.uuid4()), filename, path, source, profile, content_hash, data, doc_id)
+            self._jobs[job.id] = job
+            self._trim_history()
+
+        job.future = self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts = {"pending": self._pending, "max_pending": self.max_pending}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
+
+    def _run(self, job: IngestionJob) -> Dict[str, Any]:
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            # Profiles are taken on the worker thread that runs the pipeline
+            with profile_capture(f"ingest-{job.id}") if job.profile else nullcontext({}) as paths:
+                job.profile_paths = paths  # Filled in when the capture ends, even if the job fails
+                doc_id, preview = self.process_file(job.path, on_stage=job.enter_stage, source=job.source,
+                                                    content_hash=job.content_hash, data=job.data, doc_id=job.doc_id)
+            job.close_stage()
+            job.result = {"doc_id": doc_id, "filename": job.filename, "preview": preview}
+            job.status = "completed"
+            return job.result
+        except Exception as e:
+            job.close_stage()
+            job.error = str(e)
+            job.status = "failed"
+            logging.error(f"❌ Ingestion job {job.id} failed: {str(e)}")
+            raise
+        finally:
+            job.finished_at = time.time()
+            job.data = None
+            with self._lock:
+                self._pending -= 1
+
+    def _trim_history(self):
+        """Forget the oldest finished jobs once the history limit is reached."""
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= self.history_size:
+                break
+            if self._jobs[job_id].status in ("completed", "failed"):
+                del self._jobs[job_id]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
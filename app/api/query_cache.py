@@ -0,0 +1,117 @@
+import hashlib
+import unicodedata
+from threading import Lock
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+
+from app.utils.lru import LRUCache
+
+
+def normalize_query(text: str) -> str:
+    """Queries differing only in whitespace or Unicode composition share cache entries."""
+    return unicodedata.normalize("NFC", " ".join(text.split()))
+
+
+class CacheLevel:
+    def __init__(self, maxsize: int, ttl: Optional[float]):
+        """
+        One cache level with hit/miss counters. The cost of each miss is
+        recorded so hits can be credited with the average time they saved.
+        """
+        self.entries = LRUCache(maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.miss_seconds = 0.0
+        self.recorded_misses = 0
+        self._lock = Lock()
+
+    def get(self, key: Hashable) -> Any:
+        value = self.entries.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def invalidate(self, key: Hashable):
+        """Drop an entry that get() just returned but that turned out to be stale; counts as a miss."""
+        self.entries.pop(key)
+        with self._lock:
+            self.hits -= 1
+            self.misses += 1
+            self.invalidated += 1
+
+    def put(self, key: Hashable, value: Any, seconds: float):
+        self.entries.put(key, value)
+        with self._lock:
+            self.miss_seconds += seconds
+            self.recorded_misses += 1
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        avg_miss = self.miss_seconds / self.recorded_misses if self.recorded_misses else 0.0
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidated": self.invalidated,
+            "avg_miss_ms": avg_miss * 1000,
+            "estimated_seconds_saved": self.hits * avg_miss,
+        }
+
+
+class QueryCache:
+    def __init__(self, embedding_size: int = 10000, result_size: int = 10000, embedding_ttl: float = 3600.0,
+                 result_ttl: float = 300.0):
+        """
+        Two-level /query cache.
+        Level 1 maps normalized query text to its embedding. Level 2 maps
+        (embedding, top_k, mode, filters) to a search result and is tied to
+        the collection generation: a result computed before the latest write
+        is treated as a miss.
+        """
+        self.embeddings = CacheLevel(embedding_size, embedding_ttl)
+        self.results = CacheLevel(result_size, result_ttl)
+
+    def get_embedding(self, query: str) -> Optional[List[float]]:
+        return self.embeddings.get(normalize_query(query))
+
+    def put_embedding(self, query: str, embedding: List[float], seconds: float):
+        self.embeddings.put(normalize_query(query), embedding, seconds)
+
+    @staticmethod
+    def result_key(query_embedding: Optional[List[float]], top_k: int, mode: str, query: str,
+                   doc_ids: Optional[List[str]] = None) -> Hashable:
+        """
+        Key of a search result. Vector results depend only on the embedding;
+        lexical and hybrid results also depend on the query text.
+        """
+        embedding_digest = (
+            hashlib.blake2b(np.asarray(query_embedding, dtype=np.float32).tobytes(), digest_size=16).hexdigest()
+            if query_embedding is not None else None
+        )
+        text = normalize_query(query) if mode != "vector" else None
+        return (embedding_digest, top_k, mode, text, tuple(sorted(doc_ids)) if doc_ids else None)
+
+    def get_result(self, key: Hashable, generation: int) -> Optional[Dict[str, Any]]:
+        entry = self.results.get(key)
+        if entry is None:
+            return None
+        entry_generation, result = entry
+        if entry_generation != generation:
+            self.results.invalidate(key)
+            return None
+        return result
+
+    def put_result(self, key: Hashable, generation: int, result: Dict[str, Any], seconds: float):
+        self.results.put(key, (generation, result), seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "embeddings": self.embeddings.stats(),
+            "results": self.results.stats(),
+        }
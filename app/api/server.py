@@ -1,34 +1,203 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-import shutil
+import asyncio
+import hashlib
 import os
+import time
 import uuid
-from app.main import DocumentProcessor
+from contextlib import asynccontextmanager, nullcontext
+from typing import List, NamedTuple, Optional
+from app.main import DocumentProcessor, SEARCH_MODES, create_embedder
+from app.api.body_limit import BodyLimitMiddleware
+from app.api.jobs import JobManager, JobQueueFull
+from app.api.query_cache import QueryCache
+from app.api.warmup import ComponentLoader, ComponentNotReady
+from app.embeddings.batcher import QueryBatcher
+from app.utils.metrics import REGISTRY, StageTrace, memory_stats, profile_capture
+
+# Set before workers fork (PRELOAD_MODEL=1) so they share the model weights copy-on-write
+PRELOADED_EMBEDDER = None
+# Seconds a request waits for the processor to finish warming up before a 503
+READY_TIMEOUT = float(os.getenv("READY_TIMEOUT", "30"))
+
+def build_processor() -> DocumentProcessor:
+    """Create the pipeline (model, vector store, SQLite) and run one warm-up encode."""
+    processor = DocumentProcessor(
+        chunking=os.getenv("CHUNKING_MODE", "chars"),
+        embedding_backend=os.getenv("EMBEDDING_BACKEND", "torch"),
+        embedder=PRELOADED_EMBEDDER,
+    )
+    processor.embedder.embed_queries(["warm-up"])
+    return processor
+
+# The processor is built on a background thread so the server binds at once
+processor_loader = ComponentLoader(build_processor, name="DocumentProcessor")
+
+async def get_processor() -> DocumentProcessor:
+    """The processor, waiting up to READY_TIMEOUT for warm-up; 503 if it is not available."""
+    if processor_loader.ready:
+        return processor_loader.component
+    try:
+        return await run_in_threadpool(processor_loader.get, READY_TIMEOUT)
+    except ComponentNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    processor_loader.start()
+    yield
+    jobs.shutdown()
 
 app = FastAPI(
     title="Arabic AI Document Parser API",
     description="A high-performance API for parsing, chunking, and searching Arabic documents with diacritics support.",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan,
 )
-processor = DocumentProcessor()
 
 # Ensure uploads directory exists
 UPLOAD_DIR = "data/uploads"
 if not os.path.exists(UPLOAD_DIR):
     os.makedirs(UPLOAD_DIR)
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # Stream uploads to disk 1 MB at a time
+# Larger uploads are rejected with 413
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "100")) * 1024 * 1024)
+# Uploads up to this size are parsed from memory instead of being read back from disk
+UPLOAD_MEMORY_BYTES = int(float(os.getenv("UPLOAD_MEMORY_MB", "8")) * 1024 * 1024)
+# Room for multipart boundaries and part headers around the file in a request body
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Ingestion runs on its own bounded pool so uploads cannot starve /query
+jobs = JobManager(
+    lambda *args, **kwargs: processor_loader.get().process_file(*args, **kwargs),
+    max_workers=int(os.getenv("INGEST_WORKERS", "2")),
+    max_pending=int(os.getenv("INGEST_MAX_PENDING", "16")),
+)
+
+# Concurrent /query calls share one model call per micro-batch
+query_batcher = QueryBatcher(
+    lambda texts: processor_loader.get().embedder.embed_queries(texts),
+    max_batch_size=int(os.getenv("QUERY_BATCH_MAX_SIZE", "32")),
+    max_wait_ms=float(os.getenv("QUERY_BATCH_WAIT_MS", "5")),
+)
+
+# Repeated queries skip re-embedding; results are reused until the next ingest
+query_cache = QueryCache(
+    embedding_size=int(os.getenv("QUERY_CACHE_EMBEDDINGS", "10000")),
+    result_size=int(os.getenv("QUERY_CACHE_RESULTS", "10000")),
+    embedding_ttl=float(os.getenv("QUERY_CACHE_EMBEDDING_TTL", "3600")),
+    result_ttl=float(os.getenv("QUERY_CACHE_RESULT_TTL", "300")),
+)
+
+# Retrieval mode used when a /query request does not choose one
+SEARCH_MODE = os.getenv("SEARCH_MODE", "vector")
+# Most queries accepted by one /query/batch request
+QUERY_BATCH_LIMIT = int(os.getenv("QUERY_BATCH_LIMIT", "1000"))
+
 class QueryRequest(BaseModel):
     query: str
     top_k: int = 3
+    mode: str = SEARCH_MODE
+    doc_ids: Optional[List[str]] = None
+    profile: bool = False  # Capture a cProfile/tracemalloc profile of the search (bypasses the result cache)
+
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    top_k: int = 3
+    mode: str = SEARCH_MODE
+    # Optional document filter per query (same length as queries, null for no filter)
+    doc_ids: Optional[List[Optional[List[str]]]] = None
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds MAX_UPLOAD_BYTES."""
+
+    def __init__(self):
+        super().__init__(f"File too large. The limit is {MAX_UPLOAD_BYTES / (1024 * 1024):g} MB.")
+
+
+class SpooledUpload(NamedTuple):
+    """An upload read to the end: in memory (data) or in a temporary file (path)."""
+    content_hash: str
+    size: int
+    data: Optional[bytes] = None
+    path: Optional[str] = None
+
+
+# Oversized bodies are refused before FastAPI parses (and spools) the multipart form
+app.add_middleware(
+    BodyLimitMiddleware,
+    path="/upload",
+    max_bytes=MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+    detail=str(UploadTooLarge()),
+)
+
+
+def write_file(path: str, data: bytes):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+async def spool_upload(file: UploadFile, part_path: str) -> SpooledUpload:
+    """
+    Read an upload in UPLOAD_CHUNK_SIZE pieces, hashing them as they arrive.
+    Content stays in memory up to UPLOAD_MEMORY_BYTES and is streamed to
+    part_path beyond that (the caller removes part_path when done with it).
+    Raises UploadTooLarge as soon as MAX_UPLOAD_BYTES is passed.
+    """
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise UploadTooLarge()
+    digest = hashlib.sha256()
+    pieces = []
+    size = 0
+    spill = None
+    try:
+        while True:
+            data = await file.read(UPLOAD_CHUNK_SIZE)
+            if not data:
+                break
+            size += len(data)
+            if size > MAX_UPLOAD_BYTES:
+                raise UploadTooLarge()
+            digest.update(data)
+            # Disk writes run on the threadpool so they do not block the event loop
+            if spill is None and size > UPLOAD_MEMORY_BYTES:
+                spill = await run_in_threadpool(open, part_path, "wb")
+                await run_in_threadpool(spill.writelines, pieces)
+                pieces = []
+            if spill is not None:
+                await run_in_threadpool(spill.write, data)
+            else:
+                pieces.append(data)
+    finally:
+        if spill is not None:
+            await run_in_threadpool(spill.close)
+    if spill is not None:
+        return SpooledUpload(digest.hexdigest(), size, path=part_path)
+    return SpooledUpload(digest.hexdigest(), size, data=b"".join(pieces))
 
 @app.post("/upload")
-async def upload_document(file: UploadFile = File(...)):
+async def upload_document(file: UploadFile = File(...), replace_doc_id: Optional[str] = Form(None),
+                          wait: bool = True, profile: bool = False):
     """
     Upload and process a document (PDF, DOCX, TXT).
+    With wait=false the file is queued and a job id is returned immediately;
+    poll /jobs/{job_id} for the result.
+    With profile=true a CPU and allocation profile of the ingestion is
+    written to PROFILE_DIR; the paths are listed in the job status.
+    The upload is hashed while it is received: content that is already
+    stored is answered at once without parsing, and files are kept under
+    their hash so repeated uploads are not stored twice. Files up to
+    UPLOAD_MEMORY_MB are parsed from memory; uploads over MAX_UPLOAD_MB
+    are rejected with 413.
+    Every upload is a new document unless the form field replace_doc_id
+    names a stored document: that one is then updated in place, only
+    re-embedding the chunks that changed. Filenames never identify
+    documents (two users may both upload report.pdf).
     """
     file_ext = os.path.splitext(file.filename)[1].lower()
     if file_ext not in [".pdf", ".docx", ".txt"]:
@@ -41,21 +210,56 @@ async def upload_document(file: UploadFile = File(...)):
         if not (file_ext == ".txt" and file.content_type.startswith("text/")):
              print(f"Warning: Mime type {file.content_type} does not strictly match expected but extension is valid. Proceeding with caution.")
 
-    file_id = str(uuid.uuid4())
-    save_path = os.path.join(UPLOAD_DIR, f"{file_id}{file_ext}")
-
+    processor = await get_processor()
+    if replace_doc_id and await run_in_threadpool(processor.sql_db.get_document_metadata, replace_doc_id) is None:
+        raise HTTPException(status_code=404, detail=f"Document not found: {replace_doc_id}")
+    part_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}.part")
     try:
-        with open(save_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Run heavy processing in a separate thread
-        doc_id, preview = await run_in_threadpool(processor.process_file, save_path)
-        
-        return {"message": "File processed successfully", "doc_id": doc_id, "filename": file.filename, "preview": preview}
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        try:
+            upload = await spool_upload(file, part_path)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+
+        # Known content: answer from the stored document before any parsing
+        duplicate = await run_in_threadpool(processor.find_duplicate, upload.content_hash)
+        if duplicate and replace_doc_id in (None, duplicate[0]):
+            doc_id, preview = duplicate
+            return {"message": "File already processed", "doc_id": doc_id, "filename": file.filename,
+                    "preview": preview, "duplicate": True}
+
+        save_path = os.path.join(UPLOAD_DIR, f"{upload.content_hash}{file_ext}")
+        try:
+            if upload.path:
+                await run_in_threadpool(os.replace, upload.path, save_path)
+            else:
+                await run_in_threadpool(write_file, save_path, upload.data)
+
+            # Run heavy processing on the bounded ingestion pool
+            # Uploads are keyed by content, so a new name or new content is a new document
+            job = jobs.submit(save_path, file.filename, source=f"upload:{upload.content_hash}", profile=profile,
+                              content_hash=upload.content_hash, data=upload.data, doc_id=replace_doc_id)
+            if not wait:
+                return JSONResponse(
+                    status_code=202,
+                    content={"message": "File queued for processing", "job_id": job.id, "filename": file.filename},
+                )
+
+            result = await asyncio.wrap_future(job.future)
+            response = {"message": "File processed successfully", **result}
+            if profile:
+                response["profile"] = job.profile_paths
+            return response
+        except JobQueueFull as e:
+            # The file is kept: it is named by its content, so a retry reuses it
+            raise HTTPException(status_code=429, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Left behind by duplicates, oversized uploads and errors before the rename
+        if os.path.exists(part_path):
+            os.remove(part_path)
 
 @app.get("/", response_class=HTMLResponse)
 async def get_dashboard():
@@ -69,17 +273,175 @@ async def get_dashboard():
 async def semantic_search(request: QueryRequest):
     """
     Perform semantic search on processed documents.
+    mode selects vector, lexical (BM25) or hybrid retrieval.
+    With profile=true the retrieval step is profiled and the profile paths
+    are returned alongside the results.
     """
+    if request.mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown search mode: {request.mode}")
+    processor = await get_processor()
+    trace = StageTrace("query")
     try:
-        results = processor.ask(request.query, n_results=request.top_k)
+        with trace.stage("embedding"):
+            query_embedding = await embed_query(request.query) if request.mode != "lexical" else None
+
+        # Read the generation before searching: a write landing mid-search
+        # leaves this result tagged with the older generation
+        generation = processor.generation
+        key = query_cache.result_key(query_embedding, request.top_k, request.mode, request.query, request.doc_ids)
+        results = query_cache.get_result(key, generation) if not request.profile else None
+        if results is not None:
+            trace.finish("cached")
+            return {"results": results}
+
+        start = time.perf_counter()
+        results, profile = await run_in_threadpool(run_search, processor, request, query_embedding, trace)
+        query_cache.put_result(key, generation, results, time.perf_counter() - start)
+        trace.finish("ok")
+        return {"results": results, "profile": profile} if request.profile else {"results": results}
+    except Exception as e:
+        trace.finish("failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def run_search(processor: DocumentProcessor, request: QueryRequest, query_embedding: Optional[List[float]],
+               trace: StageTrace):
+    """Search on the calling (threadpool) thread, profiling it if the request asks to."""
+    with profile_capture(f"query-{uuid.uuid4().hex[:8]}") if request.profile else nullcontext({}) as profile:
+        results = processor.search(query_embedding, request.top_k, request.query, request.mode, request.doc_ids,
+                                   trace=trace)
+    return results, profile
+
+async def embed_query(query: str) -> List[float]:
+    """Embed a query through the embedding cache, micro-batching the misses."""
+    embedding = query_cache.get_embedding(query)
+    if embedding is None:
+        start = time.perf_counter()
+        embedding = await query_batcher.embed(query)
+        query_cache.put_embedding(query, embedding, time.perf_counter() - start)
+    return embedding
+
+@app.post("/query/batch")
+async def batch_search(request: BatchQueryRequest):
+    """
+    Search many queries in one request: all queries are embedded in one
+    batched call and searched together. Returns one result per query.
+    """
+    if request.mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown search mode: {request.mode}")
+    if len(request.queries) > QUERY_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"At most {QUERY_BATCH_LIMIT} queries per batch.")
+    if request.doc_ids is not None and len(request.doc_ids) != len(request.queries):
+        raise HTTPException(status_code=400, detail="doc_ids must have one entry per query.")
+    processor = await get_processor()
+    trace = StageTrace("query_batch")
+    try:
+        with trace.stage("embedding"):
+            query_embeddings = await embed_queries(request.queries) if request.mode != "lexical" else None
+        results = await run_in_threadpool(
+            processor.search_many, query_embeddings, request.top_k, request.queries, request.mode, request.doc_ids,
+            trace
+        )
+        trace.count("queries", len(request.queries))
+        trace.finish("ok")
         return {"results": results}
     except Exception as e:
+        trace.finish("failed")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def embed_queries(queries: List[str]) -> List[List[float]]:
+    """Embed a batch of queries, encoding only those missing from the embedding cache in one call."""
+    embeddings = [query_cache.get_embedding(query) for query in queries]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        start = time.perf_counter()
+        encoded = await query_batcher.embed_many([queries[i] for i in missing])
+        seconds = (time.perf_counter() - start) / len(missing)
+        for i, embedding in zip(missing, encoded):
+            embeddings[i] = embedding
+            query_cache.put_embedding(queries[i], embedding, seconds)
+    return embeddings
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Full status of an ingestion job, including per-stage timings and the result.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/progress")
+async def get_job_progress(job_id: str):
+    """
+    Lightweight progress view of an ingestion job for polling.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.progress()
+
+@app.get("/stats")
+async def get_stats():
+    """
+    Runtime statistics: query batching latency, ingestion queue, query cache, embedding cache, SQL writer
+    and memory (peak RSS, and the increases of it observed during documents and queries).
+    """
+    stats = {
+        "query_batcher": query_batcher.stats(),
+        "ingestion_jobs": jobs.stats(),
+        "query_cache": query_cache.stats(),
+        "warmup": processor_loader.status(),
+        "memory": memory_stats(),
+    }
+    if processor_loader.ready:
+        processor = processor_loader.component
+        stats["query_cache"]["generation"] = processor.generation
+        stats["sql"] = processor.sql_db.stats()
+        if processor.embedder.cache is not None:
+            stats["embedding_cache"] = processor.embedder.cache.stats()
+    return stats
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Prometheus metrics: per-stage duration histograms for ingestion and
+    queries, document size and chunk-count histograms, peak RSS and the
+    increases of it observed during documents and queries.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    """
+    Liveness: answers as soon as the server is bound, even while warming up.
+    """
+    return {"status": "healthy", "ready": processor_loader.ready}
+
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness: 200 once the model and stores are loaded, 503 while warming up or after a failed start.
+    """
+    status = processor_loader.status()
+    if not processor_loader.ready:
+        return JSONResponse(status_code=503, content=status)
+    return status
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    from app.api.forkserver import serve_forked
+
+    host = os.getenv("HOST", "0.0.0.0")
+    port = int(os.getenv("PORT", "8000"))
+    workers = int(os.getenv("SERVER_WORKERS", "1"))
+    if workers > 1 and os.getenv("VECTOR_BACKEND", "chroma") != "ivf":
+        # Workers share data/; only the IVF store coordinates writes across processes
+        raise SystemExit("SERVER_WORKERS > 1 requires VECTOR_BACKEND=ivf (Chroma is not multi-process safe)")
+    if os.getenv("PRELOAD_MODEL", "0") == "1":
+        # Load the weights once in the parent; forked workers share them
+        PRELOADED_EMBEDDER = create_embedder(os.getenv("EMBEDDING_BACKEND", "torch"))
+    if workers > 1:
+        serve_forked(app, host, port, workers)
+    else:
+        uvicorn.run(app, host=host, port=port)
@@ -0,0 +1,73 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+class ComponentNotReady(Exception):
+    """Raised when a component is requested before its initialization finished."""
+
+
+class ComponentLoader:
+    def __init__(self, factory: Callable[[], Any], name: str = "component"):
+        """
+        Build an expensive component on a background thread.
+        The server can bind and answer /health immediately; callers that need
+        the component wait for it (or get ComponentNotReady on timeout or
+        failure).
+        """
+        self.factory = factory
+        self.name = name
+        self.component = None
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.ready_at: Optional[float] = None
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self.started_at = time.time()
+                self._thread = threading.Thread(target=self._load, name=f"warmup-{self.name}", daemon=True)
+                self._thread.start()
+
+    def _load(self):
+        try:
+            self.component = self.factory()
+            self.ready_at = time.time()
+            logging.info(f"✅ {self.name} ready in {self.ready_at - self.started_at:.1f}s.")
+        except Exception as e:
+            self.error = str(e)
+            logging.error(f"❌ {self.name} failed to initialize: {str(e)}")
+        finally:
+            self._ready.set()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set() and self.error is None
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        """Return the component, starting and waiting for its initialization if needed."""
+        self.start()
+        if not self._ready.wait(timeout):
+            raise ComponentNotReady(f"{self.name} is still initializing")
+        if self.error is not None:
+            raise ComponentNotReady(f"{self.name} failed to initialize: {self.error}")
+        return self.component
+
+    def status(self) -> Dict[str, Any]:
+        if self.ready:
+            state = "ready"
+        elif self.error is not None:
+            state = "failed"
+        elif self._thread is not None:
+            state = "warming"
+        else:
+            state = "idle"
+        return {
+            "status": state,
+            "error": self.error,
+            "warmup_seconds": (self.ready_at or time.time()) - self.started_at if self.started_at else None,
+        }
@@ -0,0 +1,302 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.parser.document import PreparedDocument, file_sha256, prepare_document
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".txt")
+
+# Marks the end of a stage's output on the inter-stage queues
+_DONE = object()
+
+
+def find_documents(directory: str) -> List[str]:
+    """Recursively list supported files under a directory, in a stable order."""
+    paths = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+class IngestProgress:
+    def __init__(self, path: str):
+        """
+        Append-only JSONL record of finished files, so an interrupted
+        backfill can resume where it stopped.
+        A file is skipped on resume only if its size and mtime are unchanged.
+        """
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Partially written last line after a crash
+                    self.entries[entry["path"]] = entry
+
+        progress_dir = os.path.dirname(path)
+        if progress_dir and not os.path.exists(progress_dir):
+            os.makedirs(progress_dir)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _signature(file_path: str) -> Dict[str, Any]:
+        stat = os.stat(file_path)
+        return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+    def is_done(self, file_path: str) -> bool:
+        entry = self.entries.get(os.path.abspath(file_path))
+        if not entry or entry.get("status") not in ("done", "duplicate"):
+            return False
+        try:
+            signature = self._signature(file_path)
+        except OSError:
+            return False
+        return entry.get("size") == signature["size"] and entry.get("mtime") == signature["mtime"]
+
+    def record(self, file_path: str, status: str, **info):
+        entry = {"path": os.path.abspath(file_path), "status": status, **info}
+        try:
+            entry.update(self._signature(file_path))
+        except OSError:
+            pass
+        with self._lock:
+            self.entries[entry["path"]] = entry
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class BatchIngestor:
+    def __init__(self, processor, workers: Optional[int] = None, embed_batch_size: int = 512,
+                 queue_size: int = 8, progress_path: Optional[str] = "data/ingest_progress.jsonl"):
+        """
+        Three-stage ingestion pipeline for large backfills:
+          1. load / normalize / chunk in a process pool (CPU-bound, GIL-free),
+          2. one shared embedding stage fed with cross-document batches,
+          3. bulk SQL + vector store writes.
+        Stages are connected by bounded queues so memory stays flat no matter
+        how many files are queued.
+        """
+        self.processor = processor
+        self.workers = workers or os.cpu_count() or 1
+        self.embed_batch_size = embed_batch_size
+        self.queue_size = queue_size
+        self.progress_path = progress_path
+
+    def run(self, file_paths: Iterable[str]) -> Dict[str, Any]:
+        progress = IngestProgress(self.progress_path) if self.progress_path else None
+        pending_paths = []
+        skipped = 0
+        for path in file_paths:
+            if progress and progress.is_done(path):
+                skipped += 1
+            else:
+                pending_paths.append(path)
+        logging.info(f"[*] Batch ingest: {len(pending_paths)} files to process, {skipped} already done.")
+
+        parsed_queue = queue.Queue(maxsize=self.queue_size)
+        write_queue = queue.Queue(maxsize=self.queue_size)
+        summary = {"processed": 0, "failed": 0, "skipped": skipped, "duplicates": 0, "chunks": 0,
+                   "embedded_chunks": 0}
+        errors = []
+        start = time.perf_counter()
+
+        embed_thread = threading.Thread(
+            target=self._guard, args=(self._embed_stage, errors, parsed_queue, write_queue), daemon=True
+        )
+        write_thread = threading.Thread(
+            target=self._guard, args=(self._write_stage, errors, write_queue, progress, summary), daemon=True
+        )
+        embed_thread.start()
+        write_thread.start()
+
+        try:
+            self._parse_stage(pending_paths, parsed_queue, progress, summary, errors)
+        finally:
+            parsed_queue.put(_DONE)
+            embed_thread.join()
+            write_thread.join()
+            if progress:
+                progress.close()
+
+        if errors:
+            raise errors[0]
+
+        summary["seconds"] = time.perf_counter() - start
+        logging.info(
+            f"✅ Batch ingest complete: {summary['processed']} files, {summary['chunks']} chunks, "
+            f"{summary['embedded_chunks']} embedded, {summary['failed']} failed, {summary['skipped']} skipped, "
+            f"{summary['duplicates']} duplicates in {summary['seconds']:.2f}s."
+        )
+        return summary
+
+    @staticmethod
+    def _guard(stage, errors: list, *args):
+        """Run a stage thread, recording its exception for the caller."""
+        try:
+            stage(*args)
+        except Exception as e:
+            logging.error(f"❌ Batch ingest stage failed: {str(e)}")
+            errors.append(e)
+
+    def _parse_stage(self, paths: List[str], parsed_queue: queue.Queue, progress: Optional[IngestProgress],
+                     summary: Dict[str, Any], errors: list):
+        # Limit in-flight parse jobs so parsed documents cannot pile up in memory
+        max_in_flight = self.workers * 2
+        remaining = iter(paths)
+        in_flight = {}
+        seen_hashes = set()
+
+        # Spawned, not forked: the parent holds the model, SQLite connections and writer threads
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            while True:
+                while len(in_flight) < max_in_flight and not errors:
+                    path = next(remaining, None)
+                    if path is None:
+                        break
+                    # Hash up front so duplicate content never reaches the parse workers
+                    try:
+                        content_hash = file_sha256(path)
+                    except OSError as e:
+                        logging.error(f"❌ Error reading file {path}: {str(e)}")
+                        summary["failed"] += 1
+                        if progress:
+                            progress.record(path, "failed", error=str(e))
+                        continue
+                    existing_id = self.processor.sql_db.find_document_by_hash(content_hash)
+                    if existing_id or content_hash in seen_hashes:
+                        summary["duplicates"] += 1
+                        if progress:
+                            progress.record(path, "duplicate", doc_id=existing_id)
+                        continue
+                    seen_hashes.add(content_hash)
+                    # Files are already parsed in parallel, so each PDF is extracted in its worker
+                    future = pool.submit(prepare_document, path, token_counter=self.processor.token_counter,
+                                         content_hash=content_hash, pdf_workers=1)
+                    in_flight[future] = path
+
+                if not in_flight:
+                    break
+
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    path = in_flight.pop(future)
+                    try:
+                        document = future.result()
+                    except Exception as e:
+                        logging.error(f"❌ Error processing file {path}: {str(e)}")
+                        summary["failed"] += 1
+                        if progress:
+                            progress.record(path, "failed", error=str(e))
+                        continue
+                    # Blocks when the embedding stage falls behind (backpressure)
+                    parsed_queue.put(document)
+
+    def _embed_stage(self, parsed_queue: queue.Queue, write_queue: queue.Queue):
+        batch: List[PreparedDocument] = []
+        batch_chunks = 0
+        document = None
+        try:
+            while True:
+                document = parsed_queue.get()
+                if document is _DONE:
+                    break
+                batch.append(document)
+                batch_chunks += len(document.chunks)
+                if batch_chunks >= self.embed_batch_size:
+                    write_queue.put(self._embed_documents(batch))
+                    batch, batch_chunks = [], 0
+            if batch:
+                write_queue.put(self._embed_documents(batch))
+        finally:
+            write_queue.put(_DONE)
+            # On failure, keep draining so the parse stage never blocks on a dead consumer
+            while document is not _DONE:
+                document = parsed_queue.get()
+
+    def _embed_documents(self, documents: List[PreparedDocument]) -> list:
+        """
+        Diff each document against storage, then embed the new chunks of all
+        documents in one call and split the result back.
+        """
+        plans = [self.processor.plan_document(document, os.path.abspath(document.path)) for document in documents]
+        texts = [document.chunks[i].text for plan, document in zip(plans, documents) for i in plan.new_indices]
+        embeddings = self.processor.embed_chunks(texts) if texts else []
+
+        batch = []
+        offset = 0
+        for plan, document in zip(plans, documents):
+            count = len(plan.new_indices)
+            batch.append((plan, document, embeddings[offset:offset + count]))
+            offset += count
+        return batch
+
+    def _write_stage(self, write_queue: queue.Queue, progress: Optional[IngestProgress], summary: Dict[str, Any]):
+        batch = None
+        try:
+            while True:
+                batch = write_queue.get()
+                if batch is _DONE:
+                    break
+                self.processor.store_documents(batch)
+                for plan, document, _ in batch:
+                    summary["processed"] += 1
+                    summary["chunks"] += len(document.chunks)
+                    summary["embedded_chunks"] += len(plan.new_indices)
+                    if document.stats:
+                        self.processor.log_chunk_stats(document)
+                    if progress:
+                        progress.record(document.path, "done", doc_id=plan.doc_id, ingest_status=plan.status,
+                                        chunks=len(document.chunks), embedded_chunks=len(plan.new_indices),
+                                        stale_chunks=len(plan.stale_ids), chunk_stats=document.stats)
+        finally:
+            while batch is not _DONE:
+                batch = write_queue.get()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel batch ingestion of PDF/DOCX/TXT files.")
+    parser.add_argument("paths", nargs="+", help="Files or directories to ingest")
+    parser.add_argument("--workers", type=int, default=None, help="Parse worker processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=512, help="Chunks per cross-document embedding batch")
+    parser.add_argument("--queue-size", type=int, default=8, help="Max batches buffered between stages")
+    parser.add_argument("--progress", default="data/ingest_progress.jsonl", help="Resumable progress record")
+    parser.add_argument("--chunking", choices=["chars", "tokens"], default="chars", help="Chunk size unit")
+    parser.add_argument("--embedding-backend", choices=["torch", "onnx", "onnx-fp32"], default="torch",
+                        help="Embedding runtime (onnx = int8 ONNX Runtime export)")
+    args = parser.parse_args()
+
+    file_paths = []
+    for path in args.paths:
+        file_paths.extend(find_documents(path) if os.path.isdir(path) else [path])
+
+    from app.main import DocumentProcessor
+    processor = DocumentProcessor(chunking=args.chunking, embedding_backend=args.embedding_backend)
+    summary = processor.process_many(
+        file_paths,
+        workers=args.workers,
+        embed_batch_size=args.batch_size,
+        queue_size=args.queue_size,
+        progress_path=args.progress,
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from app.storage.ivf_store import IVFVectorStore, normalize_rows
+
+
+def make_vectors(count: int, dim: int, clusters: int = 256, seed: int = 0) -> np.ndarray:
+    """Unit vectors drawn around random cluster centers, like topic-clustered embeddings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    points = centers[rng.integers(0, clusters, count)] + 0.6 * rng.standard_normal((count, dim)).astype(np.float32)
+    return normalize_rows(points).astype(np.float32)
+
+
+def recall_at_k(results, truth: np.ndarray, k: int) -> float:
+    hits = sum(len(set(found[:k]) & set(expected[:k])) for found, expected in zip(results, truth))
+    return hits / (len(truth) * k)
+
+
+def run_queries(search, queries: np.ndarray, k: int):
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        results.append([int(chunk_id) for chunk_id in search(query.tolist(), k)["ids"][0]])
+    return results, len(queries) / (time.perf_counter() - start)
+
+
+def load_store(store, vectors: np.ndarray, batch_size: int = 10000):
+    for start in range(0, len(vectors), batch_size):
+        batch = vectors[start:start + batch_size]
+        ids = [str(i) for i in range(start, start + len(batch))]
+        store.add_chunks(ids, batch.tolist(), [{"doc_id": f"doc_{int(i) // 100}"} for i in ids], ids)
+
+
+def benchmark_chroma(vectors: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int, tmp: str):
+    try:
+        import chromadb
+    except ImportError:
+        print("⚠️  chromadb is not installed, skipping the Chroma baseline")
+        return
+    client = chromadb.PersistentClient(path=os.path.join(tmp, "chroma"))
+    collection = client.get_or_create_collection(name="bench", metadata={"hnsw:space": "cosine"})
+    for start in range(0, len(vectors), 5000):
+        batch = vectors[start:start + 5000]
+        ids = [str(i) for i in range(start, start + len(batch))]
+        collection.add(ids=ids, embeddings=batch.tolist(), documents=ids)
+
+    def search(query, n_results):
+        return collection.query(query_embeddings=[query], n_results=n_results)
+
+    results, qps = run_queries(search, queries, k)
+    print(f"🔹 Chroma (HNSW, float32): recall@{k} {recall_at_k(results, truth, k):.3f} | {qps:.0f} QPS")
+
+
+def benchmark_ann(count: int, dim: int, queries_count: int, k: int, nprobes):
+    vectors = make_vectors(count, dim)
+    queries = make_vectors(queries_count, dim, seed=1)
+    truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :k]
+
+    print("\n" + "="*30)
+    print("📊 ANN BENCHMARK")
+    print("="*30)
+    print(f"📄 {count} vectors x {dim} dims, {queries_count} queries, exact float32 ground truth")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = IVFVectorStore(os.path.join(tmp, "ivf"))
+        start = time.perf_counter()
+        load_store(store, vectors)
+        if store.centroids is None:
+            store.train()
+        print(f"⏱️  IVF build: {time.perf_counter() - start:.1f} s, {len(store.centroids)} lists, "
+              f"{os.path.getsize(store._codes_path) / (1024 * 1024):.0f} MB of int8 codes")
+
+        for nprobe in nprobes:
+            def search(query, n_results):
+                return store.search(query, n_results, nprobe=nprobe)
+            results, qps = run_queries(search, queries, k)
+            print(f"🔹 IVF int8 nprobe={nprobe:<3}: recall@{k} {recall_at_k(results, truth, k):.3f} | {qps:.0f} QPS")
+
+        benchmark_chroma(vectors, queries, truth, k, tmp)
+    print("="*30)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall@k vs QPS of the IVF vector store against Chroma.")
+    parser.add_argument("--vectors", type=int, default=200000, help="Number of stored vectors")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("-k", type=int, default=10, help="Results per query")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32], help="nprobe values to sweep")
+    args = parser.parse_args()
+    benchmark_ann(args.vectors, args.dim, args.queries, args.k, args.nprobe)
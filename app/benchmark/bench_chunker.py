@@ -0,0 +1,86 @@
+import argparse
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from app.benchmark.bench_normalizer import make_text
+from app.parser.chunker import sentence_aware_spans
+from app.utils.arabic_cleaner import normalize_arabic_text
+
+
+def legacy_sentence_aware_chunk(text: str, chunk_size: int = 800, overlap: int = 100):
+    """The original list-of-sentences implementation, kept as the reference."""
+    sentences = re.split(r'(?<=[.!؟\n])\s+', text)
+    if len(sentences) == 1 and len(text) > chunk_size:
+        sentences = re.split(r'\s+', text)
+
+    chunks = []
+    current_chunk = []
+    current_length = 0
+    for sentence in sentences:
+        sentence_len = len(sentence)
+        if current_length + sentence_len > chunk_size and current_chunk:
+            chunks.append(" ".join(current_chunk))
+            overlap_sentences = []
+            overlap_char_count = 0
+            for sent in reversed(current_chunk):
+                sent_len = len(sent)
+                if overlap_char_count + sent_len <= max(overlap, chunk_size // 2):
+                    overlap_sentences.insert(0, sent)
+                    overlap_char_count += sent_len
+                else:
+                    break
+            current_chunk = overlap_sentences + [sentence]
+            current_length = overlap_char_count + sentence_len
+        else:
+            current_chunk.append(sentence)
+            current_length += sentence_len
+    if current_chunk:
+        chunks.append(" ".join(current_chunk))
+    return chunks
+
+
+def measure(func, text: str, repeat: int = 3):
+    """Return (result, best seconds, peak traced MB); memory is traced in a separate run."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(text)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, min(timings), peak / (1024 * 1024)
+
+
+def benchmark_chunker(size_mb: float):
+    text = normalize_arabic_text(make_text(size_mb))
+
+    legacy_chunks, legacy_time, legacy_peak = measure(legacy_sentence_aware_chunk, text)
+    spans, span_time, span_peak = measure(sentence_aware_spans, text)
+
+    if legacy_chunks != [text[start:end] for start, end in spans]:
+        raise AssertionError("Offset chunker output differs from the legacy implementation")
+
+    print("\n" + "="*30)
+    print("📊 CHUNKER BENCHMARK")
+    print("="*30)
+    print(f"📄 Input: {size_mb:.0f} MB normalized Arabic text, {len(spans)} chunks")
+    print(f"⏱️  Legacy sentence lists: {legacy_time:.2f} s, peak {legacy_peak:.1f} MB allocated")
+    print(f"⏱️  Offset spans:          {span_time:.2f} s, peak {span_peak:.1f} MB allocated")
+    print(f"🚀 Speedup: {legacy_time / span_time:.2f}x (identical chunks)")
+    print("="*30)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark offset-based chunking against the legacy chunker.")
+    parser.add_argument("--mb", type=float, default=50.0, help="Input size in megabytes")
+    args = parser.parse_args()
+    benchmark_chunker(args.mb)
@@ -0,0 +1,104 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from app.benchmark.corpus import CorpusGenerator
+from app.parser.headings import docx_heading_level
+from app.parser.loader import _docx_styles, _docx_uses_heading_styles, _iter_docx_blocks
+
+
+def make_docx(path: str, pages: int, table_every: int = 40):
+    """A synthetic Arabic manual of roughly `pages` pages with headings and a small table every few paragraphs."""
+    import docx
+
+    generator = CorpusGenerator(seed=4)
+    document = docx.Document()
+    for i, (level, text) in enumerate(generator.document(size_kb=pages * 5, sections=max(pages // 15, 1), subsections=3)):
+        if level:
+            document.add_heading(text, level=level)
+        else:
+            document.add_paragraph(text)
+        if i and i % table_every == 0:
+            table = document.add_table(rows=4, cols=3)
+            for row in table.rows:
+                for cell in row.cells:
+                    cell.text = generator.sentence(3)
+    document.save(path)
+
+
+def python_docx_blocks(path: str):
+    """The previous loader: the python-docx object model, paragraph styles resolved once (tables are lost)."""
+    import docx
+    from docx.enum.style import WD_STYLE_TYPE
+
+    document = docx.Document(path)
+    levels = {
+        style.style_id: docx_heading_level(style.name)
+        for style in document.styles if style.type == WD_STYLE_TYPE.PARAGRAPH
+    }
+    for p in document.paragraphs:
+        if p.text.strip():
+            yield p.text, levels.get(p._p.style, 0), False
+
+
+def streaming_blocks(path: str):
+    with zipfile.ZipFile(path) as archive:
+        styles = _docx_styles(archive)
+        _docx_uses_heading_styles(archive, styles)
+        for block in _iter_docx_blocks(archive, styles):
+            yield block.text, block.heading_level, block.table_row
+
+
+def measure(loader, path: str, repeats: int):
+    """
+    Best load time, and peak traced memory while the blocks are consumed one
+    by one (as the chunker does). lxml allocates in C, outside tracemalloc,
+    so the python-docx peak is a lower bound.
+    """
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        blocks = list(loader(path))
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    for _ in loader(path):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return blocks, min(seconds), peak
+
+
+def benchmark_docx(pages: int, repeats: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "manual.docx")
+        make_docx(path, pages)
+
+        print("\n" + "="*30)
+        print("📊 DOCX LOADER BENCHMARK")
+        print("="*30)
+        print(f"📄 ~{pages} pages, {os.path.getsize(path) / 1e6:.1f} MB file")
+        reference, docx_seconds, docx_peak = measure(python_docx_blocks, path, repeats)
+        blocks, stream_seconds, stream_peak = measure(streaming_blocks, path, repeats)
+        paragraphs = [block for block in blocks if not block[2]]
+        if paragraphs != reference:
+            raise AssertionError("Streaming loader paragraphs differ from python-docx")
+        print(f"🔹 python-docx: {docx_seconds:.2f} s, peak {docx_peak / 1e6:.1f} MB, {len(reference)} paragraphs")
+        print(f"🔹 iterparse:   {stream_seconds:.2f} s, peak {stream_peak / 1e6:.1f} MB, "
+              f"{len(blocks)} blocks ({len(blocks) - len(paragraphs)} table rows)")
+        print(f"🚀 {docx_seconds / stream_seconds:.2f}x faster, {docx_peak / stream_peak:.1f}x less peak memory")
+        print("="*30)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="python-docx vs streaming iterparse DOCX loading.")
+    parser.add_argument("--pages", type=int, default=300, help="Approximate pages in the generated document")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed loads per loader (best is reported)")
+    args = parser.parse_args()
+    benchmark_docx(args.pages, args.repeats)
@@ -0,0 +1,73 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from app.benchmark.bench_normalizer import make_text
+from app.parser.chunker import sentence_aware_spans
+from app.utils.arabic_cleaner import normalize_arabic_text
+
+
+def make_chunks(count: int):
+    """Chunk-sized passages of varied length, as produced by the default chunker."""
+    text = normalize_arabic_text(make_text(count * 0.002))
+    spans = sentence_aware_spans(text)
+    return [text[start:end] for start, end in spans][:count]
+
+
+def cosine_drift(reference: np.ndarray, candidate: np.ndarray):
+    """Mean and worst cosine similarity between matching rows."""
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    similarity = (reference * candidate).sum(axis=1)
+    return float(similarity.mean()), float(similarity.min())
+
+
+def timed_encode(embedder, texts):
+    embedder.embed_batch(texts[:8])  # Warm-up
+    start = time.perf_counter()
+    embeddings = np.asarray(embedder.embed_batch(texts), dtype=np.float32)
+    return embeddings, len(texts) / (time.perf_counter() - start)
+
+
+def benchmark_embedder(count: int, batch_size: int, threads, backends):
+    from app.embeddings.embedder import Embedder
+
+    texts = make_chunks(count)
+    print("\n" + "="*30)
+    print("📊 EMBEDDER BENCHMARK")
+    print("="*30)
+    print(f"📄 {len(texts)} chunks, batch size {batch_size}, no embedding cache")
+
+    baseline = None
+    for thread_count in threads:
+        for backend in backends:
+            try:
+                embedder = Embedder(backend=backend, batch_size=batch_size, threads=thread_count)
+            except (ImportError, FileNotFoundError) as e:
+                print(f"⚠️  {backend}: skipped ({e})")
+                continue
+            embeddings, rate = timed_encode(embedder, texts)
+            if backend == "torch" and baseline is None:
+                baseline = embeddings
+            drift = ""
+            if baseline is not None and backend != "torch":
+                mean, worst = cosine_drift(baseline, embeddings)
+                drift = f" | cosine vs fp32: mean {mean:.4f}, min {worst:.4f}"
+            print(f"🔹 {backend:<9} threads={thread_count or 'auto':<4}: {rate:.1f} sentences/s{drift}")
+    print("="*30)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput and drift of the embedding backends.")
+    parser.add_argument("--count", type=int, default=1000, help="Number of chunks to embed")
+    parser.add_argument("--batch-size", type=int, default=32, help="Encode batch size")
+    parser.add_argument("--threads", type=int, nargs="+", default=[0], help="Intra-op thread counts (0 = default)")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx-fp32", "onnx"], help="Backends to compare")
+    args = parser.parse_args()
+    benchmark_embedder(args.count, args.batch_size, [t or None for t in args.threads], args.backends)
@@ -0,0 +1,60 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from app.embeddings.batcher import percentile
+from app.storage.sql_db import SQLDB, DocumentWrite
+
+ARABIC_LETTERS = "ابتثجحخدذرزسشصضطظعغفقكلمنهوي"
+
+
+def make_corpus(chunks: int, words_per_chunk: int = 120, vocabulary: int = 50000, seed: int = 0):
+    """Chunks of synthetic Arabic words drawn from a Zipf distribution, like natural text."""
+    rng = random.Random(seed)
+    words = ["".join(rng.choice(ARABIC_LETTERS) for _ in range(rng.randint(3, 8))) for _ in range(vocabulary)]
+    weights = [1 / (rank + 1) for rank in range(vocabulary)]
+    texts = [" ".join(rng.choices(words, weights, k=words_per_chunk)) for _ in range(chunks)]
+    return words, texts
+
+
+def benchmark_lexical(chunks: int, queries: int):
+    words, texts = make_corpus(chunks)
+    rows = [(f"bench_{i}", i, text, None, None, None, None, None, None) for i, text in enumerate(texts)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SQLDB(os.path.join(tmp, "bench.db"))
+        start = time.perf_counter()
+        db.add_documents([DocumentWrite("bench", "bench.txt", ".txt", None, None, rows)])
+        index_time = time.perf_counter() - start
+
+        # Two-word queries mixing a common (rank 100-1000) and a rarer word
+        rng = random.Random(1)
+        latencies = []
+        for _ in range(queries):
+            query = f"{words[rng.randrange(100, 1000)]} {words[rng.randrange(1000, len(words))]}"
+            start = time.perf_counter()
+            db.search_lexical(query, limit=20)
+            latencies.append(time.perf_counter() - start)
+        db.close()
+
+    print("\n" + "="*30)
+    print("📊 LEXICAL INDEX BENCHMARK")
+    print("="*30)
+    print(f"📄 Corpus: {chunks} chunks, indexed in {index_time:.2f} s")
+    print(f"⏱️  Query p50: {percentile(latencies, 50) * 1000:.3f} ms")
+    print(f"⏱️  Query p99: {percentile(latencies, 99) * 1000:.3f} ms")
+    print("="*30)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark BM25 lookups on the SQLite FTS5 lexical index.")
+    parser.add_argument("--chunks", type=int, default=20000, help="Number of chunks to index")
+    parser.add_argument("--queries", type=int, default=1000, help="Number of timed queries")
+    args = parser.parse_args()
+    benchmark_lexical(args.chunks, args.queries)
@@ -0,0 +1,75 @@
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from app.utils.arabic_cleaner import fix_arabic_text_direction, normalize_arabic_text
+
+
+def legacy_normalize_arabic_text(text: str) -> str:
+    """The original five-pass implementation, kept as the reference."""
+    if not text:
+        return ""
+    text = fix_arabic_text_direction(text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    text = re.sub(r'ـ', '', text)
+    text = re.sub(r'[أإآ]', 'ا', text)
+    text = re.sub(r'ى', 'ي', text)
+    text = text.translate(str.maketrans("٠١٢٣٤٥٦٧٨٩", "0123456789"))
+    return text
+
+
+def make_text(size_mb: float, seed: int = 42) -> str:
+    """Arabic-like text with diacritics, tatweel, alef/yeh variants, Indic digits and messy whitespace."""
+    rng = random.Random(seed)
+    words = ["الذَّكَاءُ", "الاصْطِنَاعِيُّ", "أنظمة", "إدارة", "آلة", "مستوى", "عـــلى", "الفصل",
+             "٢٠٢٤", "البيانات", "تَعَلُّمُ", "مَجَالٌ", "Chapter", "خوارزميات"]
+    separators = [" ", " ", " ", "  ", "\n", " \n\t", ". ", "؟ "]
+    target = int(size_mb * 1024 * 1024)
+    parts = []
+    size = 0
+    while size < target:
+        word = rng.choice(words) + rng.choice(separators)
+        parts.append(word)
+        size += len(word.encode("utf-8"))
+    return "".join(parts)
+
+
+def best_of(func, text: str, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def benchmark_normalizer(size_mb: float, repeat: int):
+    text = make_text(size_mb)
+    if legacy_normalize_arabic_text(text) != normalize_arabic_text(text):
+        raise AssertionError("Normalizer output differs from the legacy implementation")
+
+    legacy = best_of(legacy_normalize_arabic_text, text, repeat)
+    current = best_of(normalize_arabic_text, text, repeat)
+
+    print("\n" + "="*30)
+    print("📊 NORMALIZER BENCHMARK")
+    print("="*30)
+    print(f"📄 Input: {size_mb:.1f} MB, best of {repeat}")
+    print(f"⏱️  Legacy (5 passes): {legacy * 1000:.1f} ms ({size_mb / legacy:.1f} MB/s)")
+    print(f"⏱️  Precompiled:       {current * 1000:.1f} ms ({size_mb / current:.1f} MB/s)")
+    print(f"🚀 Speedup: {legacy / current:.2f}x (output byte-identical)")
+    print("="*30)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark normalize_arabic_text against the legacy implementation.")
+    parser.add_argument("--mb", type=float, default=8.0, help="Input size in megabytes")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions (best time is reported)")
+    args = parser.parse_args()
+    benchmark_normalizer(args.mb, args.repeat)
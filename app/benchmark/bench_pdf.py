@@ -0,0 +1,52 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from app.benchmark.corpus import CorpusGenerator, write_pdf
+from app.parser.loader import _get_pdf_pool, iter_document
+
+
+def make_pdf(path: str, pages: int):
+    """A synthetic Arabic PDF with roughly the requested page count (~45 lines per page)."""
+    generator = CorpusGenerator(seed=3)
+    write_pdf(generator.document(size_kb=pages * 6.5, sections=pages // 20), path)
+
+
+def timed_extract(path: str, workers: int):
+    start = time.perf_counter()
+    segments = list(iter_document(path, pdf_workers=workers))
+    return segments, time.perf_counter() - start
+
+
+def benchmark_pdf(pages: int, worker_counts):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "report.pdf")
+        make_pdf(path, pages)
+        baseline, sequential = timed_extract(path, 1)
+
+        print("\n" + "="*30)
+        print("📊 PDF EXTRACTION BENCHMARK")
+        print("="*30)
+        print(f"📄 {baseline[-1].page} pages, {os.cpu_count()} CPUs")
+        print(f"⏱️  Sequential: {sequential:.2f} s ({baseline[-1].page / sequential:.0f} pages/s)")
+        for workers in worker_counts:
+            # Spawn the pool outside the timing, as a long-running server would
+            list(_get_pdf_pool(workers).map(abs, range(workers)))
+            segments, seconds = timed_extract(path, workers)
+            if segments != baseline:
+                raise AssertionError(f"Parallel extraction with {workers} workers differs from sequential")
+            print(f"🚀 {workers} workers: {seconds:.2f} s ({sequential / seconds:.2f}x, output identical)")
+        print("="*30)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sequential vs multi-process PDF page extraction.")
+    parser.add_argument("--pages", type=int, default=800, help="Pages in the generated PDF")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, 8], help="Worker process counts")
+    args = parser.parse_args()
+    benchmark_pdf(args.pages, args.workers)
@@ -0,0 +1,92 @@
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from app.benchmark.bench_lexical import make_corpus
+from app.storage.sql_db import SQLDB, DocumentWrite
+
+CHUNKS_PER_DOCUMENT = 10
+
+
+def document(texts, name: str) -> DocumentWrite:
+    rows = [(f"{name}_{i}", i, text, None, None, None, None, None, None) for i, text in enumerate(texts)]
+    return DocumentWrite(name, f"{name}.txt", "txt", name, name, rows)
+
+
+def write_throughput(db: SQLDB, texts, clients: int, per_client: int) -> float:
+    """Documents committed per second with `clients` threads uploading at once."""
+    def upload(client):
+        for i in range(per_client):
+            start = (client * per_client + i) * CHUNKS_PER_DOCUMENT % (len(texts) - CHUNKS_PER_DOCUMENT)
+            db.add_documents([document(texts[start:start + CHUNKS_PER_DOCUMENT], f"w{clients}_{client}_{i}")])
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(upload, range(clients)))
+    return clients * per_client / (time.perf_counter() - began)
+
+
+def read_throughput(db: SQLDB, words, texts, clients: int, per_client: int) -> float:
+    """Lexical searches + chunk hydrations per second while one uploader keeps writing."""
+    stop = threading.Event()
+
+    def background_writes():
+        i = 0
+        while not stop.is_set():
+            db.add_documents([document(texts[:CHUNKS_PER_DOCUMENT], f"bg{clients}_{i}")])
+            i += 1
+
+    def read(client):
+        for i in range(per_client):
+            query = f"{words[(client * 31 + i) % 1000 + 100]} {words[(client * 17 + i * 7) % 20000 + 1000]}"
+            hits = db.search_lexical(query, limit=10)
+            db.get_chunk_results([chunk_id for chunk_id, _ in hits])
+
+    writer = threading.Thread(target=background_writes)
+    writer.start()
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(read, range(clients)))
+    seconds = time.perf_counter() - began
+    stop.set()
+    writer.join()
+    return clients * per_client / seconds
+
+
+def benchmark_sql_pool(chunks: int, client_counts, writes: int, reads: int):
+    words, texts = make_corpus(chunks, words_per_chunk=80)
+    print("\n" + "="*30)
+    print("📊 SQLITE CONCURRENCY BENCHMARK")
+    print("="*30)
+    print(f"📄 {chunks} seed chunks, {CHUNKS_PER_DOCUMENT} chunks per uploaded document, {os.cpu_count()} CPUs")
+    for label, pool_size in (("reads on the writer connection", 0), ("read-only connection pool", 8)):
+        print(f"\n🔹 {label}")
+        with tempfile.TemporaryDirectory() as tmp:
+            db = SQLDB(os.path.join(tmp, "bench.db"), read_pool_size=pool_size)
+            db.add_documents([document(texts, "seed")])
+            for clients in client_counts:
+                commits_before, writes_before = db.commit_count, db.write_count
+                uploads = write_throughput(db, texts, clients, writes)
+                group = (db.write_count - writes_before) / max(db.commit_count - commits_before, 1)
+                lookups = read_throughput(db, words, texts, clients, reads)
+                print(f"⏱️  {clients:>3} clients: {uploads:8.0f} uploads/s (≈{group:.1f} per commit) | "
+                      f"{lookups:8.0f} reads/s under writes")
+            db.close()
+    print("="*30)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upload and read throughput of SQLDB as concurrent clients grow.")
+    parser.add_argument("--chunks", type=int, default=5000, help="Chunks indexed before measuring")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Concurrent clients")
+    parser.add_argument("--writes", type=int, default=50, help="Documents uploaded per client")
+    parser.add_argument("--reads", type=int, default=200, help="Lookups per client")
+    args = parser.parse_args()
+    benchmark_sql_pool(args.chunks, args.clients, args.writes, args.reads)
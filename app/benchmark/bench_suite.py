@@ -0,0 +1,404 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from app.benchmark.bench_ann import make_vectors
+from app.benchmark.corpus import FORMATS, generate_corpus
+from app.embeddings.batcher import percentile
+from app.main import chunk_hash
+from app.parser.document import PreparedDocument, prepare_document
+from app.storage.sql_db import SQLDB, DocumentWrite
+from app.utils.metrics import StageTrace
+
+# Regression direction is read from the metric name suffix
+LOWER_IS_BETTER = ("_ms", "_seconds")
+HIGHER_IS_BETTER = ("_per_s", "_qps")
+DEFAULT_TOLERANCE = 0.10
+# Timing changes smaller than this are noise however large they are relatively (e.g. 0.2 ms -> 0.3 ms)
+DEFAULT_MIN_DELTA_MS = 1.0
+EMBEDDING_DIM = 384
+
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    """Latency distribution of a list of durations in seconds, reported in milliseconds."""
+    return {
+        "n": len(samples),
+        "mean_ms": sum(samples) / len(samples) * 1000 if samples else 0.0,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+    }
+
+
+def print_section(title: str):
+    print("\n" + "="*30)
+    print(title)
+    print("="*30)
+
+
+def print_latency(label: str, summary: Dict[str, float], extra: str = ""):
+    print(f"⏱️  {label:<22} p50 {summary['p50_ms']:8.2f} ms | p95 {summary['p95_ms']:8.2f} ms | "
+          f"p99 {summary['p99_ms']:8.2f} ms{extra}")
+
+
+# --- Micro benchmarks -------------------------------------------------------
+
+def bench_parsing(paths: List[str], repeat: int) -> Dict[str, Any]:
+    """Loader, normalizer and chunker per format, timed through prepare_document's stage trace."""
+    print_section("📊 PARSING (loader / normalizer / chunker)")
+    results = {}
+    for file_format in FORMATS:
+        files = [path for path in paths if path.endswith("." + file_format)]
+        if not files:
+            continue
+        stages: Dict[str, List[float]] = {}
+        for _ in range(repeat):
+            for path in files:
+                trace = StageTrace("bench")
+                prepare_document(path, trace=trace)
+                for stage, seconds in trace.timings.items():
+                    stages.setdefault(stage, []).append(seconds)
+        megabytes = sum(os.path.getsize(path) for path in files) * repeat / 1024 / 1024
+        total = sum(sum(samples) for samples in stages.values())
+        results[file_format] = {stage: latency_summary(samples) for stage, samples in stages.items()}
+        results[file_format]["mb_per_s"] = megabytes / total
+        for stage, summary in results[file_format].items():
+            if stage != "mb_per_s":
+                print_latency(f"{file_format} {stage}", summary)
+        print(f"🚀 {file_format}: {results[file_format]['mb_per_s']:.2f} MB/s end to end")
+    return results
+
+
+def bench_embedder(texts: List[str], backend: str, batch_size: int):
+    """Chunk embedding throughput without the embedding cache. Returns (results, embeddings or None)."""
+    print_section("📊 EMBEDDER")
+    try:
+        from app.embeddings.embedder import Embedder
+        embedder = Embedder(backend=backend, batch_size=batch_size)
+    except (ImportError, FileNotFoundError, OSError) as e:
+        print(f"⚠️  Skipped ({e}); vector benchmarks use synthetic embeddings")
+        return {"skipped": str(e)}, None
+
+    embedder.embed_batch(texts[:8])  # Warm-up
+    start = time.perf_counter()
+    embeddings = embedder.embed_batch(texts)
+    seconds = time.perf_counter() - start
+    latencies = []
+    for text in texts[:200]:
+        start = time.perf_counter()
+        embedder.embed_queries([text])
+        latencies.append(time.perf_counter() - start)
+    results = {"chunks_per_s": len(texts) / seconds, "query": latency_summary(latencies)}
+    print(f"🚀 {backend}: {results['chunks_per_s']:.1f} chunks/s (batch size {batch_size})")
+    print_latency("single query encode", results["query"])
+    return results, np.asarray(embeddings, dtype=np.float32)
+
+
+def bench_sql(documents: List[PreparedDocument], queries: List[str], tmp: str) -> Dict[str, Any]:
+    """Per-document SQL write transactions (chunks + FTS rows) and BM25 lookups."""
+    print_section("📊 SQLITE (writes / lexical search)")
+    db = SQLDB(os.path.join(tmp, "bench.db"))
+    write_latencies = []
+    chunks = 0
+    for i, document in enumerate(documents):
+        rows = [(f"doc{i}_{j}", j, chunk.text, chunk.heading, chunk.page_start, chunk.page_end,
+                 chunk.start, chunk.end, chunk_hash(chunk.text)) for j, chunk in enumerate(document.chunks)]
+        start = time.perf_counter()
+        db.add_documents([DocumentWrite(f"doc{i}", document.filename, document.file_type,
+                                        document.content_hash, document.path, rows)])
+        write_latencies.append(time.perf_counter() - start)
+        chunks += len(rows)
+
+    search_latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        db.search_lexical(query, limit=20)
+        search_latencies.append(time.perf_counter() - start)
+    db.close()
+
+    results = {
+        "write": latency_summary(write_latencies),
+        "write_chunks_per_s": chunks / sum(write_latencies),
+        "lexical_search": latency_summary(search_latencies),
+    }
+    print_latency("document write", results["write"], f" | {results['write_chunks_per_s']:.0f} chunks/s")
+    print_latency("lexical search", results["lexical_search"])
+    return results
+
+
+def open_vector_store(backend: str, tmp: str):
+    if backend == "ivf":
+        from app.storage.ivf_store import IVFVectorStore
+        return IVFVectorStore(os.path.join(tmp, "ivf"))
+    from app.storage.vector_db import VectorDB
+    return VectorDB(os.path.join(tmp, "chroma"))
+
+
+def bench_vector(embeddings: np.ndarray, backend: str, queries: int, tmp: str,
+                 batch_size: int = 1000) -> Dict[str, Any]:
+    """Batched inserts and top-5 searches against the configured vector store backend."""
+    print_section(f"📊 VECTOR STORE ({backend})")
+    try:
+        store = open_vector_store(backend, tmp)
+    except ImportError as e:
+        print(f"⚠️  Skipped ({e})")
+        return {"skipped": str(e)}
+
+    insert_latencies = []
+    for start in range(0, len(embeddings), batch_size):
+        batch = embeddings[start:start + batch_size]
+        ids = [str(i) for i in range(start, start + len(batch))]
+        began = time.perf_counter()
+        store.add_chunks(ids, batch, [{"doc_id": f"doc_{i // 100}"} for i in range(start, start + len(batch))], ids)
+        insert_latencies.append(time.perf_counter() - began)
+
+    rng = np.random.default_rng(1)
+    picks = embeddings[rng.integers(0, len(embeddings), queries)]
+    search_latencies = []
+    for query in picks:
+        began = time.perf_counter()
+        store.search(query.tolist(), n_results=5)
+        search_latencies.append(time.perf_counter() - began)
+
+    results = {
+        "vectors": len(embeddings),
+        "insert_vectors_per_s": len(embeddings) / sum(insert_latencies),
+        "search": latency_summary(search_latencies),
+        "search_qps": len(search_latencies) / sum(search_latencies),
+    }
+    print(f"🚀 Insert: {results['insert_vectors_per_s']:.0f} vectors/s ({len(embeddings)} vectors)")
+    print_latency("search top-5", results["search"], f" | {results['search_qps']:.0f} QPS")
+    return results
+
+
+# --- Macro benchmarks -------------------------------------------------------
+
+def bench_ingest(processor, paths: List[str]) -> Dict[str, Any]:
+    """Full process_file pipeline, one document at a time."""
+    print_section("📊 INGEST (end to end)")
+    latencies = []
+    for path in paths:
+        start = time.perf_counter()
+        processor.process_file(path)
+        latencies.append(time.perf_counter() - start)
+    seconds = sum(latencies)
+    megabytes = sum(os.path.getsize(path) for path in paths) / 1024 / 1024
+    results = {
+        "document": latency_summary(latencies),
+        "documents_per_s": len(paths) / seconds,
+        "mb_per_s": megabytes / seconds,
+    }
+    print_latency("document", results["document"])
+    print(f"🚀 {results['documents_per_s']:.2f} documents/s, {results['mb_per_s']:.2f} MB/s")
+    return results
+
+
+def bench_queries(processor, queries: List[str], modes: List[str], concurrency: List[int]) -> Dict[str, Any]:
+    """processor.ask latency and throughput per search mode and client concurrency."""
+    print_section("📊 QUERIES (end to end)")
+    results = {}
+    for mode in modes:
+        for workers in concurrency:
+            latencies = []
+
+            def timed(query):
+                start = time.perf_counter()
+                processor.ask(query, n_results=5, mode=mode)
+                latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(timed, queries))
+            wall = time.perf_counter() - start
+            key = f"{mode}_c{workers}"
+            results[key] = {**latency_summary(latencies), "throughput_qps": len(queries) / wall}
+            print_latency(f"{mode} x{workers}", results[key], f" | {results[key]['throughput_qps']:.1f} QPS")
+    return results
+
+
+def run_macro(paths: List[str], queries: List[str], modes: List[str], concurrency: List[int],
+              embedding_backend: str, tmp: str) -> Dict[str, Any]:
+    """
+    Ingest and query through DocumentProcessor. Its stores use paths
+    relative to the working directory, so this runs inside the scratch
+    directory and never touches the real data/ folder.
+    """
+    cwd = os.getcwd()
+    os.chdir(tmp)
+    try:
+        from app.main import DocumentProcessor
+        try:
+            processor = DocumentProcessor(embedding_backend=embedding_backend)
+        except (ImportError, FileNotFoundError, OSError) as e:
+            print(f"\n⚠️  Macro benchmarks skipped ({e})")
+            return {"skipped": str(e)}
+        return {
+            "ingest": bench_ingest(processor, paths),
+            "query": bench_queries(processor, queries, modes, concurrency),
+        }
+    finally:
+        os.chdir(cwd)
+
+
+# --- Results and regressions ------------------------------------------------
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def compare_to_baseline(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float,
+                        min_delta_ms: float = DEFAULT_MIN_DELTA_MS) -> List[str]:
+    """
+    Compare every timing (lower is better) and throughput (higher is
+    better) metric present in both runs; return the regressions beyond
+    tolerance (a fraction, e.g. 0.1 = 10%). Timings that moved by less
+    than min_delta_ms are ignored either way.
+    """
+    current = flatten(results)
+    previous = flatten(baseline)
+    regressions = []
+    improvements = 0
+    for name in sorted(current.keys() & previous.keys()):
+        old, new = previous[name], current[name]
+        if old <= 0:
+            continue
+        change = (new - old) / old
+        if name.endswith(LOWER_IS_BETTER):
+            delta_ms = abs(new - old) * (1000 if name.endswith("_seconds") else 1)
+            if delta_ms < min_delta_ms:
+                continue
+            worse, better = change > tolerance, change < -tolerance
+        elif name.endswith(HIGHER_IS_BETTER):
+            worse, better = change < -tolerance, change > tolerance
+        else:
+            continue
+        if worse:
+            regressions.append(f"{name}: {old:.3f} -> {new:.3f} ({change:+.1%})")
+        improvements += better
+
+    print_section("📈 BASELINE COMPARISON")
+    print(f"✅ {improvements} metrics improved by more than {tolerance:.0%}")
+    if regressions:
+        print(f"❌ {len(regressions)} regressions:")
+        for line in regressions:
+            print(f"   🔻 {line}")
+    else:
+        print("✅ No regressions")
+    return regressions
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def sample_queries(documents: List[PreparedDocument], count: int, seed: int = 7) -> List[str]:
+    """Short word spans taken from the corpus, so lexical search has matches."""
+    rng = random.Random(seed)
+    chunks = [chunk.text for document in documents for chunk in document.chunks]
+    queries = []
+    for _ in range(count):
+        words = rng.choice(chunks).split()
+        start = rng.randrange(max(len(words) - 4, 1))
+        queries.append(" ".join(words[start:start + rng.randint(2, 4)]))
+    return queries
+
+
+def run_suite(args) -> int:
+    logging.getLogger().setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.corpus:
+            paths = sorted(os.path.join(args.corpus, name) for name in os.listdir(args.corpus)
+                           if name.rsplit(".", 1)[-1] in FORMATS)
+        else:
+            paths = generate_corpus(os.path.join(tmp, "corpus"), args.documents, args.kb, args.diacritics,
+                                    args.sections, formats=args.formats, seed=args.seed)
+        print(f"📄 Corpus: {len(paths)} files, {sum(os.path.getsize(p) for p in paths) / 1024 / 1024:.1f} MB")
+
+        documents = [prepare_document(path) for path in paths if path.endswith(".txt")] or \
+            [prepare_document(path) for path in paths]
+        texts = [chunk.text for document in documents for chunk in document.chunks]
+        queries = sample_queries(documents, args.queries)
+
+        results: Dict[str, Any] = {"parsing": bench_parsing(paths, args.repeat)}
+        results["embedder"], embeddings = bench_embedder(texts, args.embedding_backend, args.batch_size)
+        results["sql"] = bench_sql(documents, queries, tmp)
+        if embeddings is None:
+            embeddings = make_vectors(max(len(texts), args.vectors), EMBEDDING_DIM)
+        results["vector"] = bench_vector(embeddings, args.vector_backend, args.queries, tmp)
+        if not args.skip_macro:
+            results["macro"] = run_macro([os.path.abspath(p) for p in paths], queries, args.modes,
+                                         args.concurrency, args.embedding_backend, tmp)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("baseline", "output")},
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare_to_baseline(results, baseline["results"], args.tolerance, args.min_delta_ms):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro and macro benchmarks of the whole pipeline on a synthetic corpus.")
+    parser.add_argument("--corpus", default=None, help="Benchmark an existing directory instead of generating one")
+    parser.add_argument("--documents", type=int, default=5, help="Generated documents per format")
+    parser.add_argument("--kb", type=float, default=100.0, help="Approximate size of each generated document in KB")
+    parser.add_argument("--diacritics", type=float, default=0.3, help="Probability that a letter carries a diacritic")
+    parser.add_argument("--sections", type=int, default=8, help="Headings per generated document")
+    parser.add_argument("--formats", nargs="+", default=list(FORMATS), choices=FORMATS, help="Generated formats")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus random seed")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions of the parsing benchmark")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per search benchmark")
+    parser.add_argument("--vectors", type=int, default=10000, help="Minimum vectors for the vector store benchmark")
+    parser.add_argument("--batch-size", type=int, default=32, help="Embedding batch size")
+    parser.add_argument("--embedding-backend", default="torch", help="Embedding backend (torch, onnx, onnx-fp32)")
+    parser.add_argument("--vector-backend", default="ivf", choices=["ivf", "chroma"], help="Vector store to benchmark")
+    parser.add_argument("--modes", nargs="+", default=["vector", "lexical", "hybrid"], help="Search modes to query")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4], help="Concurrent query clients")
+    parser.add_argument("--skip-macro", action="store_true", help="Only run the per-stage micro benchmarks")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", default=None, help="Earlier results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed relative slowdown before a metric is flagged (0.1 = 10%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=DEFAULT_MIN_DELTA_MS,
+                        help="Ignore timing changes smaller than this many milliseconds")
+    sys.exit(run_suite(parser.parse_args()))
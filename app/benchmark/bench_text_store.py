@@ -0,0 +1,74 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from app.benchmark.corpus import generate_corpus
+from app.parser.document import prepare_document
+from app.storage.sql_db import SQLDB, DocumentWrite, TEXT_STORAGES
+
+
+def document_write(path: str, name: str) -> DocumentWrite:
+    document = prepare_document(path)
+    rows = [
+        (f"{name}_{i}", i, chunk.text, chunk.heading, chunk.page_start, chunk.page_end, chunk.start, chunk.end, None)
+        for i, chunk in enumerate(document.chunks)
+    ]
+    return DocumentWrite(name, document.filename, document.file_type, None, None, rows)
+
+
+def database_bytes(db: SQLDB) -> int:
+    db.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    db.conn.execute("VACUUM")
+    return os.path.getsize(db.db_path)
+
+
+def benchmark_text_store(documents: int, size_kb: float, lookups: int, top_k: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = generate_corpus(os.path.join(tmp, "corpus"), documents, size_kb, formats=("txt",))
+        writes = [document_write(path, f"doc_{i}") for i, path in enumerate(paths)]
+        chunk_ids = [row[0] for write in writes for row in write.chunks]
+        chunk_chars = sum(len(row[2]) for write in writes for row in write.chunks)
+
+        print("\n" + "="*30)
+        print("📊 CHUNK TEXT STORAGE BENCHMARK")
+        print("="*30)
+        print(f"📄 {documents} documents, {len(chunk_ids)} chunks, {chunk_chars / 1e6:.1f}M chunk characters")
+        expected = None
+        for storage in TEXT_STORAGES:
+            db = SQLDB(os.path.join(tmp, f"{storage}.db"), text_storage=storage)
+            start = time.perf_counter()
+            db.add_documents(writes)
+            write_seconds = time.perf_counter() - start
+            size = database_bytes(db)
+
+            rng = random.Random(0)
+            queries = [rng.sample(chunk_ids, top_k) for _ in range(lookups)]
+            start = time.perf_counter()
+            texts = [db.get_chunk_texts(ids) for ids in queries]
+            hydrate_ms = (time.perf_counter() - start) * 1000 / lookups
+            if expected is None:
+                expected = texts
+            elif texts != expected:
+                raise AssertionError(f"{storage} storage returned different chunk text")
+
+            print(f"\n🔹 {storage}")
+            print(f"💾 Database: {size / 1e6:.2f} MB")
+            print(f"⏱️  Write: {write_seconds:.2f} s | hydrate top-{top_k}: {hydrate_ms:.2f} ms")
+            db.close()
+        print("="*30)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Disk footprint and hydration latency of inline vs compressed chunk text.")
+    parser.add_argument("--documents", type=int, default=20, help="Documents in the generated corpus")
+    parser.add_argument("--kb", type=float, default=200.0, help="Approximate size of each document in KB")
+    parser.add_argument("--lookups", type=int, default=500, help="Random top-k hydrations to time")
+    parser.add_argument("--top-k", type=int, default=10, help="Chunks hydrated per lookup")
+    args = parser.parse_args()
+    benchmark_text_store(args.documents, args.kb, args.lookups, args.top_k)
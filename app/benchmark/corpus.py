@@ -0,0 +1,171 @@
+import argparse
+import itertools
+import os
+import random
+import sys
+from typing import List, Optional, Tuple
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from app.utils.arabic_cleaner import DIACRITICS
+
+ARABIC_LETTERS = "ابتثجحخدذرزسشصضطظعغفقكلمنهوي"
+VARIANT_LETTERS = "أإآى"
+INDIC_DIGITS = "٠١٢٣٤٥٦٧٨٩"
+ORDINALS = ["الأول", "الثاني", "الثالث", "الرابع", "الخامس", "السادس", "السابع", "الثامن", "التاسع", "العاشر"]
+FORMATS = ("txt", "docx", "pdf")
+# Font with Arabic glyphs used for generated PDFs (PyMuPDF's base fonts have none)
+PDF_FONT = os.getenv("BENCH_PDF_FONT", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+
+# A block is (heading_level, text); level 0 is a body paragraph
+Block = Tuple[int, str]
+
+
+class CorpusGenerator:
+    def __init__(self, vocabulary: int = 20000, diacritics: float = 0.3, seed: int = 0):
+        """
+        Synthetic Arabic text with a Zipf word distribution (like natural
+        text). diacritics is the probability that a letter carries a mark;
+        words also get alef/yeh variants and tatweel so the normalizer has
+        work to do. The text is Arabic-only so it survives a PDF round trip.
+        """
+        self.rng = random.Random(seed)
+        self.diacritics = diacritics
+        self.words = [self._make_word() for _ in range(vocabulary)]
+        self.cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(vocabulary)))
+
+    def _make_word(self) -> str:
+        rng = self.rng
+        letters = [rng.choice(ARABIC_LETTERS) for _ in range(rng.randint(2, 7))]
+        if rng.random() < 0.1:
+            letters[0] = rng.choice(VARIANT_LETTERS)
+        if rng.random() < 0.02:
+            letters.insert(len(letters) // 2, "ـ")
+        return ("ال" if rng.random() < 0.3 else "") + "".join(letters)
+
+    def _decorate(self, word: str) -> str:
+        if not self.diacritics:
+            return word
+        return "".join(
+            char + self.rng.choice(DIACRITICS) if char != "ـ" and self.rng.random() < self.diacritics else char
+            for char in word
+        )
+
+    def sentence(self, words: Optional[int] = None) -> str:
+        rng = self.rng
+        count = words or rng.randint(6, 24)
+        tokens = [self._decorate(word) for word in rng.choices(self.words, cum_weights=self.cum_weights, k=count)]
+        if rng.random() < 0.1:
+            tokens.insert(rng.randrange(len(tokens)), "".join(rng.choice(INDIC_DIGITS) for _ in range(4)))
+        return " ".join(tokens) + rng.choice([".", ".", ".", "؟", "!"])
+
+    def paragraph(self) -> str:
+        return " ".join(self.sentence() for _ in range(self.rng.randint(2, 8)))
+
+    def document(self, size_kb: float, sections: int = 8, subsections: int = 0) -> List[Block]:
+        """
+        Blocks of roughly size_kb kilobytes (UTF-8) split into sections
+        headed "الفصل <ordinal>" (what the chunker detects), optionally with
+        level-2 subheadings, framed by an introduction and a conclusion.
+        """
+        target = int(size_kb * 1024)
+        blocks: List[Block] = [(1, "مقدمة")]
+        size = 0
+        per_section = max(target // max(sections, 1), 1)
+        section = 0
+        while size < target:
+            if sections and size >= section * per_section and section < sections:
+                blocks.append((1, f"الفصل {ORDINALS[section % len(ORDINALS)]}: {self.sentence(3)[:-1]}"))
+                section += 1
+            elif subsections and self.rng.random() < subsections / 10:
+                blocks.append((2, self.sentence(4)[:-1]))
+            text = self.paragraph()
+            blocks.append((0, text))
+            size += len(text.encode("utf-8"))
+        blocks.append((1, "خاتمة"))
+        blocks.append((0, self.paragraph()))
+        return blocks
+
+
+def write_txt(blocks: List[Block], path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        for _, text in blocks:
+            f.write(text + "\n")
+
+
+def write_docx(blocks: List[Block], path: str):
+    import docx
+
+    document = docx.Document()
+    for level, text in blocks:
+        if level:
+            document.add_heading(text, level=level)
+        else:
+            document.add_paragraph(text)
+    document.save(path)
+
+
+def write_pdf(blocks: List[Block], path: str, words_per_line: int = 12, lines_per_page: int = 45):
+    """
+    Each line is written in visual (reversed) order without shaping; MuPDF
+    detects the right-to-left run on extraction and returns logical order.
+    """
+    import fitz  # PyMuPDF
+
+    if not os.path.exists(PDF_FONT):
+        raise FileNotFoundError(f"No Arabic-capable font at {PDF_FONT}; set BENCH_PDF_FONT")
+    lines = []
+    for level, text in blocks:
+        words = text.split()
+        lines.extend(" ".join(words[i:i + words_per_line]) for i in range(0, len(words), words_per_line))
+        lines.append("")
+
+    with open(PDF_FONT, "rb") as f:
+        font_buffer = f.read()
+    document = fitz.open()
+    for start in range(0, len(lines), lines_per_page):
+        page = document.new_page()
+        page.insert_font(fontname="arabic", fontbuffer=font_buffer)
+        shape = page.new_shape()
+        for row, line in enumerate(lines[start:start + lines_per_page]):
+            if line:
+                shape.insert_text((40, 50 + row * 16), line[::-1], fontname="arabic", fontsize=10)
+        shape.commit()
+    document.subset_fonts()
+    document.save(path, deflate=True)
+    document.close()
+
+
+WRITERS = {"txt": write_txt, "docx": write_docx, "pdf": write_pdf}
+
+
+def generate_corpus(output_dir: str, documents: int = 10, size_kb: float = 100.0, diacritics: float = 0.3,
+                    sections: int = 8, subsections: int = 0, formats=FORMATS, seed: int = 0) -> List[str]:
+    """Write `documents` files in each format to output_dir and return their paths."""
+    os.makedirs(output_dir, exist_ok=True)
+    generator = CorpusGenerator(diacritics=diacritics, seed=seed)
+    paths = []
+    for i in range(documents):
+        blocks = generator.document(size_kb, sections=sections, subsections=subsections)
+        for file_format in formats:
+            path = os.path.join(output_dir, f"doc_{i:04d}.{file_format}")
+            WRITERS[file_format](blocks, path)
+            paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic Arabic corpus for benchmarks.")
+    parser.add_argument("output", help="Directory to write the corpus to")
+    parser.add_argument("--documents", type=int, default=10, help="Documents per format")
+    parser.add_argument("--kb", type=float, default=100.0, help="Approximate size of each document in KB")
+    parser.add_argument("--diacritics", type=float, default=0.3, help="Probability that a letter carries a diacritic")
+    parser.add_argument("--sections", type=int, default=8, help="'الفصل' headings per document")
+    parser.add_argument("--subsections", type=int, default=0, help="Density (0-10) of level-2 headings")
+    parser.add_argument("--formats", nargs="+", default=list(FORMATS), choices=FORMATS, help="File formats")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+    paths = generate_corpus(args.output, args.documents, args.kb, args.diacritics, args.sections,
+                            args.subsections, args.formats, args.seed)
+    print(f"✅ Wrote {len(paths)} files to {args.output}")
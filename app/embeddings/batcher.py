@@ -0,0 +1,108 @@
+import asyncio
+import math
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+# Number of recent requests kept for latency percentiles
+LATENCY_WINDOW = 10000
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile of a list of samples (q in 0..100)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = math.ceil(q / 100 * len(ordered))
+    return ordered[min(len(ordered), max(rank, 1)) - 1]
+
+
+class QueryBatcher:
+    def __init__(self, embed_batch: Callable[[List[str]], List[List[float]]], max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0):
+        """
+        Micro-batch concurrent query embeddings.
+        Queries arriving within max_wait_ms of each other (up to max_batch_size)
+        are encoded with a single model call on a dedicated thread, keeping the
+        event loop free while the model runs.
+        """
+        self.embed_batch = embed_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="query-embed")
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._batch_sizes = Counter()
+        self.requests = 0
+        self.batches = 0
+
+    async def embed(self, text: str) -> List[float]:
+        """Embed one query, sharing the model call with concurrent callers."""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future, time.perf_counter()))
+        return await future
+
+    async def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a caller-side batch directly, on the same model thread as the
+        micro-batches so model calls never overlap.
+        """
+        if not texts:
+            return []
+        embeddings = await asyncio.get_running_loop().run_in_executor(self._executor, self.embed_batch, texts)
+        self.requests += len(texts)
+        self.batches += 1
+        self._batch_sizes[len(texts)] += 1
+        return embeddings
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            texts = [text for text, _, _ in batch]
+            try:
+                embeddings = await loop.run_in_executor(self._executor, self.embed_batch, texts)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            now = time.perf_counter()
+            self.requests += len(batch)
+            self.batches += 1
+            self._batch_sizes[len(batch)] += 1
+            for (_, future, enqueued), embedding in zip(batch, embeddings):
+                self._latencies.append(now - enqueued)
+                if not future.done():
+                    future.set_result(embedding)
+
+    def stats(self) -> Dict[str, object]:
+        latencies = list(self._latencies)
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+            "latency_p50_ms": percentile(latencies, 50) * 1000,
+            "latency_p99_ms": percentile(latencies, 99) * 1000,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+        }
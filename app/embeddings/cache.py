@@ -0,0 +1,115 @@
+import hashlib
+import os
+import sqlite3
+import unicodedata
+from threading import Lock
+from typing import Dict, Iterable
+
+import numpy as np
+
+from app.utils.lru import LRUCache
+
+
+def cache_key(model_name: str, text: str) -> str:
+    """
+    Build the cache key for a (model, text) pair.
+    Whitespace and Unicode composition are normalized so that re-extracted
+    copies of the same chunk hit the same entry.
+    """
+    normalized = unicodedata.normalize("NFC", " ".join(text.split()))
+    return hashlib.sha256(f"{model_name}\x00{normalized}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, db_path: str = "data/embedding_cache.db", memory_size: int = 10000):
+        """
+        Two-tier embedding cache: an in-memory LRU in front of a
+        persistent SQLite table of float32 vectors.
+        """
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        self.memory = LRUCache(memory_size)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = Lock()
+        self._create_tables()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.encode_seconds = 0.0
+        self.encoded_texts = 0
+
+    def _create_tables(self):
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                dim INTEGER,
+                vector BLOB
+            )
+        ''')
+        self.conn.commit()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Return the cached vectors for the given keys (missing keys are omitted)."""
+        found = {}
+        pending = []
+        for key in dict.fromkeys(keys):
+            vector = self.memory.get(key)
+            if vector is not None:
+                found[key] = vector
+                self.memory_hits += 1
+            else:
+                pending.append(key)
+
+        # SQLite caps the number of bound parameters per statement
+        for start in range(0, len(pending), 500):
+            batch = pending[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            with self._lock:
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+            for key, blob in rows:
+                vector = np.frombuffer(blob, dtype=np.float32)
+                self.memory.put(key, vector)
+                found[key] = vector
+            self.disk_hits += len(rows)
+            self.misses += len(batch) - len(rows)
+
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        """Store vectors in both tiers in a single transaction."""
+        rows = []
+        for key, vector in items.items():
+            # Copy, so a cached row never keeps a whole batch array alive
+            vector = np.array(vector, dtype=np.float32)
+            self.memory.put(key, vector)
+            rows.append((key, vector.shape[0], vector.tobytes()))
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, dim, vector) VALUES (?, ?, ?)", rows
+            )
+            self.conn.commit()
+
+    def record_encode(self, count: int, seconds: float):
+        """Track model time spent on misses, used to estimate the time saved by hits."""
+        self.encoded_texts += count
+        self.encode_seconds += seconds
+
+    def stats(self) -> Dict[str, float]:
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        per_text = self.encode_seconds / self.encoded_texts if self.encoded_texts else 0.0
+        return {
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / total if total else 0.0,
+            "encode_seconds": self.encode_seconds,
+            "estimated_seconds_saved": hits * per_text,
+        }
@@ -1,21 +1,120 @@
-from sentence_transformers import SentenceTransformer
-from typing import List
+from typing import List, Optional
+import time
 import numpy as np
+from app.embeddings.cache import EmbeddingCache, cache_key
+from app.embeddings.tokens import SPECIAL_TOKENS, TokenCounter
+
+# Inference backends: PyTorch fp32, or ONNX Runtime with the fp32 / int8 exported model
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-fp32")
+# Upper bound on texts per model call when texts are short
+MAX_BUCKET_SIZE = 256
+# Characters per token assumed when bucketing; Arabic and Latin text average more,
+# so sequence lengths are overestimated and batches stay within the token budget
+CHARS_PER_TOKEN = 3
 
 class Embedder:
-    def __init__(self, model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"):
+    def __init__(self, model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2", cache: Optional[EmbeddingCache] = None,
+                 backend: str = "torch", batch_size: int = 32, threads: Optional[int] = None,
+                 onnx_dir: Optional[str] = None, max_batch_tokens: Optional[int] = None):
         """
         Initialize the embedder with a multilingual model.
         This model performs well with Arabic text.
+        An optional EmbeddingCache skips re-encoding previously seen chunks.
+        backend="onnx" runs the locally exported int8 model with ONNX Runtime
+        (see app/embeddings/onnx_backend.py); threads sets intra-op threads.
+        max_batch_tokens is the padded-token budget of one embed_batch model
+        call (default: batch_size full-length sequences), which bounds the
+        activation memory whatever the mix of chunk lengths.
         """
-        self.model = SentenceTransformer(model_name)
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown embedding backend: {backend}")
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        if backend == "torch":
+            import torch
+            from sentence_transformers import SentenceTransformer
+            if threads:
+                torch.set_num_threads(threads)
+            self.model = SentenceTransformer(model_name)
+        else:
+            from app.embeddings.onnx_backend import OnnxEncoder, default_model_dir
+            self.model = OnnxEncoder(onnx_dir or default_model_dir(model_name), quantized=backend == "onnx",
+                                     intra_op_threads=threads, batch_size=batch_size)
+        # Vectors from different backends differ slightly, so they are cached apart
+        self.cache_namespace = model_name if backend == "torch" else f"{model_name}#{backend}"
+        self.cache = cache
+        self.max_batch_tokens = max_batch_tokens or batch_size * self.model.max_seq_length
+
+    def token_counter(self) -> TokenCounter:
+        """Token counter sharing this model's tokenizer and sequence limit."""
+        return TokenCounter(self.model_name, self.model.max_seq_length, tokenizer=self.model.tokenizer)
 
     def embed_text(self, text: str) -> List[float]:
         """Generate embedding for a single string."""
-        embedding = self.model.encode(text)
+        embedding = self.model.encode(text, batch_size=self.batch_size)
         return embedding.tolist()
 
-    def embed_batch(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for a list of strings."""
-        embeddings = self.model.encode(texts)
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of search queries in one call, bypassing the chunk cache."""
+        embeddings = self.model.encode(texts, batch_size=self.batch_size)
         return embeddings.tolist()
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """
+        Generate embeddings for a list of strings as one contiguous float32
+        array (one row per text, in input order).
+        """
+        if self.cache is None:
+            return self._encode_bucketed(texts)
+
+        keys = [cache_key(self.cache_namespace, text) for text in texts]
+        found = self.cache.get_many(keys)
+
+        # Only encode texts whose key is not cached (each unique key once)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        if missing:
+            start = time.perf_counter()
+            encoded = self._encode_bucketed(list(missing.values()))
+            self.cache.record_encode(len(missing), time.perf_counter() - start)
+            new_vectors = dict(zip(missing.keys(), encoded))
+            self.cache.put_many(new_vectors)
+            found.update(new_vectors)
+
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([found[key] for key in keys]).astype(np.float32, copy=False)
+
+    def _encode_bucketed(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode texts sorted by length, in batches sized so that batch size x
+        longest sequence stays within max_batch_tokens: short chunks share
+        large batches, long ones get small batches, and little compute goes
+        to padding. Sequence lengths are estimated from character counts,
+        so texts are only tokenized once, by the model itself.
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        max_length = self.model.max_seq_length
+        lengths = [min(max_length, len(text) // CHARS_PER_TOKEN + SPECIAL_TOKENS) for text in texts]
+        order = sorted(range(len(texts)), key=lambda i: lengths[i])
+
+        output = None
+        start = 0
+        while start < len(order):
+            end = start + 1
+            # Ascending order: the last text of a batch sets its padded length
+            while (end < len(order) and end - start < MAX_BUCKET_SIZE
+                   and (end - start + 1) * lengths[order[end]] <= self.max_batch_tokens):
+                end += 1
+            batch = order[start:end]
+            vectors = self.model.encode([texts[i] for i in batch], batch_size=len(batch), convert_to_numpy=True)
+            if output is None:
+                output = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            output[batch] = vectors
+            start = end
+        return output
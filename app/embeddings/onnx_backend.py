@@ -0,0 +1,130 @@
+import argparse
+import os
+from typing import Optional
+
+import numpy as np
+
+DEFAULT_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+# Used when an export's tokenizer does not record the model's sequence limit
+DEFAULT_MAX_SEQ_LENGTH = 128
+
+
+def default_model_dir(model_name: str) -> str:
+    return os.path.join("data", "onnx", model_name.replace("/", "__"))
+
+
+def export_onnx_model(model_name: str = DEFAULT_MODEL, output_dir: Optional[str] = None, quantize: bool = True) -> str:
+    """
+    Export the transformer of a SentenceTransformer model to ONNX (fp32) and,
+    optionally, a dynamically int8-quantized copy. The tokenizer is saved next
+    to the model, with the SentenceTransformer's max_seq_length as its
+    model_max_length, so the ONNX backend never needs the original checkpoint.
+    Returns the output directory.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    output_dir = output_dir or default_model_dir(model_name)
+    os.makedirs(output_dir, exist_ok=True)
+
+    transformer = SentenceTransformer(model_name, device="cpu")[0]
+    tokenizer = transformer.tokenizer
+    tokenizer.model_max_length = transformer.max_seq_length
+    model = transformer.auto_model.eval()
+    sample = tokenizer(["نموذج لتصدير المحول"], return_tensors="pt")
+    fp32_path = os.path.join(output_dir, FP32_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=14,
+        )
+    tokenizer.save_pretrained(output_dir)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_path, os.path.join(output_dir, INT8_FILE), weight_type=QuantType.QInt8)
+    return output_dir
+
+
+class OnnxEncoder:
+    def __init__(self, model_dir: str, quantized: bool = True, intra_op_threads: Optional[int] = None,
+                 batch_size: int = 32, max_seq_length: Optional[int] = None):
+        """
+        ONNX Runtime CPU encoder with the SentenceTransformer interface used
+        by Embedder (encode, tokenizer, max_seq_length).
+        max_seq_length defaults to the limit the export recorded in the
+        tokenizer (DEFAULT_MAX_SEQ_LENGTH for exports that lack one).
+        Texts are tokenized once, sorted by token length and batched so each
+        batch is padded only to its own longest text; embeddings are mean
+        pooled like the original model and returned in input order.
+        """
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_path = os.path.join(model_dir, INT8_FILE if quantized else FP32_FILE)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"ONNX model not found at {model_path}. Export it first: "
+                f"python -m app.embeddings.onnx_backend --output {model_dir}"
+            )
+
+        options = ort.SessionOptions()
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.batch_size = batch_size
+        # Tokenizers without a configured limit report a huge sentinel value
+        recorded = self.tokenizer.model_max_length
+        self.max_seq_length = max_seq_length or (recorded if recorded <= 1_000_000 else DEFAULT_MAX_SEQ_LENGTH)
+
+    def encode(self, texts, batch_size: Optional[int] = None, **_) -> np.ndarray:
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        batch_size = batch_size or self.batch_size
+
+        encoded = self.tokenizer(texts, truncation=True, max_length=self.max_seq_length,
+                                 return_attention_mask=False, return_token_type_ids=False)["input_ids"]
+        order = sorted(range(len(texts)), key=lambda i: len(encoded[i]))
+        pad_id = self.tokenizer.pad_token_id or 0
+
+        embeddings = None
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            length = max(len(encoded[i]) for i in batch)
+            input_ids = np.full((len(batch), length), pad_id, dtype=np.int64)
+            attention_mask = np.zeros((len(batch), length), dtype=np.int64)
+            for row, i in enumerate(batch):
+                input_ids[row, :len(encoded[i])] = encoded[i]
+                attention_mask[row, :len(encoded[i])] = 1
+
+            hidden = self.session.run(None, {"input_ids": input_ids, "attention_mask": attention_mask})[0]
+            mask = attention_mask[:, :, None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if embeddings is None:
+                embeddings = np.empty((len(texts), pooled.shape[1]), dtype=np.float32)
+            embeddings[batch] = pooled
+        return embeddings[0] if single else embeddings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX with int8 dynamic quantization.")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Hugging Face model name")
+    parser.add_argument("--output", default=None, help="Output directory (default: data/onnx/<model>)")
+    parser.add_argument("--no-quantize", action="store_true", help="Only export the fp32 model")
+    args = parser.parse_args()
+    print(f"✅ Exported to {export_onnx_model(args.model, args.output, quantize=not args.no_quantize)}")
@@ -0,0 +1,74 @@
+import threading
+from typing import Any, Dict, List, Optional
+
+from app.utils.lru import LRUCache
+
+# [CLS] and [SEP] are added to every sequence the model encodes
+SPECIAL_TOKENS = 2
+
+# Tokenizers loaded by this process, by model name. Counters unpickled in a
+# worker process share them, so each worker loads a tokenizer once rather
+# than once per submitted document.
+_TOKENIZERS: Dict[str, Any] = {}
+_TOKENIZERS_LOCK = threading.Lock()
+
+
+def load_tokenizer(model_name: str):
+    with _TOKENIZERS_LOCK:
+        if model_name not in _TOKENIZERS:
+            from transformers import AutoTokenizer
+            _TOKENIZERS[model_name] = AutoTokenizer.from_pretrained(model_name)
+        return _TOKENIZERS[model_name]
+
+
+class TokenCounter:
+    def __init__(self, model_name: str, max_seq_length: int, tokenizer=None, cache_size: int = 100000):
+        """
+        Count tokens with the embedding model's own tokenizer.
+        Counts are cached per text and misses are tokenized in one batch call.
+        Only the model name is pickled, so a counter can be sent to worker
+        processes, which load the tokenizer on first use (once per process,
+        see load_tokenizer).
+        """
+        self.model_name = model_name
+        self.max_seq_length = max_seq_length
+        self.cache_size = cache_size
+        self._tokenizer = tokenizer
+        self._cache = LRUCache(cache_size)
+
+    @property
+    def max_tokens(self) -> int:
+        """Content tokens that fit in one sequence before the model truncates."""
+        return self.max_seq_length - SPECIAL_TOKENS
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            self._tokenizer = load_tokenizer(self.model_name)
+        return self._tokenizer
+
+    def count(self, text: str) -> int:
+        return self.count_many([text])[0]
+
+    def count_many(self, texts: List[str]) -> List[int]:
+        counts: List[Optional[int]] = [self._cache.get(text) for text in texts]
+        missing = list(dict.fromkeys(text for text, count in zip(texts, counts) if count is None))
+        if missing:
+            encoded = self.tokenizer(
+                missing,
+                add_special_tokens=False,
+                return_attention_mask=False,
+                return_token_type_ids=False,
+            )["input_ids"]
+            found: Dict[str, int] = {}
+            for text, ids in zip(missing, encoded):
+                found[text] = len(ids)
+                self._cache.put(text, len(ids))
+            counts = [found[text] if count is None else count for text, count in zip(texts, counts)]
+        return counts
+
+    def __getstate__(self):
+        return {"model_name": self.model_name, "max_seq_length": self.max_seq_length, "cache_size": self.cache_size}
+
+    def __setstate__(self, state):
+        self.__init__(state["model_name"], state["max_seq_length"], cache_size=state["cache_size"])
@@ -1,110 +1,456 @@
 import os
 import uuid
+import hashlib
 import logging
-from typing import List, Dict, Any
-from app.parser.loader import load_document
-from app.parser.chunker import chunk_text
+import numpy as np
+from typing import List, Dict, Any, NamedTuple, Tuple, Callable, Optional
+from app.parser.document import PreparedDocument, file_sha256, prepare_document
 from app.embeddings.embedder import Embedder
-from app.storage.vector_db import VectorDB
-from app.storage.sql_db import SQLDB
+from app.embeddings.cache import EmbeddingCache
+from app.storage.vector_store import create_vector_store, split_results
+from app.storage.sql_db import SQLDB, DocumentWrite
+from app.utils.rank_fusion import reciprocal_rank_fusion
+from app.utils.metrics import StageTrace, format_trace
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+# Candidates fetched from each retriever per requested result in hybrid search
+HYBRID_CANDIDATE_FACTOR = 4
+
+
+def create_embedder(backend: str = "torch") -> Embedder:
+    """Embedder configured from EMBEDDING_BATCH_SIZE / EMBEDDING_THREADS (no cache attached)."""
+    return Embedder(
+        backend=backend,
+        batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "32")),
+        threads=int(os.getenv("EMBEDDING_THREADS", "0")) or None,
+    )
+
+
+class IngestPlan(NamedTuple):
+    """What has to change in storage to bring a document up to date."""
+    doc_id: str
+    status: str              # "new" or "updated"
+    source: str              # Stable identity of the document (absolute path, or upload key)
+    chunk_ids: List[str]     # Content-addressed ids, aligned with document.chunks
+    new_indices: List[int]   # Chunks that are not stored yet and need embedding
+    stale_ids: List[str]     # Stored chunks that no longer exist in the document
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def chunk_ids_for(doc_id: str, chunk_texts: List[str]) -> List[str]:
+    """
+    Content-addressed chunk ids: the same text in the same document always
+    gets the same id, so re-ingesting only touches chunks that changed.
+    Repeated texts within a document are told apart by occurrence number.
+    """
+    ids = []
+    seen: Dict[str, int] = {}
+    for text in chunk_texts:
+        digest = chunk_hash(text)
+        occurrence = seen.get(digest, 0)
+        seen[digest] = occurrence + 1
+        ids.append(f"{doc_id}_{digest}" if occurrence == 0 else f"{doc_id}_{digest}_{occurrence}")
+    return ids
+
 class DocumentProcessor:
-    def __init__(self):
+    def __init__(self, chunking: str = "chars", embedding_backend: str = "torch", embedder: Optional[Embedder] = None):
         """
         Initialize the full RAG pipeline components.
+        chunking="tokens" sizes chunks with the embedding model's tokenizer
+        instead of by character count. embedding_backend selects the model
+        runtime ("torch", or "onnx" for the int8 ONNX Runtime export);
+        EMBEDDING_THREADS and EMBEDDING_BATCH_SIZE tune inference.
+        A preloaded embedder (e.g. shared by forked server workers) can be passed in.
         """
-        self.embedder = Embedder()
-        self.vector_db = VectorDB()
+        if chunking not in ("chars", "tokens"):
+            raise ValueError(f"Unknown chunking mode: {chunking}")
+        self.embedder = embedder or create_embedder(embedding_backend)
+        if self.embedder.cache is None:
+            self.embedder.cache = EmbeddingCache()
+        self.token_counter = self.embedder.token_counter() if chunking == "tokens" else None
+        self.vector_db = create_vector_store()
         self.sql_db = SQLDB()
         logging.info("🚀 DocumentProcessor initialized successfully.")
 
-    def process_file(self, file_path: str) -> tuple:
+    @property
+    def generation(self) -> int:
+        """
+        Bumped after every write so cached search results can be invalidated.
+        Kept in SQLite so forked server workers see each other's writes.
+        """
+        return self.sql_db.get_generation()
+
+    def process_file(self, file_path: str, on_stage: Optional[Callable[[str], None]] = None,
+                     source: Optional[str] = None, content_hash: Optional[str] = None,
+                     data: Optional[bytes] = None, doc_id: Optional[str] = None) -> tuple:
         """
         Execute the full pipeline for a single file.
+        source identifies the document across re-ingests (defaults to the
+        absolute file path). A file whose content was already ingested is
+        skipped; a changed version of a known source only embeds and stores
+        the chunks that changed. doc_id, if given, names the document to
+        replace instead (explicit replacement of an upload).
+        on_stage, if given, is called with each stage name as it starts
+        (loading, chunking, embedding, storing).
+        Per-stage timings, size, chunk counts and peak RSS are published to
+        the metrics registry (see app.utils.metrics).
+        content_hash and data may be supplied by callers that already hashed
+        or buffered the file (uploads), so it is not read again.
         Returns: (doc_id, preview_chunks)
         """
         logging.info(f"[*] Processing file: {file_path}")
+        source = source or os.path.abspath(file_path)
+        trace = StageTrace("ingest", label=file_path)
         
         try:
-            # 1. Load
-            text = load_document(file_path)
-            if not text or not text.strip():
-                raise ValueError("No text could be extracted. File might be empty or scanned image.")
-            
-            filename = os.path.basename(file_path)
-            file_type = filename.split('.')[-1]
-            doc_id = str(uuid.uuid4())
-            
-            # 2. Store document metadata in SQL
-            self.sql_db.add_document(doc_id, filename, file_type)
-            
-            # 3. Chunk
-            chunks_data = chunk_text(text)
-            logging.info(f"[+] Created {len(chunks_data)} chunks for {filename}.")
-            
-            if not chunks_data:
-                logging.warning("File produced 0 chunks. Skipping embedding.")
-                return doc_id, []
+            trace.count("bytes", len(data) if data is not None else os.path.getsize(file_path))
 
-            # Unpack chunks and headings
-            chunk_texts = [c[0] for c in chunks_data]
-            chunk_headings = [c[1] for c in chunks_data]
+            # 0. Skip files whose exact content is already stored
+            with trace.stage("hashing"):
+                if content_hash is None:
+                    content_hash = hashlib.sha256(data).hexdigest() if data is not None else file_sha256(file_path)
+                duplicate = self.find_duplicate(content_hash)
+            if duplicate and doc_id in (None, duplicate[0]):
+                logging.info(f"⏭️  Unchanged content, already stored as {duplicate[0]}. Skipping.")
+                trace.finish("duplicate")
+                return duplicate
 
-            # 4. Embed (Batch processing is faster)
-            embeddings = self.embedder.embed_batch(chunk_texts)
-            
-            # 5. Prepare data for storage
-            chunk_ids = []
-            metadatas = []
-            
-            for i, (chunk, embedding, heading) in enumerate(zip(chunk_texts, embeddings, chunk_headings)):
-                chunk_id = f"{doc_id}_{i}"
-                chunk_ids.append(chunk_id)
-                
-                # Metadata for Vector DB
-                metadata = {
-                    "doc_id": doc_id,
-                    "filename": filename,
-                    "chunk_index": i
-                }
-                if heading:
-                    metadata["heading"] = heading
-                    
-                metadatas.append(metadata)
-                
-                # Store in SQL (Detailed storage)
-                try:
-                    self.sql_db.add_chunk(chunk_id, doc_id, i, chunk, heading=heading)
-                except TypeError:
-                    # Fallback if add_chunk signature in SQLDB hasn't been updated to accept heading
-                     self.sql_db.add_chunk(chunk_id, doc_id, i, chunk)
-                
-            # Store in Vector DB
-            self.vector_db.add_chunks(chunk_texts, embeddings, metadatas, chunk_ids)
+            # 1. Load and chunk
+            document = prepare_document(file_path, on_stage=on_stage, token_counter=self.token_counter,
+                                        content_hash=content_hash, filename=os.path.basename(source), trace=trace,
+                                        data=data)
+            logging.info(f"[+] Created {len(document.chunks)} chunks for {document.filename}.")
+            if document.stats:
+                self.log_chunk_stats(document)
+
+            with trace.stage("planning"):
+                plan = self.plan_document(document, source, doc_id)
+            chunk_texts = [c.text for c in document.chunks]
+            trace.count("chunks", len(chunk_texts))
+            trace.count("embedded_chunks", len(plan.new_indices))
+
+            # 2. Embed only new or changed chunks (Batch processing is faster)
+            if on_stage:
+                on_stage("embedding")
+            with trace.stage("embedding"):
+                embeddings = self.embed_chunks([chunk_texts[i] for i in plan.new_indices]) if plan.new_indices else []
+
+            # 3. Store
+            if on_stage:
+                on_stage("storing")
+            self.store_documents([(plan, document, embeddings)], trace=trace)
             
-            logging.info(f"✅ Processing complete for {filename}. Doc ID: {doc_id}")
+            summary = trace.finish(plan.status)
+            logging.info(
+                f"✅ Processing complete for {document.filename}. Doc ID: {plan.doc_id} ({plan.status}: "
+                f"{len(plan.new_indices)} chunks embedded, {len(plan.stale_ids)} removed) in {format_trace(summary)}"
+            )
             # Return doc_id and first 3 chunks type for preview
-            return doc_id, chunk_texts[:3]
+            return plan.doc_id, chunk_texts[:3]
 
         except Exception as e:
+            trace.finish("failed")
             logging.error(f"❌ Error processing file {file_path}: {str(e)}")
             raise e
 
-    def ask(self, query: str, n_results: int = 3) -> Dict[str, Any]:
+    def find_duplicate(self, content_hash: str) -> Optional[tuple]:
+        """(doc_id, preview_chunks) of an already stored document with this content hash, if any."""
+        existing_id = self.sql_db.find_document_by_hash(content_hash)
+        if not existing_id:
+            return None
+        return existing_id, [content for content, _ in self.sql_db.get_chunks(existing_id)[:3]]
+
+    def plan_document(self, document: PreparedDocument, source: str, doc_id: Optional[str] = None) -> IngestPlan:
+        """
+        Diff a prepared document against what is stored for its source (or
+        for doc_id, when a specific document is being replaced).
+        """
+        if doc_id is None:
+            doc_id = self.sql_db.find_document_by_source(source)
+        elif self.sql_db.get_document_metadata(doc_id) is None:
+            raise ValueError(f"Unknown document to replace: {doc_id}")
+        status = "updated" if doc_id else "new"
+        doc_id = doc_id or str(uuid.uuid4())
+
+        chunk_ids = chunk_ids_for(doc_id, [c.text for c in document.chunks])
+        stored_ids = set(self.sql_db.get_chunk_ids(doc_id)) if status == "updated" else set()
+        current_ids = set(chunk_ids)
+        return IngestPlan(
+            doc_id,
+            status,
+            source,
+            chunk_ids,
+            [i for i, chunk_id in enumerate(chunk_ids) if chunk_id not in stored_ids],
+            [chunk_id for chunk_id in stored_ids if chunk_id not in current_ids],
+        )
+
+    def process_many(self, file_paths: List[str], **options) -> Dict[str, Any]:
+        """
+        Ingest many files with the parallel batch pipeline.
+        See app.batch_ingest.BatchIngestor for the available options.
+        """
+        from app.batch_ingest import BatchIngestor
+        return BatchIngestor(self, **options).run(file_paths)
+
+    def process_directory(self, directory: str, **options) -> Dict[str, Any]:
+        """
+        Recursively ingest every supported file under a directory.
+        """
+        from app.batch_ingest import BatchIngestor, find_documents
+        return BatchIngestor(self, **options).run(find_documents(directory))
+
+    def log_chunk_stats(self, document: PreparedDocument):
+        stats = document.stats
+        logging.info(
+            f"[+] Token budget for {document.filename}: mean fill {stats['mean_fill']:.0%} of "
+            f"{stats['chunk_size']} tokens, {stats['over_limit_chunks']} chunks truncated "
+            f"({stats['over_limit_length']} tokens dropped)."
+        )
+
+    def embed_chunks(self, chunk_texts: List[str]) -> np.ndarray:
+        """Embed chunk texts (float32 array, one row per chunk), logging embedding cache effectiveness."""
+        embeddings = self.embedder.embed_batch(chunk_texts)
+        if self.embedder.cache is not None:
+            stats = self.embedder.cache.stats()
+            logging.info(
+                f"[+] Embedding cache: {stats['hits']} hits / {stats['misses']} misses "
+                f"(~{stats['estimated_seconds_saved']:.2f}s encode time saved so far)."
+            )
+        return embeddings
+
+    def store_documents(self, batch: List[Tuple[IngestPlan, PreparedDocument, np.ndarray]],
+                        trace: Optional[StageTrace] = None):
+        """
+        Apply a batch of ingest plans to SQL and the vector store.
+        embeddings are the rows of the plan's new_indices chunks, in order. The
+        whole batch is one vector insert and then one SQL transaction; unchanged
+        chunks only get their metadata (index, pages, offsets) refreshed.
+        trace, if given, records the "sql_write" and "vector_write" stages.
+        """
+        trace = trace or StageTrace("store")
+        new_texts = []
+        embedding_blocks = []
+        new_ids = []
+        new_metadatas = []
+        kept_ids = []
+        kept_metadatas = []
+        stale_ids = []
+        sql_batch = []
+
+        for plan, document, embeddings in batch:
+            sql_rows = []
+            new_indices = set(plan.new_indices)
+            if new_indices:
+                embedding_blocks.append(np.asarray(embeddings, dtype=np.float32))
+            for i, (chunk, chunk_id) in enumerate(zip(document.chunks, plan.chunk_ids)):
+                # Metadata for Vector DB
+                metadata = {
+                    "doc_id": plan.doc_id,
+                    "filename": document.filename,
+                    "chunk_index": i
+                }
+                if chunk.heading:
+                    metadata["heading"] = chunk.heading
+                if chunk.page_start is not None:
+                    metadata["page_start"] = chunk.page_start
+                    metadata["page_end"] = chunk.page_end
+
+                if i in new_indices:
+                    new_texts.append(chunk.text)
+                    new_ids.append(chunk_id)
+                    new_metadatas.append(metadata)
+                else:
+                    kept_ids.append(chunk_id)
+                    kept_metadatas.append(metadata)
+                sql_rows.append((chunk_id, i, chunk.text, chunk.heading, chunk.page_start, chunk.page_end,
+                                 chunk.start, chunk.end, chunk_hash(chunk.text)))
+            stale_ids.extend(plan.stale_ids)
+            sql_batch.append(DocumentWrite(plan.doc_id, document.filename, document.file_type,
+                                           document.content_hash, plan.source,
+                                           sql_rows, plan.stale_ids,
+                                           [chunk_id for i, chunk_id in enumerate(plan.chunk_ids) if i not in new_indices]))
+
+        # Store in Vector DB first: the SQL rows (chunk ids, content hash) are
+        # what marks a chunk or file as stored, so if the vector write fails
+        # a retry re-embeds the chunks instead of skipping them as duplicates
+        with trace.stage("vector_write"):
+            self.vector_db.delete(stale_ids)
+            if new_ids:
+                # In compressed mode the text is kept only in SQL and hydrated for returned results
+                texts = new_texts if self.sql_db.text_storage == "inline" else None
+                self.vector_db.add_chunks(texts, np.concatenate(embedding_blocks), new_metadatas, new_ids)
+            self.vector_db.update_metadata(kept_ids, kept_metadatas)
+
+        # Store documents and chunks in SQL (Detailed storage) in one transaction
+        with trace.stage("sql_write"):
+            self.sql_db.add_documents(sql_batch)
+        self.sql_db.bump_generation()
+
+    def ask(self, query: str, n_results: int = 3, mode: str = "vector") -> Dict[str, Any]:
         """
         Semantic search for a query with formatted output.
+        mode: "vector" (dense only), "lexical" (BM25 only) or "hybrid" (both, fused).
         """
         logging.info(f"🔍 Searching for: {query}")
         
-        # 1. Embed query
-        query_embedding = self.embedder.embed_text(query)
-        
-        # 2. Search Vector DB
-        results = self.vector_db.search(query_embedding, n_results=n_results)
+        # 1. Embed query (lexical search does not need the model)
+        query_embedding = self.embedder.embed_text(query) if mode != "lexical" else None
         
+        # 2. Search Vector DB and/or the lexical index
+        return self.search(query_embedding, n_results=n_results, query=query, mode=mode)
+
+    def ask_many(self, queries: List[str], n_results: int = 3, mode: str = "vector",
+                 doc_ids: Optional[List[Optional[List[str]]]] = None) -> List[Dict[str, Any]]:
+        """
+        Search many queries: one batched encode, then one vector search per
+        distinct filter. doc_ids optionally gives a document filter per query.
+        Returns one result per query, in the shape ask returns.
+        """
+        logging.info(f"🔍 Searching for {len(queries)} queries")
+        query_embeddings = self.embedder.embed_queries(queries) if mode != "lexical" and queries else None
+        return self.search_many(query_embeddings, n_results=n_results, queries=queries, mode=mode, doc_ids=doc_ids)
+
+    def search(self, query_embedding: Optional[List[float]], n_results: int = 3, query: Optional[str] = None,
+               mode: str = "vector", doc_ids: Optional[List[str]] = None,
+               trace: Optional[StageTrace] = None) -> Dict[str, Any]:
+        """
+        Search with an already computed query embedding (e.g. from the query batcher).
+        Lexical and hybrid modes also need the query text. doc_ids restricts
+        results to those documents. trace, if given, records the retrieval
+        stages (vector_search, lexical_search, fusion, hydration).
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        if mode == "vector":
+            trace = trace or StageTrace("query")
+            with trace.stage("vector_search"):
+                result = self.vector_db.search(query_embedding, n_results=n_results, doc_ids=doc_ids)
+            with trace.stage("hydration"):
+                return self._fill_documents([result])[0]
+        return self.search_many(
+            [query_embedding], n_results=n_results, queries=[query], mode=mode, doc_ids=[doc_ids], trace=trace
+        )[0]
+
+    def search_many(self, query_embeddings: Optional[List[List[float]]], n_results: int = 3,
+                    queries: Optional[List[str]] = None, mode: str = "vector",
+                    doc_ids: Optional[List[Optional[List[str]]]] = None,
+                    trace: Optional[StageTrace] = None) -> List[Dict[str, Any]]:
+        """
+        Search with already computed query embeddings. Queries sharing a
+        document filter go to the vector store in a single call.
+        Lexical and hybrid modes also need the query texts.
+        """
+        trace = trace or StageTrace("query")
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        if mode != "vector" and (queries is None or None in queries):
+            raise ValueError(f"Search mode {mode} needs the query text")
+        count = len(queries) if mode == "lexical" else len(query_embeddings)
+        filters = doc_ids or [None] * count
+        if len(filters) != count:
+            raise ValueError("doc_ids must give one filter (or None) per query")
+
+        # Fetch a deeper candidate list from each retriever than is returned,
+        # so fusion can promote chunks ranked moderately well by both
+        candidates = n_results if mode == "vector" else max(n_results * HYBRID_CANDIDATE_FACTOR, n_results)
+        vector_results = []
+        if mode != "lexical":
+            with trace.stage("vector_search"):
+                vector_results = self._vector_search_grouped(query_embeddings, candidates, filters)
+        if mode == "vector":
+            with trace.stage("hydration"):
+                return self._fill_documents(vector_results)
+
+        results = []
+        for i, query in enumerate(queries):
+            with trace.stage("lexical_search"):
+                lexical = self.sql_db.search_lexical(query, limit=candidates, doc_ids=filters[i])
+            if mode == "lexical":
+                with trace.stage("hydration"):
+                    results.append(self._hydrate_results(lexical[:n_results], {}))
+                continue
+
+            vector = vector_results[i]
+            vector_hits = {
+                chunk_id: (document, metadata, distance)
+                for chunk_id, document, metadata, distance in zip(
+                    vector["ids"][0], vector["documents"][0], vector["metadatas"][0], vector["distances"][0]
+                )
+            }
+            with trace.stage("fusion"):
+                fused = reciprocal_rank_fusion([vector["ids"][0], [chunk_id for chunk_id, _ in lexical]])[:n_results]
+            with trace.stage("hydration"):
+                results.append(self._hydrate_results(fused, vector_hits))
+        return results
+
+    def _vector_search_grouped(self, query_embeddings: List[List[float]], n_results: int,
+                               filters: List[Optional[List[str]]]) -> List[Dict[str, Any]]:
+        """Run one vector store call per distinct filter and return per-query results in input order."""
+        groups: Dict[Optional[Tuple[str, ...]], List[int]] = {}
+        for i, doc_filter in enumerate(filters):
+            groups.setdefault(tuple(sorted(doc_filter)) if doc_filter else None, []).append(i)
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(query_embeddings)
+        for doc_filter, indices in groups.items():
+            grouped = self.vector_db.search_many(
+                [query_embeddings[i] for i in indices], n_results=n_results,
+                doc_ids=list(doc_filter) if doc_filter else None
+            )
+            for i, result in zip(indices, split_results(grouped)):
+                results[i] = result
+        return results
+
+    def _hydrate_results(self, ranked: List[Tuple[str, Optional[float]]],
+                         vector_hits: Dict[str, Tuple[str, Dict[str, Any], float]]) -> Dict[str, Any]:
+        """
+        Build a vector-store style result (nested lists for one query) for
+        ranked chunk ids. Chunks the vector search returned are reused, the
+        rest are read from SQL. Distances are None for lexical-only hits.
+        """
+        stored = self.sql_db.get_chunk_results([chunk_id for chunk_id, _ in ranked if chunk_id not in vector_hits])
+        # Vector hits without text (compressed storage) are hydrated only if they made the cut
+        texts = self.sql_db.get_chunk_texts(
+            [chunk_id for chunk_id, _ in ranked if chunk_id in vector_hits and vector_hits[chunk_id][0] is None]
+        )
+        results = {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]], "scores": [[]]}
+        for chunk_id, score in ranked:
+            if chunk_id in vector_hits:
+                document, metadata, distance = vector_hits[chunk_id]
+                document = texts.get(chunk_id, document)
+            elif chunk_id in stored:
+                (document, metadata), distance = stored[chunk_id], None
+            else:
+                continue
+            results["ids"][0].append(chunk_id)
+            results["documents"][0].append(document)
+            results["metadatas"][0].append(metadata)
+            results["distances"][0].append(distance)
+            results["scores"][0].append(score)
+        return results
+
+    def _fill_documents(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Read the text of returned chunks the vector store holds no text for, in one SQL lookup."""
+        missing = [
+            chunk_id
+            for result in results
+            for ids, documents in zip(result["ids"], result["documents"])
+            for chunk_id, document in zip(ids, documents)
+            if document is None
+        ]
+        if not missing:
+            return results
+        texts = self.sql_db.get_chunk_texts(missing)
+        for result in results:
+            result["documents"] = [
+                [texts.get(chunk_id) if document is None else document for chunk_id, document in zip(ids, documents)]
+                for ids, documents in zip(result["ids"], result["documents"])
+            ]
         return results
 
 if __name__ == "__main__":
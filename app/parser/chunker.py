@@ -1,5 +1,33 @@
 import re
-from typing import List, Tuple, Optional
+from bisect import bisect_right
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Tuple, Optional
+
+from app.parser.headings import HEADING_DETECTOR, Heading, HeadingDetector
+
+HEADING_PATTERN = HEADING_DETECTOR.pattern
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!؟\n])\s+')
+WORD_BOUNDARY = re.compile(r'\s+')
+# chunk_text only splits documents with at least this many headings into sections
+MIN_HEADINGS = 3
+# Heading given to the text before the first heading of a sectioned document
+PREAMBLE_HEADING = "Introduction"
+
+
+class Chunk(NamedTuple):
+    """
+    A chunk with its heading, the (1-based) pages it spans when known, and
+    its start/end offsets in the normalized document text.
+    """
+    text: str
+    heading: Optional[str]
+    page_start: Optional[int] = None
+    page_end: Optional[int] = None
+    start: Optional[int] = None
+    end: Optional[int] = None
+
+
+# (start, end) character offsets into the source text
+Span = Tuple[int, int]
 
 
 def chunk_text(text: str) -> List[Tuple[str, Optional[str]]]:
@@ -8,16 +36,24 @@ def chunk_text(text: str) -> List[Tuple[str, Optional[str]]]:
     based on document structure.
     Returns a list of (chunk_content, heading_name).
     """
+    return [(text[start:end], heading) for start, end, heading in chunk_spans(text)]
+
+
+def chunk_spans(text: str, detector: HeadingDetector = HEADING_DETECTOR) -> List[Tuple[int, int, Optional[str]]]:
+    """
+    Same strategy selection as chunk_text, but returns (start, end, heading)
+    offsets into text so callers can slice chunk text only when needed.
+    """
 
     # If document has many headings → dynamic chunking
-    heading_count = len(_detect_headings(text))
+    headings = detector.detect(text)
 
-    if heading_count >= 3:
-        return dynamic_chunk(text)
+    if len(headings) >= MIN_HEADINGS:
+        # The detected headings are reused, so the text is scanned once
+        return dynamic_spans(text, headings)
 
     # Fallback to sentence-aware chunking with no heading metadata
-    chunks = sentence_aware_chunk(text)
-    return [(chunk, None) for chunk in chunks]
+    return [(start, end, None) for start, end in sentence_aware_spans(text)]
 
 
 def fixed_chunk(text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
@@ -37,103 +73,440 @@ def dynamic_chunk(text: str) -> List[Tuple[str, Optional[str]]]:
     """
     Split text based on headings and paragraph/sentence boundaries.
     """
-    headings = _detect_headings(text)
+    return [(text[start:end], heading) for start, end, heading in dynamic_spans(text)]
+
+
+def dynamic_spans(text: str, headings: Optional[List[Heading]] = None) -> List[Tuple[int, int, Optional[str]]]:
+    """
+    Offset-based dynamic_chunk: (start, end, heading) for each chunk.
+    headings, if already detected in text (in order), are used instead of
+    scanning it again.
+    """
+    if headings is None:
+        headings = HEADING_DETECTOR.detect(text)
     
     if not headings:
-        chunks = sentence_aware_chunk(text)
-        return [(c, None) for c in chunks]
+        return [(start, end, None) for start, end in sentence_aware_spans(text)]
 
-    # Sort headings by their position in the text
-    headings.sort(key=lambda x: x[1])
-    
-    chunks_with_metadata = []
-    positions = [pos for _, pos in headings]
+    spans_with_metadata = []
+    positions = [heading.start for heading in headings]
     
     # Check if there is content before the first heading
     if positions[0] > 0:
-        preamble = text[0:positions[0]].strip()
-        if len(preamble) > 50:
-            preamble_chunks = sentence_aware_chunk(preamble)
-            chunks_with_metadata.extend([(c, "Introduction") for c in preamble_chunks])
+        start, end = _strip_span(text, 0, positions[0])
+        if end - start > 50:
+            spans_with_metadata.extend(
+                (s, e, PREAMBLE_HEADING) for s, e in sentence_aware_spans(text, start=start, end=end)
+            )
 
     # Split text into chunks based on heading positions
     for i in range(len(positions)):
-        start = positions[i]
-        end = positions[i + 1] if i + 1 < len(positions) else len(text)
-        section = text[start:end].strip()
+        start, end = _strip_span(text, positions[i], positions[i + 1] if i + 1 < len(positions) else len(text))
         
-        current_heading = headings[i][0] # The heading text itself
+        current_heading = headings[i].text # The heading text itself
         
-        # Remove the heading from the section text to avoid duplication if desired,
-        # but often it's good to keep it. We'll keep it for context in the chunk too,
-        # or we can strip it. Let's keep it in the text.
-        
-        if len(section) > 50: 
+        # The heading itself is kept at the start of the section for context.
+        if end - start > 50: 
             # If section is too long, split it using sentence awareness
-            section_chunks = sentence_aware_chunk(section)
-            chunks_with_metadata.extend([(c, current_heading) for c in section_chunks])
+            spans_with_metadata.extend(
+                (s, e, current_heading) for s, e in sentence_aware_spans(text, start=start, end=end)
+            )
 
-    return chunks_with_metadata
+    return spans_with_metadata
 
 def sentence_aware_chunk(text: str, chunk_size: int = 800, overlap: int = 100) -> List[str]:
     """
     Chunk text respecting Arabic sentence boundaries (. ! ؟)
     """
-    # Split by sentence delimiters. The lookbehind ensures we keep the delimiter.
-    # Also split by newlines as a fallback for structure without punctuation
-    sentences = re.split(r'(?<=[.!؟\n])\s+', text)
-    
-    # Fallback: if no punctuation found and text is long, force split by spaces
-    if len(sentences) == 1 and len(text) > chunk_size:
-         sentences = re.split(r'\s+', text)
-    
-    chunks = []
-    current_chunk = []
+    return [text[start:end] for start, end in sentence_aware_spans(text, chunk_size, overlap)]
+
+
+def sentence_aware_spans(text: str, chunk_size: int = 800, overlap: int = 100,
+                         start: int = 0, end: Optional[int] = None) -> List[Span]:
+    """
+    Offset-based sentence-aware chunking of text[start:end].
+    Runs in linear time: sentences are tracked as offsets, never copied, and
+    the overlap window is found by walking back over at most the sentences
+    that fit in it. A chunk is text[span[0]:span[1]], i.e. its sentences
+    together with the whitespace between them as found in the source
+    (a single space once the text has been normalized).
+    """
+    end = len(text) if end is None else end
+    sentences = _sentence_offsets(text, start, end, chunk_size)
+
+    spans = []
+    current: List[Span] = []
     current_length = 0
-    
-    for sentence in sentences:
-        sentence_len = len(sentence)
+    budget = max(overlap, chunk_size // 2)
+
+    for sentence_start, sentence_end in sentences:
+        sentence_len = sentence_end - sentence_start
         
-        if current_length + sentence_len > chunk_size and current_chunk:
-            # Join the current chunk and add to list
-            chunks.append(" ".join(current_chunk))
+        if current_length + sentence_len > chunk_size and current:
+            spans.append((current[0][0], current[-1][1]))
             
             # Start new chunk with overlap
-            # Context preservation: Keep last few sentences up to roughly 'overlap' characters
-            overlap_sentences = []
+            # Context preservation: Keep last few sentences up to the overlap
+            # budget (max of overlap and 50% of chunk size)
+            keep = 0
             overlap_char_count = 0
-            
-            # Go backwards from the end of the current chunk
-            for sent in reversed(current_chunk):
-                sent_len = len(sent)
-                # Ensure overlap is significant but not excessive (e.g., max 50% of chunk size)
-                if overlap_char_count + sent_len <= max(overlap, chunk_size // 2):
-                    overlap_sentences.insert(0, sent)
-                    overlap_char_count += sent_len
-                else:
+            for kept_start, kept_end in reversed(current):
+                if overlap_char_count + (kept_end - kept_start) > budget:
                     break
+                overlap_char_count += kept_end - kept_start
+                keep += 1
             
-            current_chunk = overlap_sentences + [sentence]
+            current = current[len(current) - keep:]
+            current.append((sentence_start, sentence_end))
             current_length = overlap_char_count + sentence_len
         else:
-            current_chunk.append(sentence)
+            current.append((sentence_start, sentence_end))
             current_length += sentence_len
             
-    if current_chunk:
-        chunks.append(" ".join(current_chunk))
+    if current:
+        spans.append((current[0][0], current[-1][1]))
         
-    return chunks
+    return spans
 
 
-def _detect_headings(text: str):
+def _sentence_offsets(text: str, start: int, end: int, chunk_size: int) -> Iterator[Span]:
     """
-    Detect headings like Chapter 1, الفصل الأول, مقدمة, etc.
+    Yield sentence spans in text[start:end], split after . ! ؟ or a newline.
+    Also splits by newlines as a fallback for structure without punctuation,
+    and by spaces when a long text has no sentence boundary at all.
     """
-    # Combined patterns into a single regex to maintain natural order
-    pattern = r"(Chapter\s+\d+|الفصل\s+\S+|مقدمة|خاتمة|الملخص)"
-    
-    headings = []
-    for match in re.finditer(pattern, text):
-        headings.append((match.group(), match.start()))
+    boundary = SENTENCE_BOUNDARY
+    if end - start > chunk_size and not SENTENCE_BOUNDARY.search(text, start, end):
+        boundary = WORD_BOUNDARY
+
+    position = start
+    for match in boundary.finditer(text, start, end):
+        yield position, match.start()
+        position = match.end()
+    yield position, end
+
+
+def _strip_span(text: str, start: int, end: int) -> Span:
+    """Offsets of text[start:end].strip() without copying the slice."""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+class StreamingChunker:
+    def __init__(self, chunk_size: int = 800, overlap: int = 100, min_section_length: int = 50,
+                 length_function: Optional[Callable[[List[str]], List[int]]] = None,
+                 heading_detector: HeadingDetector = HEADING_DETECTOR, min_headings: int = MIN_HEADINGS):
+        """
+        Incremental heading + sentence-aware chunker.
+        Text is fed segment by segment (e.g. page by page); only the current,
+        not yet complete sentence, the sentences of the chunk being built and
+        the overlap window are kept in memory.
+
+        Segments are treated as joined by a single space, matching how
+        normalize_arabic_text collapses the newlines between pages; chunk
+        start/end offsets refer to that joined text.
+
+        Like chunk_text, a document is only split into sections if it has at
+        least min_headings headings, and then the text before the first one
+        is headed PREAMBLE_HEADING. Until that many headings are seen the fed
+        text is held back (all of it for documents with fewer headings).
+        min_headings=0 streams sections from the first heading on instead,
+        with the text before it unheaded.
+
+        By default sizes are in characters. With a length_function (a batch
+        token counter), chunk_size and overlap are in tokens instead and
+        sentences longer than chunk_size are split at spaces so that no chunk
+        is truncated by the model.
+
+        Headings are found by heading_detector in text whose structure is
+        unknown. Segments fed with a heading_level (e.g. from DOCX paragraph
+        styles) are never scanned: level >= 1 starts a section headed by the
+        segment text, 0 is body text.
+        """
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.min_section_length = min_section_length
+        self.length_function = length_function
+        self.heading_detector = heading_detector
+        self.min_headings = min_headings
+        # An unterminated run longer than this cannot fit in one chunk, so it
+        # is split at spaces instead of being buffered further
+        self.max_fragment_chars = chunk_size if length_function is None else chunk_size * 16
+
+        self._buffer = ""          # Text not yet split into complete sentences
+        self._buffer_start = 0     # Offset of _buffer[0] in the joined text
+        self._length = 0           # Length of the joined text seen so far
+        self._page_offsets = []    # Offsets where each page starts
+        self._pages = []
+        self._scan_from = 0        # Text before this offset is not scanned for headings
+
+        # Until min_headings headings are seen, segments wait in _pending
+        self._decided = min_headings <= 0
+        self._use_headings = True
+        self._pending: List[Tuple[str, Optional[int], Optional[int]]] = []
+        self._probe = ""           # Unscanned tail of the unknown-structure text fed so far
+        self._heading_count = 0
+
+        self._heading = None
+        self._heading_length = 0   # Length of the heading text at the start of the section
+        self._section_start = 0
+        self._section_end = 0
+        self._section_emitted = False
+        self._sentences = []       # (text, start, end, length) of the chunk being built
+        self._current_length = 0
+
+        # Size statistics of emitted chunks, in chunk_size units
+        self._chunk_count = 0
+        self._total_length = 0
+        self._max_length = 0
+        self._oversized_chunks = 0
+        self._oversized_length = 0
+
+    def feed(self, text: str, page: Optional[int] = None, heading_level: Optional[int] = None) -> List[Chunk]:
+        """
+        Add the next segment of text and return any chunks it completed.
+        heading_level is None when the segment's structure is unknown.
+        """
+        if not text:
+            return []
+        if self._decided:
+            return self._feed(text, page, heading_level)
+        self._pending.append((text, page, heading_level))
+        self._count_headings(text, heading_level)
+        return self._replay() if self._heading_count >= self.min_headings else []
+
+    def _count_headings(self, text: str, heading_level: Optional[int]):
+        if heading_level is not None:
+            self._heading_count += self._count_probe(final=True) + (heading_level > 0)
+            self._probe = ""
+            return
+        self._probe = f"{self._probe} {text}" if self._probe else text
+        self._heading_count += self._count_probe(final=False)
+
+    def _count_probe(self, final: bool) -> int:
+        """Count the headings in _probe; one touching its end may still grow, so it waits unless final."""
+        count = 0
+        position = 0
+        for heading in self.heading_detector.finditer(self._probe):
+            if not final and heading.end >= len(self._probe):
+                break
+            count += 1
+            position = heading.end
+        self._probe = self._probe[position:]
+        return count
+
+    def _replay(self) -> List[Chunk]:
+        """Decide whether the document is sectioned and chunk the held-back segments."""
+        self._decided = True
+        if self._heading_count >= self.min_headings:
+            self._heading = PREAMBLE_HEADING
+        else:
+            self._use_headings = False
+        pending, self._pending, self._probe = self._pending, [], ""
+        chunks = []
+        for text, page, heading_level in pending:
+            chunks.extend(self._feed(text, page, heading_level))
+        return chunks
+
+    def _feed(self, text: str, page: Optional[int], heading_level: Optional[int]) -> List[Chunk]:
+        if not self._use_headings:
+            heading_level = None
+        chunks = []
+        if heading_level is not None and self._scan_from < self._length:
+            # Known structure follows: headings in the unknown text before it cannot grow any more
+            chunks.extend(self._process(final=False, complete=True))
+        if self._length:
+            self._buffer += " "
+            self._length += 1
+        self._page_offsets.append(self._length)
+        self._pages.append(page)
+        self._buffer += text
+        self._length += len(text)
+        if heading_level is not None:
+            if heading_level > 0:
+                chunks.extend(self._start_section(text, len(self._buffer) - len(text)))
+            self._scan_from = self._length
+        chunks.extend(self._process(final=False))
+        return chunks
+
+    def finish(self) -> List[Chunk]:
+        """Flush the remaining text once the input is exhausted."""
+        chunks = [] if self._decided else self._replay()
+        chunks.extend(self._process(final=True))
+        chunks.extend(self._end_section())
+        return chunks
+
+    def _process(self, final: bool, complete: bool = False) -> List[Chunk]:
+        chunks = []
+
+        # Split at headings; a match touching the end of the buffer may still
+        # grow with the next segment, so it is only used once the input ends
+        # (or complete: the next segment is not scanned)
+        at_heading = self._buffer_start == self._section_start
+        scan_from = max(self._heading_length if at_heading else 0, self._scan_from - self._buffer_start)
+        while self._use_headings:
+            heading = self.heading_detector.search(self._buffer, scan_from)
+            if not heading or (not final and not complete and heading.end >= len(self._buffer)):
+                break
+            chunks.extend(self._start_section(heading.text, heading.start))
+            scan_from = len(heading.text)
+        if complete:
+            self._scan_from = self._length
+
+        chunks.extend(self._feed_sentences(self._buffer, self._buffer_start, final=final))
+        return chunks
+
+    def _start_section(self, heading: str, index: int) -> List[Chunk]:
+        """End the current section before _buffer[index], where the heading text starts the next one."""
+        chunks = self._feed_sentences(self._buffer[:index], self._buffer_start, final=True)
+        chunks.extend(self._end_section())
+        self._advance(index)
+        self._heading = heading
+        self._heading_length = len(heading)
+        self._section_start = self._buffer_start
+        return chunks
+
+    def _advance(self, count: int):
+        self._buffer = self._buffer[count:]
+        self._buffer_start += count
+
+    def _feed_sentences(self, text: str, offset: int, final: bool) -> List[Chunk]:
+        """Add the complete sentences of text; the trailing fragment stays buffered unless final."""
+        pieces = []
+        position = 0
+        for match in SENTENCE_BOUNDARY.finditer(text):
+            pieces.append((text[position:match.start()], offset + position))
+            position = match.end()
+
+        # Fallback: a long run without punctuation is split by spaces
+        if len(text) - position > self.max_fragment_chars:
+            for match in WORD_BOUNDARY.finditer(text, position):
+                pieces.append((text[position:match.start()], offset + position))
+                position = match.end()
+
+        if final:
+            pieces.append((text[position:].rstrip(), offset + position))
+            position = len(text)
+
+        if text is self._buffer:
+            self._advance(position)
+
+        chunks = []
+        for (sentence, start), length in zip(pieces, self._measure([sentence for sentence, _ in pieces])):
+            if self.length_function is not None and length > self.chunk_size:
+                chunks.extend(self._add_words(sentence, start))
+            else:
+                chunks.extend(self._add_sentence(sentence, start, length))
+        return chunks
+
+    def _add_words(self, sentence: str, start: int) -> List[Chunk]:
+        """Add an over-long sentence word by word so it is packed across chunks."""
+        words = []
+        position = 0
+        for match in WORD_BOUNDARY.finditer(sentence):
+            words.append((sentence[position:match.start()], start + position))
+            position = match.end()
+        words.append((sentence[position:], start + position))
+
+        chunks = []
+        for (word, word_start), length in zip(words, self._measure([word for word, _ in words])):
+            chunks.extend(self._add_sentence(word, word_start, length))
+        return chunks
+
+    def _measure(self, texts: List[str]) -> List[int]:
+        if self.length_function is None:
+            return [len(text) for text in texts]
+        return self.length_function(texts)
+
+    def _add_sentence(self, sentence: str, start: int, sentence_len: int) -> List[Chunk]:
+        if not sentence:
+            return []
+        chunks = []
+        self._section_end = start + len(sentence)
+
+        if self._current_length + sentence_len > self.chunk_size and self._sentences:
+            chunks.append(self._emit())
+
+            # Keep the last sentences, up to the overlap budget, as context.
+            # In token mode the overlap also has to leave room for the new
+            # sentence, or the next chunk would be truncated.
+            budget = max(self.overlap, self.chunk_size // 2)
+            if self.length_function is not None:
+                budget = min(budget, self.chunk_size - sentence_len)
+            overlap_count = 0
+            overlap_length = 0
+            for _, _, _, length in reversed(self._sentences):
+                if overlap_length + length > budget:
+                    break
+                overlap_length += length
+                overlap_count += 1
+            self._sentences = self._sentences[len(self._sentences) - overlap_count:]
+            self._current_length = overlap_length
+
+        self._sentences.append((sentence, start, start + len(sentence), sentence_len))
+        self._current_length += sentence_len
+        return chunks
+
+    def _emit(self) -> Chunk:
+        self._section_emitted = True
+        first_start = self._sentences[0][1]
+        last_end = self._sentences[-1][2]
+
+        text = " ".join(sent for sent, _, _, _ in self._sentences)
+
+        # The running packing count; chunks are never measured a second time
+        length = self._current_length
+        self._chunk_count += 1
+        self._total_length += length
+        self._max_length = max(self._max_length, length)
+        if length > self.chunk_size:
+            self._oversized_chunks += 1
+            self._oversized_length += length - self.chunk_size
+
+        return Chunk(
+            text,
+            self._heading,
+            self._page_at(first_start),
+            self._page_at(last_end - 1),
+            first_start,
+            last_end,
+        )
+
+    def _end_section(self) -> List[Chunk]:
+        chunks = []
+        if self._sentences:
+            # Short heading-only sections carry no content worth indexing
+            too_short = (self._heading is not None and not self._section_emitted
+                         and self._section_end - self._section_start <= self.min_section_length)
+            if not too_short:
+                chunks.append(self._emit())
+        self._sentences = []
+        self._current_length = 0
+        self._section_emitted = False
+        return chunks
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Size statistics of the chunks emitted so far, from the per-sentence
+        counts used for packing (in token mode, the joins between sentences
+        may add or merge a token). In token mode, over-limit chunks are
+        the ones the model will truncate.
+        """
+        return {
+            "unit": "chars" if self.length_function is None else "tokens",
+            "chunk_size": self.chunk_size,
+            "chunks": self._chunk_count,
+            "mean_length": self._total_length / self._chunk_count if self._chunk_count else 0.0,
+            "max_length": self._max_length,
+            "mean_fill": self._total_length / (self._chunk_count * self.chunk_size) if self._chunk_count else 0.0,
+            "over_limit_chunks": self._oversized_chunks,
+            "over_limit_length": self._oversized_length,
+        }
+
+    def _page_at(self, offset: int) -> Optional[int]:
+        index = bisect_right(self._page_offsets, offset) - 1
+        return self._pages[index] if index >= 0 else None
 
-    return headings
@@ -0,0 +1,85 @@
+import hashlib
+import os
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from app.parser.loader import iter_document
+from app.parser.chunker import Chunk, StreamingChunker
+from app.embeddings.tokens import TokenCounter
+from app.utils.metrics import StageTrace
+
+# Token-mode overlap; chunks are packed up to the model's sequence limit
+TOKEN_OVERLAP = 32
+
+
+class PreparedDocument(NamedTuple):
+    """A loaded, normalized and chunked document, ready for embedding."""
+    path: str
+    filename: str
+    file_type: str
+    chunks: List[Chunk]
+    stats: Optional[Dict[str, Any]] = None
+    content_hash: Optional[str] = None
+
+
+def file_sha256(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """Hash of the raw file bytes, used to skip re-ingesting unchanged files."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def prepare_document(file_path: str, on_stage: Optional[Callable[[str], None]] = None,
+                     token_counter: Optional[TokenCounter] = None, content_hash: Optional[str] = None,
+                     filename: Optional[str] = None, trace: Optional[StageTrace] = None,
+                     pdf_workers: Optional[int] = None, data: Optional[bytes] = None) -> PreparedDocument:
+    """
+    Run the CPU-bound part of the pipeline (load, normalize, chunk).
+    Kept free of model/database state so it can run in a worker process.
+    Pages are loaded and chunked as a stream, so the full document text is
+    never held in memory at once.
+    on_stage, if given, is called with the name of each stage as it starts.
+    With a token_counter, chunks are sized in model tokens rather than
+    characters and the result carries per-document truncation statistics.
+    filename defaults to the file's basename (uploads pass the original name).
+    trace, if given, records loading, normalizing and chunking time.
+    pdf_workers is passed to iter_document (1 disables parallel PDF extraction).
+    data, if given, is the file content already in memory; it is parsed
+    (and hashed) from the buffer rather than from file_path.
+    """
+    if on_stage:
+        on_stage("loading")
+    segments = iter_document(file_path, trace=trace, pdf_workers=pdf_workers, data=data)
+    if token_counter is not None:
+        chunker = StreamingChunker(chunk_size=token_counter.max_tokens, overlap=TOKEN_OVERLAP,
+                                   length_function=token_counter.count_many)
+    else:
+        chunker = StreamingChunker()
+    chunks = []
+    has_text = False
+
+    for segment in segments:
+        if not has_text:
+            has_text = True
+            if on_stage:
+                on_stage("chunking")
+        start = time.perf_counter()
+        chunks.extend(chunker.feed(segment.text, segment.page, segment.heading_level))
+        if trace is not None:
+            trace.add("chunking", time.perf_counter() - start)
+    start = time.perf_counter()
+    chunks.extend(chunker.finish())
+    if trace is not None:
+        trace.add("chunking", time.perf_counter() - start)
+
+    if not has_text:
+        raise ValueError("No text could be extracted. File might be empty or scanned image.")
+
+    filename = filename or os.path.basename(file_path)
+    file_type = filename.split('.')[-1]
+    stats = chunker.stats() if token_counter is not None else None
+    if content_hash is None:
+        content_hash = hashlib.sha256(data).hexdigest() if data is not None else file_sha256(file_path)
+    return PreparedDocument(file_path, filename, file_type, chunks, stats, content_hash)
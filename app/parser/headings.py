@@ -0,0 +1,86 @@
+import re
+from typing import Iterator, List, NamedTuple, Optional, Sequence
+
+
+class HeadingPattern(NamedTuple):
+    """A named heading regex; level is reported with each match (1 = top level)."""
+    name: str
+    regex: str
+    level: int = 1
+
+
+class Heading(NamedTuple):
+    """A detected heading and its offsets in the scanned text."""
+    text: str
+    start: int
+    end: int
+    level: int
+    kind: str
+
+
+DEFAULT_HEADING_PATTERNS: List[HeadingPattern] = [
+    HeadingPattern("chapter", r"Chapter\s+\d+"),
+    HeadingPattern("part", r"الباب\s+\S+"),
+    HeadingPattern("fasl", r"الفصل\s+\S+"),
+    HeadingPattern("section", r"المبحث\s+\S+", 2),
+    HeadingPattern("introduction", r"مقدمة"),
+    HeadingPattern("conclusion", r"خاتمة"),
+    HeadingPattern("summary", r"الملخص"),
+]
+
+# Not in the defaults: after normalization newlines are gone, so numbers such
+# as "2.3 " inside a sentence would match too. Add it for documents known to
+# number their sections.
+NUMBERED_HEADING = HeadingPattern("numbered", r"(?<!\S)\d{1,2}(?:\.\d{1,2}){1,3}(?=\s)", 2)
+
+
+class HeadingDetector:
+    def __init__(self, patterns: Sequence[HeadingPattern] = DEFAULT_HEADING_PATTERNS):
+        """
+        All patterns compiled into one alternation, so a text is scanned
+        once however many patterns there are. Earlier patterns win when
+        several match at the same position. Extend by passing more patterns,
+        e.g. HeadingDetector(DEFAULT_HEADING_PATTERNS + [NUMBERED_HEADING]).
+        """
+        self.patterns = list(patterns)
+        # Capture groups would disable the regex engine's first-character
+        # prefilter (several times slower), so the alternation has none and
+        # the pattern behind a match is found afterwards
+        self.pattern = re.compile("|".join(f"(?:{pattern.regex})" for pattern in self.patterns))
+        self._compiled = [(pattern, re.compile(pattern.regex)) for pattern in self.patterns]
+
+    def _heading(self, match: "re.Match") -> Heading:
+        for pattern, compiled in self._compiled:
+            if compiled.match(match.string, match.start(), match.endpos):
+                return Heading(match.group(), match.start(), match.end(), pattern.level, pattern.name)
+        raise AssertionError(f"No heading pattern matches {match.group()!r}")
+
+    def finditer(self, text: str, pos: int = 0, endpos: Optional[int] = None) -> Iterator[Heading]:
+        matches = self.pattern.finditer(text, pos) if endpos is None else self.pattern.finditer(text, pos, endpos)
+        for match in matches:
+            yield self._heading(match)
+
+    def search(self, text: str, pos: int = 0) -> Optional[Heading]:
+        """First heading at or after pos."""
+        match = self.pattern.search(text, pos)
+        return self._heading(match) if match else None
+
+    def detect(self, text: str) -> List[Heading]:
+        """All headings of text in order of position."""
+        return list(self.finditer(text))
+
+
+HEADING_DETECTOR = HeadingDetector()
+
+# python-docx style names that mark a heading paragraph, and their level
+_DOCX_HEADING_STYLE = re.compile(r"^[Hh]eading (\d)$")
+
+
+def docx_heading_level(style_name: Optional[str]) -> int:
+    """Heading level of a DOCX paragraph style (Title is 1), 0 for body text."""
+    if not style_name:
+        return 0
+    if style_name == "Title":
+        return 1
+    match = _DOCX_HEADING_STYLE.match(style_name)
+    return int(match.group(1)) if match else 0
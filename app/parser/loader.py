@@ -1,8 +1,17 @@
-from typing import Optional
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
 
-import docx
+import io
+import multiprocessing
 import os
-from app.utils.arabic_cleaner import normalize_arabic_text
+import re
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from app.parser.headings import docx_heading_level
+from app.utils.arabic_cleaner import ArabicNormalizer, fix_arabic_text_direction, normalize_arabic_text
+from app.utils.metrics import StageTrace
 
 def load_document(file_path: str) -> str:
     """
@@ -15,7 +24,8 @@ def load_document(file_path: str) -> str:
 
     text = ""
     if file_path.lower().endswith(".pdf"):
-        text = _load_pdf(file_path)
+        # Pages are direction-fixed as they are extracted
+        return _PDF_NORMALIZER.normalize(_load_pdf(file_path))
 
     elif file_path.lower().endswith(".docx"):
         text = _load_docx(file_path)
@@ -29,33 +39,386 @@ def load_document(file_path: str) -> str:
     return normalize_arabic_text(text)
 
 
-import fitz  # PyMuPDF
+class TextSegment(NamedTuple):
+    """
+    A normalized piece of a document; page is 1-based for PDFs, None otherwise.
+    heading_level is known when the format marks headings (DOCX styles):
+    >= 1 for a heading, 0 for body text; None means headings must be detected.
+    """
+    page: Optional[int]
+    text: str
+    heading_level: Optional[int] = None
+
+
+# TXT files are streamed in blocks of whole lines of roughly this many characters
+TXT_BLOCK_SIZE = 64 * 1024
+
+# PDFs with at least this many pages are extracted by a pool of worker processes
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+# Default extraction processes (PDF_WORKERS=1 disables parallel extraction)
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "0")) or os.cpu_count() or 1
+# Consecutive pages extracted per worker task
+PDF_PAGES_PER_TASK = 16
+
+# PDF pages come out of extraction with their visual order already fixed,
+# so they are normalized without repeating the direction fix
+_PDF_NORMALIZER = ArabicNormalizer(fix_direction=False)
+
+
+def iter_document(file_path: str, trace: Optional[StageTrace] = None,
+                  pdf_workers: Optional[int] = None, data: Optional[bytes] = None) -> Iterator[TextSegment]:
+    """
+    Stream a document as normalized text segments (pages for PDF, paragraphs
+    for DOCX, line blocks for TXT) instead of building one full-text string.
+    Empty segments are skipped. With a trace, extraction and normalization
+    time are recorded as the "loading" and "normalizing" stages.
+    pdf_workers sets the processes used for large PDFs (default PDF_WORKERS;
+    1 extracts in the calling process).
+    data, if given, is the file content already in memory (e.g. a small
+    upload): it is parsed from the buffer instead of reading file_path again.
+    """
+    if data is None and not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+
+    normalize = normalize_arabic_text
+    if file_path.lower().endswith(".pdf"):
+        pages = _iter_pdf_pages(file_path, workers=pdf_workers or PDF_WORKERS, data=data)
+        raw_segments = ((page, text, None) for page, text in pages)
+        normalize = _PDF_NORMALIZER.normalize
+
+    elif file_path.lower().endswith(".docx"):
+        raw_segments = _iter_docx_segments(file_path, data)
+
+    elif file_path.lower().endswith(".txt"):
+        raw_segments = ((None, text, None) for text in _iter_txt_blocks(file_path, data))
+
+    else:
+        raise ValueError("Unsupported file format")
+
+    if trace is not None:
+        raw_segments = trace.iterate(raw_segments, "loading")
+    for page, text, heading_level in raw_segments:
+        start = time.perf_counter()
+        text = normalize(text)
+        if trace is not None:
+            trace.add("normalizing", time.perf_counter() - start)
+        if text:
+            yield TextSegment(page, text, heading_level)
+
 
 def _load_pdf(path: str) -> str:
+    return "\n".join(text for _, text in _iter_pdf_pages(path) if text)
+
+
+def _iter_pdf_pages(path: str, workers: int = 1, data: Optional[bytes] = None) -> Iterator[tuple]:
+    """
+    Yield (page_number, text) with each page's blocks in reading order and
+    its visual encoding fixed. Large PDFs are split across worker processes
+    when workers > 1 (they open path, so an in-memory PDF with no file
+    behind it is extracted here).
+    """
+    import fitz  # PyMuPDF, imported on first use to keep startup fast
+
+    with fitz.open(stream=data, filetype="pdf") if data is not None else fitz.open(path) as doc:
+        page_count = doc.page_count
+        sequential = workers <= 1 or page_count < PDF_PARALLEL_MIN_PAGES
+        if sequential or (data is not None and not os.path.exists(path)):
+            for page_number, page in enumerate(doc, start=1):
+                yield page_number, _pdf_page_text(page)
+            return
+    yield from _iter_pdf_pages_parallel(path, page_count, workers)
+
+
+def _pdf_page_text(page) -> str:
     text = []
+    # Usage of "blocks" helps preserve paragraph order better than raw "text"
+    blocks = page.get_text("blocks")
+    # Sort blocks based on coordinates:
+    # Primary sort: Vertical position (y0), Top to Bottom
+    # Secondary sort: Horizontal position (x0), Right to Left for Arabic context
+    # Note: For strict RTL, we might want x1 descending, but standard practice often uses x0.
+    # Let's use the user's suggested lambda: (b[1], -b[0]) -> y0 ascending, x0 descending (Right to Left)
+    blocks.sort(key=lambda b: (b[1], -b[0])) 
+    for b in blocks:
+        # b[4] contains the text of the block
+        if b[4].strip():
+            text.append(b[4])
+    return fix_arabic_text_direction("\n".join(text))
+
+
+# Extraction pools by size. Workers are spawned (not forked) because the
+# server process holds model and database threads.
+_pdf_pools: Dict[int, ProcessPoolExecutor] = {}
+_pdf_pools_lock = threading.Lock()
+
+
+def _get_pdf_pool(workers: int) -> ProcessPoolExecutor:
+    with _pdf_pools_lock:
+        if workers not in _pdf_pools:
+            _pdf_pools[workers] = ProcessPoolExecutor(max_workers=workers,
+                                                      mp_context=multiprocessing.get_context("spawn"))
+        return _pdf_pools[workers]
+
+
+def _extract_pdf_pages(path: str, start: int, stop: int) -> List[tuple]:
+    """Worker task: (page_number, text) for pages [start, stop), from the worker's own document handle."""
+    import fitz  # PyMuPDF
+
     with fitz.open(path) as doc:
-        for page in doc:
-            # Usage of "blocks" helps preserve paragraph order better than raw "text"
-            blocks = page.get_text("blocks")
-            # Sort blocks based on coordinates:
-            # Primary sort: Vertical position (y0), Top to Bottom
-            # Secondary sort: Horizontal position (x0), Right to Left for Arabic context
-            # Note: For strict RTL, we might want x1 descending, but standard practice often uses x0.
-            # Let's use the user's suggested lambda: (b[1], -b[0]) -> y0 ascending, x0 descending (Right to Left)
-            blocks.sort(key=lambda b: (b[1], -b[0])) 
-            for b in blocks:
-                # b[4] contains the text of the block
-                if b[4].strip():
-                    text.append(b[4])
-    return "\n".join(text)
+        return [(i + 1, _pdf_page_text(doc[i])) for i in range(start, stop)]
+
+
+def _iter_pdf_pages_parallel(path: str, page_count: int, workers: int) -> Iterator[tuple]:
+    """
+    Extract page ranges on the pool and yield pages in order as soon as
+    each range (and all before it) is done. At most 2 * workers ranges are
+    in flight, so extracted text never piles up ahead of the consumer.
+    """
+    pool = _get_pdf_pool(workers)
+    ranges = [(start, min(start + PDF_PAGES_PER_TASK, page_count))
+              for start in range(0, page_count, PDF_PAGES_PER_TASK)]
+    pending = deque()
+    submitted = 0
+    try:
+        while submitted < len(ranges) or pending:
+            while submitted < len(ranges) and len(pending) < workers * 2:
+                pending.append(pool.submit(_extract_pdf_pages, path, *ranges[submitted]))
+                submitted += 1
+            yield from pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
 
 
 def _load_docx(path: str) -> str:
-    doc = docx.Document(path)
-    paragraphs = [p.text for p in doc.paragraphs if p.text.strip()]
-    return "\n".join(paragraphs)
+    with zipfile.ZipFile(path) as archive:
+        return "\n".join(block.text for block in _iter_docx_blocks(archive))
+
+
+# WordprocessingML element names as ElementTree reports them
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_VAL = _W + "val"
+# Markup compatibility: AlternateContent holds the same content as a Choice
+# (e.g. a DrawingML text box) and a Fallback (its VML copy)
+_MC = "{http://schemas.openxmlformats.org/markup-compatibility/2006}"
+_DOCX_BREAK_TEXT = {_W + "tab": "\t", _W + "ptab": "\t", _W + "cr": "\n", _W + "noBreakHyphen": "-"}
+# Separator between the cells of a flattened table row
+DOCX_CELL_SEPARATOR = " | "
+# Decompressed bytes of document.xml read at a time when looking for heading styles
+_DOCX_SCAN_BLOCK = 1024 * 1024
+
+
+class DocxBlock(NamedTuple):
+    """
+    A non-empty DOCX paragraph with its style name and heading level (0 for
+    body text), or a table row flattened to its cells' text (table_row).
+    """
+    text: str
+    style: Optional[str]
+    heading_level: int
+    table_row: bool = False
+
+
+def _iter_docx_segments(path: str,
+                        data: Optional[bytes] = None) -> Iterator[Tuple[Optional[int], str, Optional[int]]]:
+    """
+    (page, text, heading_level) for iter_document. Documents that never use
+    a heading style give None levels, so their headings are detected from
+    the text instead. data is the file content if it is already in memory.
+    """
+    # BytesIO shares the bytes object, nothing is copied
+    with zipfile.ZipFile(io.BytesIO(data) if data is not None else path) as archive:
+        styles = _docx_styles(archive)
+        styled = _docx_uses_heading_styles(archive, styles)
+        for block in _iter_docx_blocks(archive, styles):
+            yield None, block.text, block.heading_level if styled else None
+
+
+def _docx_styles(archive: zipfile.ZipFile) -> Dict[Optional[str], Tuple[str, int]]:
+    """
+    Paragraph style id -> (name, heading level), with the default style
+    under None. Levels come from the style name (Heading N, Title) or its
+    outline level, inherited through basedOn.
+    """
+    from xml.etree import ElementTree
+
+    try:
+        root = ElementTree.fromstring(archive.read("word/styles.xml"))
+    except KeyError:
+        return {}
+    definitions = {}
+    default = None
+    for style in root.iter(_W + "style"):
+        if style.get(_W + "type") != "paragraph":
+            continue
+        style_id = style.get(_W + "styleId")
+        name = style.find(_W + "name")
+        based_on = style.find(_W + "basedOn")
+        outline = style.find(f"{_W}pPr/{_W}outlineLvl")
+        name = name.get(_W_VAL) if name is not None else style_id
+        # Built-in styles are stored under lowercase names ("heading 1"); report them as Word shows them
+        if name.startswith("heading ") or name == "title":
+            name = name.capitalize()
+        definitions[style_id] = (
+            name,
+            based_on.get(_W_VAL) if based_on is not None else None,
+            int(outline.get(_W_VAL)) if outline is not None else None,
+        )
+        if style.get(_W + "default") in ("1", "true"):
+            default = style_id
+
+    def level(style_id: str, seen: frozenset) -> int:
+        name, based_on, outline = definitions[style_id]
+        if docx_heading_level(name):
+            return docx_heading_level(name)
+        if outline is not None:
+            return outline + 1 if outline < 9 else 0
+        if based_on in definitions and based_on not in seen:
+            return level(based_on, seen | {style_id})
+        return 0
+
+    styles = {style_id: (definition[0], level(style_id, frozenset())) for style_id, definition in definitions.items()}
+    if default in styles:
+        styles[None] = styles[default]
+    return styles
+
+
+def _docx_uses_heading_styles(archive: zipfile.ZipFile,
+                              styles: Optional[Dict[Optional[str], Tuple[str, int]]] = None) -> bool:
+    """
+    Whether any paragraph has a heading style or outline level. A byte scan
+    of document.xml, much cheaper than parsing it, so the structure is known
+    before the first paragraph is yielded. styles is _docx_styles(archive)
+    if the caller already has it.
+    """
+    if styles is None:
+        styles = _docx_styles(archive)
+    heading_ids = [style_id for style_id, (_, level) in styles.items() if style_id and level]
+    alternatives = [rb'outlineLvl [^>]*val="[0-8]"']
+    if heading_ids:
+        ids = b"|".join(re.escape(style_id.encode("utf-8")) for style_id in heading_ids)
+        alternatives.append(rb'pStyle [^>]*val="(?:' + ids + rb')"')
+    pattern = re.compile(b"|".join(alternatives))
+    tail = b""
+    with archive.open("word/document.xml") as f:
+        for block in iter(lambda: f.read(_DOCX_SCAN_BLOCK), b""):
+            if pattern.search(tail + block):
+                return True
+            # Keep enough of the block end to match a tag split across blocks
+            tail = block[-256:]
+    return False
+
+
+def _iter_docx_blocks(archive: zipfile.ZipFile,
+                      styles: Optional[Dict[Optional[str], Tuple[str, int]]] = None) -> Iterator[DocxBlock]:
+    """
+    Stream the body of a DOCX file with iterparse instead of building the
+    python-docx object model: paragraphs in document order, each table row
+    as one block (nested tables are folded into their cell). Processed
+    elements are dropped as the parse goes, so memory stays flat however
+    long the document is. Of each mc:AlternateContent only the first
+    Choice (or the Fallback, without one) is read.
+    """
+    from xml.etree.ElementTree import iterparse
+
+    if styles is None:
+        styles = _docx_styles(archive)
+    with archive.open("word/document.xml") as f:
+        body = None
+        # [texts, style id, outline level] of the open paragraphs (text
+        # boxes nest paragraphs inside paragraphs)
+        paragraphs = []
+        table_depth = 0
+        row: List[str] = []
+        cell: List[str] = []
+        # Per open AlternateContent: whether one of its forms was read
+        alternate_read: List[bool] = []
+        skipping = None        # Element whose subtree is being skipped
+        for event, elem in iterparse(f, events=("start", "end")):
+            tag = elem.tag
+            if skipping is not None:
+                if event == "end" and elem is skipping:
+                    skipping = None
+                    elem.clear()
+                continue
+            if event == "start":
+                if tag == _W + "p":
+                    paragraphs.append([[], None, None])
+                elif tag == _W + "tbl":
+                    table_depth += 1
+                elif tag == _W + "tr" and table_depth == 1:
+                    row = []
+                elif tag == _W + "tc" and table_depth == 1:
+                    cell = []
+                elif tag == _W + "body":
+                    body = elem
+                elif tag == _MC + "AlternateContent":
+                    alternate_read.append(False)
+                elif tag in (_MC + "Choice", _MC + "Fallback") and alternate_read:
+                    if alternate_read[-1]:
+                        skipping = elem
+                    alternate_read[-1] = True
+                continue
+
+            if tag == _W + "r" and paragraphs:
+                texts = paragraphs[-1][0]
+                for child in elem:
+                    if child.tag == _W + "t":
+                        texts.append(child.text or "")
+                    elif child.tag == _W + "br":
+                        if child.get(_W + "type", "textWrapping") == "textWrapping":
+                            texts.append("\n")
+                    elif child.tag in _DOCX_BREAK_TEXT:
+                        texts.append(_DOCX_BREAK_TEXT[child.tag])
+            elif tag == _W + "pStyle" and paragraphs and paragraphs[-1][1] is None:
+                paragraphs[-1][1] = elem.get(_W_VAL)
+            elif tag == _W + "outlineLvl" and paragraphs and paragraphs[-1][2] is None:
+                paragraphs[-1][2] = int(elem.get(_W_VAL))
+            elif tag == _W + "p":
+                texts, style_id, outline = paragraphs.pop()
+                text = "".join(texts)
+                if text.strip() and table_depth:
+                    cell.append(text)
+                elif text.strip():
+                    style, level = styles.get(style_id, (style_id, 0))
+                    if outline is not None:
+                        level = outline + 1 if outline < 9 else 0
+                    yield DocxBlock(text, style, level)
+            elif tag == _W + "tc" and table_depth == 1:
+                row.append(" ".join(cell))
+            elif tag == _W + "tr" and table_depth == 1:
+                if any(row):
+                    yield DocxBlock(DOCX_CELL_SEPARATOR.join(row), None, 0, table_row=True)
+                # Long tables are only dropped from the tree when they end, so empty each row
+                elem.clear()
+            elif tag == _W + "tbl":
+                table_depth -= 1
+            elif tag == _MC + "AlternateContent":
+                alternate_read.pop()
+
+            # Top-level blocks are done: drop them from the tree
+            if body is not None and not paragraphs and not table_depth and tag in (_W + "p", _W + "tbl"):
+                body.clear()
 
 
 def _load_txt(path: str) -> str:
     with open(path, "r", encoding="utf-8") as f:
         return f.read()
+
+
+def _iter_txt_blocks(path: str, data: Optional[bytes] = None) -> Iterator[str]:
+    block = []
+    block_size = 0
+    if data is not None:
+        f = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8")
+    else:
+        f = open(path, "r", encoding="utf-8")
+    with f:
+        for line in f:
+            block.append(line)
+            block_size += len(line)
+            if block_size >= TXT_BLOCK_SIZE:
+                yield "".join(block)
+                block, block_size = [], 0
+    if block:
+        yield "".join(block)
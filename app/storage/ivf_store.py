@@ -0,0 +1,455 @@
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.storage.vector_store import VectorStore
+
+# Vectors stored before the index trains its coarse quantizer; until then search is exact
+MIN_TRAIN_SIZE = 4096
+# Training sample per list; k-means on more points barely moves the centroids
+TRAIN_POINTS_PER_LIST = 64
+KMEANS_ITERATIONS = 10
+# Filtered searches over at most this many vectors skip the coarse quantizer and scan exactly
+EXACT_FILTER_SIZE = 20000
+# The quantizer is retrained once the live vectors outgrow its training set this many times over
+RETRAIN_GROWTH = 4
+# The vector files are compacted once more than this fraction of their slots is dead (deleted or replaced)
+COMPACT_DEAD_FRACTION = 0.5
+COMPACT_MIN_ROWS = 1024
+
+
+def quantize(vectors: np.ndarray):
+    """
+    Symmetric per-vector int8 quantization of unit-normalized vectors.
+    Returns (codes, scales) with vector ~= codes * scale.
+    """
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.round(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def train_centroids(vectors: np.ndarray, nlist: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means (cosine) with a few Lloyd iterations."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for list_id in range(nlist):
+            members = vectors[assignment == list_id]
+            if len(members):
+                centroids[list_id] = members.sum(axis=0)
+        centroids = normalize_rows(centroids)
+    return centroids.astype(np.float32)
+
+
+class IVFVectorStore(VectorStore):
+    def __init__(self, db_path: str = "data/ivf_index", nprobe: int = 8, nlist: Optional[int] = None):
+        """
+        In-process IVF index over int8-quantized, memory-mapped vectors.
+        Vectors are appended to flat files and mapped read-only, so resident
+        memory stays small; ids, documents and metadata live in SQLite and are
+        only read for the returned results. Similarity is cosine; distances
+        are reported as 1 - cosine.
+        Several processes may share one index directory: writes hold a file
+        lock, and each process reloads its maps when the stored version
+        moves on.
+        nprobe trades recall for latency: it is the number of inverted lists
+        scanned per query (can also be passed per search). nlist defaults to
+        about 4 * sqrt(N) at training time; the quantizer is retrained as the
+        index grows (RETRAIN_GROWTH) and the files are compacted as deletes
+        accumulate (COMPACT_DEAD_FRACTION).
+        """
+        if not os.path.exists(db_path):
+            os.makedirs(db_path)
+
+        self.db_path = db_path
+        self.nprobe = nprobe
+        self.nlist = nlist
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(os.path.join(db_path, "store.db"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS vectors (
+                id TEXT PRIMARY KEY,
+                row INTEGER,
+                doc_id TEXT,
+                list_id INTEGER,
+                document TEXT,
+                metadata TEXT
+            )
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_vectors_row ON vectors (row)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+
+        self._centroids_path = os.path.join(db_path, "centroids.npy")
+        self._lock_path = os.path.join(db_path, "write.lock")
+        self._writer = None
+        self._load()
+
+    def _load(self):
+        """Rebuild the in-memory row maps and inverted lists from SQLite."""
+        settings = dict(self.conn.execute("SELECT key, value FROM settings"))
+        self.dim = int(settings["dim"]) if "dim" in settings else None
+        self.rows = int(settings.get("rows", 0))
+        self.version = int(settings.get("version", 0))
+        self.segment = int(settings.get("segment", 0))
+        self._codes_path, self._scales_path = self._segment_paths(self.segment)
+        self.centroids = np.load(self._centroids_path) if os.path.exists(self._centroids_path) else None
+
+        self._row_of: Dict[str, int] = {}
+        self._id_of_row: Dict[int, str] = {}
+        self._doc_of_row: Dict[int, str] = {}
+        self._list_of_row = np.full(self.rows, -1, dtype=np.int32)
+        self._alive = np.zeros(self.rows, dtype=bool)
+        doc_rows: Dict[str, List[int]] = {}
+        for chunk_id, row, doc_id, list_id in self.conn.execute("SELECT id, row, doc_id, list_id FROM vectors"):
+            self._row_of[chunk_id] = row
+            self._id_of_row[row] = chunk_id
+            self._list_of_row[row] = list_id
+            self._alive[row] = True
+            self._doc_of_row[row] = doc_id
+            doc_rows.setdefault(doc_id, []).append(row)
+        self._doc_rows = {doc_id: set(rows) for doc_id, rows in doc_rows.items()}
+        # Live vectors when the quantizer was trained (indexes trained before this was recorded count from now)
+        self.trained_size = int(settings.get("trained_size", len(self._row_of) if self.centroids is not None else 0))
+        self._lists: Optional[List[np.ndarray]] = None
+        self._codes = None
+        self._scales = None
+
+    def _segment_paths(self, segment: int):
+        """Codes and scales files of a segment; compaction writes the next segment."""
+        if segment == 0:
+            return os.path.join(self.db_path, "vectors.i8"), os.path.join(self.db_path, "scales.f32")
+        return (os.path.join(self.db_path, f"vectors.{segment}.i8"),
+                os.path.join(self.db_path, f"scales.{segment}.f32"))
+
+    def _refresh(self):
+        """Reload if another process has written since the last load."""
+        row = self.conn.execute("SELECT value FROM settings WHERE key = 'version'").fetchone()
+        if (int(row[0]) if row else 0) != self.version:
+            self._load()
+
+    @contextmanager
+    def _writing(self):
+        """
+        Exclusive write access across processes. Holds an flock on the index
+        directory and loads what other processes committed first, so rows
+        are appended after theirs rather than over them. Re-entrant.
+        """
+        with self._lock:
+            if self._writer is not None:
+                yield
+                return
+            with open(self._lock_path, "a") as writer:
+                fcntl.flock(writer, fcntl.LOCK_EX)
+                self._writer = writer
+                try:
+                    self._refresh()
+                    yield
+                finally:
+                    self._writer = None
+
+    def _bump_version(self):
+        """Called inside each write transaction so other processes reload."""
+        self.version += 1
+        self.conn.execute("INSERT OR REPLACE INTO settings VALUES ('version', ?)", (str(self.version),))
+
+    def _mapped(self):
+        """Read-only memory maps of the stored codes and scales (reopened after appends)."""
+        if self._codes is None and self.rows:
+            self._codes = np.memmap(self._codes_path, dtype=np.int8, mode="r", shape=(self.rows, self.dim))
+            self._scales = np.memmap(self._scales_path, dtype=np.float32, mode="r", shape=(self.rows,))
+        return self._codes, self._scales
+
+    def _inverted_lists(self) -> List[np.ndarray]:
+        if self._lists is None:
+            alive_rows = np.flatnonzero(self._alive)
+            lists = self._list_of_row[alive_rows]
+            order = np.argsort(lists, kind="stable")
+            bounds = np.searchsorted(lists[order], np.arange(len(self.centroids) + 1))
+            self._lists = [alive_rows[order[bounds[i]:bounds[i + 1]]] for i in range(len(self.centroids))]
+        return self._lists
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        if self.centroids is None:
+            return np.full(len(vectors), -1, dtype=np.int32)
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def add_chunks(self, chunks: Optional[List[str]], embeddings: np.ndarray, metadatas: List[Dict[str, Any]],
+                   ids: List[str]):
+        """
+        Append vectors (existing ids are replaced). The coarse quantizer is
+        trained automatically once MIN_TRAIN_SIZE vectors are stored, and
+        retrained whenever their number grows RETRAIN_GROWTH times over.
+        """
+        if not ids:
+            return
+        if chunks is None:
+            chunks = [None] * len(ids)
+        vectors = normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        with self._writing():
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self.conn.execute("INSERT OR REPLACE INTO settings VALUES ('dim', ?)", (str(self.dim),))
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the index ({self.dim})")
+            self.delete([chunk_id for chunk_id in ids if chunk_id in self._row_of])
+
+            # Rows are committed to SQLite after the vectors are written, so
+            # cut off anything a crash left past the last committed row
+            first_row = self.rows
+            codes, scales = quantize(vectors)
+            with open(self._codes_path, "ab") as f:
+                f.truncate(first_row * self.dim)
+                f.write(codes.tobytes())
+            with open(self._scales_path, "ab") as f:
+                f.truncate(first_row * 4)
+                f.write(scales.tobytes())
+
+            new_rows = np.arange(first_row, first_row + len(ids))
+            list_ids = self._assign(vectors)
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT INTO vectors (id, row, doc_id, list_id, document, metadata) VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (chunk_id, int(row), metadata.get("doc_id"), int(list_id), chunk,
+                         json.dumps(metadata, ensure_ascii=False))
+                        for chunk_id, row, list_id, chunk, metadata in zip(ids, new_rows, list_ids, chunks, metadatas)
+                    ]
+                )
+                self.conn.execute("INSERT OR REPLACE INTO settings VALUES ('rows', ?)", (str(first_row + len(ids)),))
+                self._bump_version()
+
+            self.rows = first_row + len(ids)
+            self._list_of_row = np.concatenate([self._list_of_row, list_ids])
+            self._alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+            for chunk_id, row, metadata in zip(ids, new_rows, metadatas):
+                self._row_of[chunk_id] = int(row)
+                self._id_of_row[int(row)] = chunk_id
+                self._doc_of_row[int(row)] = metadata.get("doc_id")
+                self._doc_rows.setdefault(metadata.get("doc_id"), set()).add(int(row))
+            self._codes = self._scales = None
+            self._lists = None
+
+            self._maybe_compact()
+            alive = len(self._row_of)
+            if self.centroids is None and alive >= MIN_TRAIN_SIZE:
+                self.train()
+            elif self.centroids is not None and alive >= self.trained_size * RETRAIN_GROWTH:
+                self.train()
+
+    def train(self):
+        """(Re)train the coarse quantizer on a sample of stored vectors and reassign every vector."""
+        with self._writing():
+            alive_rows = np.flatnonzero(self._alive)
+            if not len(alive_rows):
+                return
+            nlist = self.nlist or max(1, int(4 * np.sqrt(len(alive_rows))))
+            nlist = min(nlist, len(alive_rows))
+            rng = np.random.default_rng(0)
+            sample_size = min(len(alive_rows), nlist * TRAIN_POINTS_PER_LIST)
+            sample = np.sort(rng.choice(alive_rows, sample_size, replace=False))
+            self.centroids = train_centroids(self._dequantize(sample), nlist)
+            # Replaced atomically: other processes may load it at any time
+            with open(self._centroids_path + ".tmp", "wb") as f:
+                np.save(f, self.centroids)
+            os.replace(self._centroids_path + ".tmp", self._centroids_path)
+
+            # Assign in blocks to keep the dequantized working set small
+            for start in range(0, len(alive_rows), 65536):
+                rows = alive_rows[start:start + 65536]
+                self._list_of_row[rows] = self._assign(self._dequantize(rows))
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE vectors SET list_id = ? WHERE row = ?",
+                    [(int(self._list_of_row[row]), int(row)) for row in alive_rows]
+                )
+                self.conn.execute("INSERT OR REPLACE INTO settings VALUES ('trained_size', ?)", (str(len(alive_rows)),))
+                self._bump_version()
+            self.trained_size = len(alive_rows)
+            self._lists = None
+
+    def compact(self):
+        """
+        Rewrite the vector files with only the live vectors, renumbering
+        their rows. Runs automatically from add_chunks and delete once more
+        than COMPACT_DEAD_FRACTION of the slots are dead. The files of the
+        next segment are written first and switched to in the same
+        transaction that renumbers the rows, so a crash leaves either the
+        old or the new index; other processes keep reading the old files
+        until they reload.
+        """
+        with self._writing():
+            alive_rows = np.flatnonzero(self._alive)
+            if len(alive_rows) == self.rows:
+                return
+            old_paths = (self._codes_path, self._scales_path)
+            segment = self.segment + 1
+            codes_path, scales_path = self._segment_paths(segment)
+            codes, scales = self._mapped()
+            with open(codes_path, "wb") as codes_file, open(scales_path, "wb") as scales_file:
+                for start in range(0, len(alive_rows), 65536):
+                    rows = alive_rows[start:start + 65536]
+                    codes_file.write(np.ascontiguousarray(codes[rows]).tobytes())
+                    scales_file.write(np.ascontiguousarray(scales[rows]).tobytes())
+
+            new_row = np.full(self.rows, -1, dtype=np.int64)
+            new_row[alive_rows] = np.arange(len(alive_rows))
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE vectors SET row = ? WHERE id = ?",
+                    [(int(new_row[row]), chunk_id) for chunk_id, row in self._row_of.items()]
+                )
+                self.conn.execute("INSERT OR REPLACE INTO settings VALUES ('rows', ?)", (str(len(alive_rows)),))
+                self.conn.execute("INSERT OR REPLACE INTO settings VALUES ('segment', ?)", (str(segment),))
+                self._bump_version()
+            self._codes = self._scales = None
+            self._load()
+            for path in old_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _maybe_compact(self):
+        dead = self.rows - len(self._row_of)
+        if self.rows >= COMPACT_MIN_ROWS and dead > self.rows * COMPACT_DEAD_FRACTION:
+            self.compact()
+
+    def _dequantize(self, rows: np.ndarray) -> np.ndarray:
+        codes, scales = self._mapped()
+        return codes[rows].astype(np.float32) * scales[rows][:, None]
+
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        if not ids:
+            return
+        with self._writing():
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE vectors SET doc_id = ?, metadata = ? WHERE id = ?",
+                    [(metadata.get("doc_id"), json.dumps(metadata, ensure_ascii=False), chunk_id)
+                     for chunk_id, metadata in zip(ids, metadatas)]
+                )
+                self._bump_version()
+            for chunk_id, metadata in zip(ids, metadatas):
+                row = self._row_of.get(chunk_id)
+                if row is not None:
+                    self._doc_rows[self._doc_of_row[row]].discard(row)
+                    self._doc_of_row[row] = metadata.get("doc_id")
+                    self._doc_rows.setdefault(metadata.get("doc_id"), set()).add(row)
+
+    def delete(self, ids: List[str]):
+        """Drop ids; their vector slots stay in the files until the next compact()."""
+        if not ids:
+            return
+        with self._writing():
+            ids = [chunk_id for chunk_id in ids if chunk_id in self._row_of]
+            if not ids:
+                return
+            with self.conn:
+                self.conn.executemany("DELETE FROM vectors WHERE id = ?", [(chunk_id,) for chunk_id in ids])
+                self._bump_version()
+            for chunk_id in ids:
+                row = self._row_of.pop(chunk_id)
+                del self._id_of_row[row]
+                self._alive[row] = False
+                self._doc_rows[self._doc_of_row.pop(row)].discard(row)
+            self._lists = None
+            self._maybe_compact()
+
+    def _candidates(self, probe: Optional[np.ndarray], allowed: Optional[np.ndarray]) -> np.ndarray:
+        """Rows to score for one query: the probed lists, intersected with the doc_id filter."""
+        if allowed is not None:
+            # Small filtered sets are cheaper (and exact) to scan directly
+            if probe is None or len(allowed) <= EXACT_FILTER_SIZE:
+                return allowed
+        elif probe is None:
+            return np.flatnonzero(self._alive)
+
+        lists = self._inverted_lists()
+        candidates = np.sort(np.concatenate([lists[list_id] for list_id in probe]))
+        if allowed is not None:
+            candidates = candidates[np.isin(candidates, allowed, assume_unique=True)]
+        return candidates
+
+    @staticmethod
+    def _top(scores: np.ndarray, n_results: int) -> np.ndarray:
+        if len(scores) > n_results:
+            top = np.argpartition(-scores, n_results)[:n_results]
+            return top[np.argsort(-scores[top])]
+        return np.argsort(-scores)
+
+    def search(self, query_embedding: List[float], n_results: int = 3, doc_ids: Optional[List[str]] = None,
+               nprobe: Optional[int] = None) -> Dict[str, Any]:
+        return self.search_many([query_embedding], n_results, doc_ids=doc_ids, nprobe=nprobe)
+
+    def search_many(self, query_embeddings: List[List[float]], n_results: int = 3,
+                    doc_ids: Optional[List[str]] = None, nprobe: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Search several queries at once. The coarse quantizer is applied to all
+        queries in one matrix product (and, before training, the exact scan
+        too); documents and metadata are read in one SQL query.
+        """
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if not query_embeddings:
+            return results
+        queries = normalize_rows(np.asarray(query_embeddings, dtype=np.float32))
+        hits = [([], []) for _ in range(len(queries))]
+
+        with self._lock:
+            self._refresh()
+            if self._row_of:
+                codes, scales = self._mapped()
+                allowed = None
+                if doc_ids:
+                    rows = set().union(*(self._doc_rows.get(doc_id, set()) for doc_id in doc_ids))
+                    allowed = np.array(sorted(rows), dtype=np.int64)
+
+                if self.centroids is None:
+                    candidates = allowed if allowed is not None else np.flatnonzero(self._alive)
+                    scores = (codes[candidates] @ queries.T) * scales[candidates][:, None]
+                    for i in range(len(queries)):
+                        top = self._top(scores[:, i], n_results)
+                        hits[i] = (candidates[top].tolist(), scores[top, i].tolist())
+                else:
+                    probes = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :nprobe or self.nprobe]
+                    for i, query in enumerate(queries):
+                        candidates = self._candidates(probes[i], allowed)
+                        scores = (codes[candidates] @ query) * scales[candidates]
+                        top = self._top(scores, n_results)
+                        hits[i] = (candidates[top].tolist(), scores[top].tolist())
+
+            # Read by id under the lock: the connection is shared, and rows are
+            # renumbered by compaction (possibly in another process)
+            ids_of_rows = {row: self._id_of_row[row] for rows, _ in hits for row in rows}
+            all_ids = sorted(set(ids_of_rows.values()))
+            stored_by_id = {}
+            for start in range(0, len(all_ids), 500):
+                batch = all_ids[start:start + 500]
+                placeholders = ", ".join("?" * len(batch))
+                for chunk_id, document, metadata in self.conn.execute(
+                    f"SELECT id, document, metadata FROM vectors WHERE id IN ({placeholders})", batch
+                ):
+                    stored_by_id[chunk_id] = (chunk_id, document, json.loads(metadata))
+        stored = {row: stored_by_id[chunk_id] for row, chunk_id in ids_of_rows.items() if chunk_id in stored_by_id}
+
+        for rows, scores in hits:
+            found = [(stored[row], score) for row, score in zip(rows, scores) if row in stored]
+            results["ids"].append([chunk_id for (chunk_id, _, _), _ in found])
+            results["documents"].append([document for (_, document, _), _ in found])
+            results["metadatas"].append([dict(metadata) for (_, _, metadata), _ in found])
+            results["distances"].append([1.0 - score for _, score in found])
+        return results
@@ -1,29 +1,227 @@
+import logging
+import queue
 import sqlite3
-from typing import List, Dict, Any
+import threading
+import uuid
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import List, Dict, Any, Callable, Iterator, NamedTuple, Optional, Sequence, Tuple
 import os
 
+from app.storage.text_store import TEXT_BLOCK_CHARS, block_range, build_document_text, decompress_block, split_blocks
+from app.utils.arabic_stemmer import index_terms
+from app.utils.lru import LRUCache
+
+# Read-only connections kept for lookups (0 = share the writer connection)
+READ_POOL_SIZE = int(os.getenv("SQL_READ_POOL_SIZE", "8"))
+# Most queued writes committed together in one transaction
+GROUP_COMMIT_MAX_WRITES = 64
+# How chunk text is stored: "inline" in each chunk row, or "compressed" once
+# per document in text_blocks, with chunks keeping only their offsets
+TEXT_STORAGES = ("inline", "compressed")
+TEXT_STORAGE = os.getenv("CHUNK_STORAGE", "inline")
+# Decompressed text blocks kept in memory for hydration
+TEXT_BLOCK_CACHE_SIZE = int(os.getenv("TEXT_BLOCK_CACHE_SIZE", "256"))
+
+# (chunk_id, chunk_index, content, heading, page_start, page_end, char_start, char_end, content_hash)
+ChunkRow = Tuple[str, int, str, Optional[str], Optional[int], Optional[int], Optional[int], Optional[int], Optional[str]]
+
+
+class DocumentWrite(NamedTuple):
+    """
+    A document row with its current chunks and the chunk ids that no longer
+    exist. Chunks listed in kept_chunk_ids are already stored with the same
+    text: only their position metadata is updated, they are not rewritten
+    or re-indexed.
+    """
+    doc_id: str
+    filename: str
+    file_type: str
+    content_hash: Optional[str]
+    source: Optional[str]
+    chunks: List[ChunkRow]
+    stale_chunk_ids: Sequence[str] = ()
+    kept_chunk_ids: Sequence[str] = ()
+
 class SQLDB:
-    def __init__(self, db_path: str = "data/metadata.db"):
+    def __init__(self, db_path: str = "data/metadata.db", read_pool_size: int = READ_POOL_SIZE,
+                 text_storage: str = TEXT_STORAGE):
         """
         Initialize SQLite for structured metadata storage.
+        All writes go through one writer connection owned by a background
+        thread: concurrent writes are queued and committed together (group
+        commit), and each write call returns once its transaction committed.
+        Lookups use a pool of up to read_pool_size read-only WAL connections,
+        so they never wait for the writer or for each other.
+        With text_storage="compressed", documents written through
+        add_documents keep their text once, compressed, in text_blocks;
+        chunk rows hold only offsets into it and are hydrated when read.
         """
+        if text_storage not in TEXT_STORAGES:
+            raise ValueError(f"Unknown text storage '{text_storage}'. Choose one of: {', '.join(TEXT_STORAGES)}")
         db_dir = os.path.dirname(db_path)
         if db_dir and not os.path.exists(db_dir):
             os.makedirs(db_dir)
-            
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+
+        self.db_path = db_path
+        self.text_storage = text_storage
+        # Keyed by (doc_id, text_version, block_index); a rewrite gets a new version
+        self._text_blocks = LRUCache(maxsize=TEXT_BLOCK_CACHE_SIZE)
+        # Transactions are managed explicitly by the writer thread
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._configure_connection(self.conn)
+        self.conn.execute("PRAGMA journal_mode=WAL")
         self._create_tables()
         self._migrate_tables()
+        self._create_indexes()
+        self._create_lexical_index()
+
+        # Private in-memory databases cannot be opened twice
+        self.read_pool_size = read_pool_size if db_path != ":memory:" else 0
+        self._readers: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._reader_count = 0
+        self._reader_lock = threading.Lock()
+        # Serializes use of the writer connection when it also serves reads
+        self._conn_lock = threading.Lock()
+
+        self.write_count = 0
+        self.commit_count = 0
+        self._writes: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="sqldb-writer", daemon=True)
+        self._writer.start()
+
+    @staticmethod
+    def _configure_connection(conn: sqlite3.Connection):
+        """
+        WAL lets readers proceed during writes; synchronous=NORMAL is durable
+        in WAL mode while avoiding an fsync on every commit.
+        """
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA cache_size=-65536")  # 64 MB page cache
+        cursor.execute("PRAGMA mmap_size=268435456")  # 256 MB memory-mapped I/O
+        cursor.execute("PRAGMA temp_store=MEMORY")
+
+    def _write(self, operation: Callable[..., Any], *args) -> Any:
+        """Run operation(*args) on the writer thread and wait until it is committed."""
+        future: Future = Future()
+        self._writes.put((operation, args, future))
+        return future.result()
+
+    def _write_loop(self):
+        while True:
+            item = self._writes.get()
+            if item is None:
+                return
+            group = [item]
+            # Everything queued meanwhile joins this transaction
+            while len(group) < GROUP_COMMIT_MAX_WRITES:
+                try:
+                    item = self._writes.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._writes.put(None)
+                    break
+                group.append(item)
+            self._commit_group(group)
+
+    def _commit_group(self, group: List[tuple]):
+        """
+        One transaction for the whole group. Each write runs in its own
+        savepoint, so a failing write is rolled back alone and reported to
+        its caller while the others still commit.
+        """
+        results = []
+        with self._conn_lock:
+            try:
+                self.conn.execute("BEGIN IMMEDIATE")
+                for operation, args, _ in group:
+                    self.conn.execute("SAVEPOINT write")
+                    try:
+                        results.append((operation(*args), None))
+                        self.conn.execute("RELEASE write")
+                    except Exception as e:
+                        self.conn.execute("ROLLBACK TO write")
+                        self.conn.execute("RELEASE write")
+                        results.append((None, e))
+                self.conn.execute("COMMIT")
+            except Exception as e:
+                if self.conn.in_transaction:
+                    self.conn.execute("ROLLBACK")
+                logging.error(f"❌ SQL group commit of {len(group)} writes failed: {str(e)}")
+                results = [(None, e)] * len(group)
+        self.write_count += len(group)
+        self.commit_count += 1
+        for (_, _, future), (result, error) in zip(group, results):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    @contextmanager
+    def _reader(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a read-only connection, opening one if the pool is not full yet."""
+        if not self.read_pool_size:
+            with self._conn_lock:
+                yield self.conn
+            return
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._reader_lock:
+                if self._reader_count < self.read_pool_size:
+                    self._reader_count += 1
+                    conn = self._open_reader()
+            if conn is None:
+                conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    def _open_reader(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(f"file:{os.path.abspath(self.db_path)}?mode=ro", uri=True, check_same_thread=False)
+        self._configure_connection(conn)
+        conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "writes": self.write_count,
+            "commits": self.commit_count,
+            "writes_per_commit": self.write_count / self.commit_count if self.commit_count else 0.0,
+            "queued_writes": self._writes.qsize(),
+            "read_connections": self._reader_count,
+        }
+
+    def close(self):
+        """Finish queued writes, then close all connections."""
+        self._writes.put(None)
+        self._writer.join()
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        self.conn.close()
 
     def _migrate_tables(self):
         """Ensure schema is up to date."""
         cursor = self.conn.cursor()
-        try:
-            cursor.execute("SELECT heading FROM chunks LIMIT 1")
-        except sqlite3.OperationalError:
-            # Column missing, add it
-            cursor.execute("ALTER TABLE chunks ADD COLUMN heading TEXT")
-            self.conn.commit()
+        migrations = {
+            "documents": [("content_hash", "TEXT"), ("source", "TEXT"), ("text_version", "TEXT")],
+            "chunks": [("heading", "TEXT"), ("page_start", "INTEGER"), ("page_end", "INTEGER"),
+                       ("char_start", "INTEGER"), ("char_end", "INTEGER"), ("content_hash", "TEXT")],
+        }
+        for table, table_columns in migrations.items():
+            columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+            for column, column_type in table_columns:
+                if column not in columns:
+                    # Column missing, add it
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+        self.conn.commit()
 
     def _create_tables(self):
         """Create necessary tables if they don't exist."""
@@ -33,7 +231,10 @@ class SQLDB:
                 id TEXT PRIMARY KEY,
                 filename TEXT,
                 file_type TEXT,
-                upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                content_hash TEXT,
+                source TEXT,
+                text_version TEXT
             )
         ''')
         cursor.execute('''
@@ -43,34 +244,335 @@ class SQLDB:
                 chunk_index INTEGER,
                 content TEXT,
                 heading TEXT,
+                page_start INTEGER,
+                page_end INTEGER,
+                char_start INTEGER,
+                char_end INTEGER,
+                content_hash TEXT,
                 FOREIGN KEY (document_id) REFERENCES documents (id)
             )
         ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS text_blocks (
+                document_id TEXT,
+                block_index INTEGER,
+                codec TEXT,
+                data BLOB,
+                PRIMARY KEY (document_id, block_index)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)")
         self.conn.commit()
 
-    def add_document(self, doc_id: str, filename: str, file_type: str):
+    def _create_indexes(self):
+        """Index chunk lookups so get_chunks does not scan the whole table."""
         cursor = self.conn.cursor()
         cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_chunks_document ON chunks (document_id, chunk_index)"
+        )
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents (content_hash)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_source ON documents (source)")
+        self.conn.commit()
+
+    def _create_lexical_index(self):
+        """
+        FTS5 index over the stemmed, search-normalized terms of each chunk.
+        Index rows share the rowid of their chunk. Databases created before
+        the index existed are backfilled once.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(terms)")
+        indexed = cursor.execute("SELECT COUNT(*) FROM chunks_fts").fetchone()[0]
+        if indexed == 0:
+            # Compressed documents did not exist before the index
+            rows = cursor.execute("SELECT rowid, content FROM chunks").fetchall()
+            cursor.executemany(
+                "INSERT INTO chunks_fts (rowid, terms) VALUES (?, ?)",
+                [(rowid, " ".join(index_terms(content or ""))) for rowid, content in rows]
+            )
+        self.conn.commit()
+
+    def add_document(self, doc_id: str, filename: str, file_type: str):
+        self._write(self._write_document, doc_id, filename, file_type)
+
+    def _write_document(self, doc_id: str, filename: str, file_type: str):
+        self.conn.execute(
             "INSERT INTO documents (id, filename, file_type) VALUES (?, ?, ?)",
             (doc_id, filename, file_type)
         )
-        self.conn.commit()
 
     def add_chunk(self, chunk_id: str, doc_id: str, index: int, content: str, heading: str = None):
+        self._write(self._write_chunk, chunk_id, doc_id, index, content, heading)
+
+    def _write_chunk(self, chunk_id: str, doc_id: str, index: int, content: str, heading: Optional[str]):
         cursor = self.conn.cursor()
         cursor.execute(
             "INSERT INTO chunks (id, document_id, chunk_index, content, heading) VALUES (?, ?, ?, ?, ?)",
             (chunk_id, doc_id, index, content, heading)
         )
-        self.conn.commit()
+        cursor.execute(
+            "INSERT INTO chunks_fts (rowid, terms) VALUES (?, ?)",
+            (cursor.lastrowid, " ".join(index_terms(content)))
+        )
+
+    def add_chunks(self, doc_id: str, chunks: List[ChunkRow],
+                   filename: Optional[str] = None, file_type: Optional[str] = None):
+        """
+        Bulk insert chunks given as ChunkRow tuples in a single
+        transaction. If filename is given, the document row is written in the
+        same transaction.
+        """
+        self._write(self._write_chunks, doc_id, chunks, filename, file_type)
+
+    def _write_chunks(self, doc_id: str, chunks: List[ChunkRow], filename: Optional[str],
+                      file_type: Optional[str]):
+        if filename is not None:
+            self._write_document(doc_id, filename, file_type)
+        self._insert_chunks(doc_id, chunks)
+
+    def add_documents(self, documents: List[DocumentWrite]):
+        """
+        Write several documents in a single transaction: the document row is
+        inserted or updated, stale chunks are deleted and the current chunks
+        are inserted or replaced. Used to flush many files at once and for
+        incremental re-ingestion of changed documents.
+        """
+        self._write(self._write_documents, documents)
+
+    def _write_documents(self, documents: List[DocumentWrite]):
+        self.conn.executemany(
+            "INSERT INTO documents (id, filename, file_type, content_hash, source) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET filename = excluded.filename, file_type = excluded.file_type, "
+            "content_hash = excluded.content_hash, source = excluded.source, upload_date = CURRENT_TIMESTAMP",
+            [(d.doc_id, d.filename, d.file_type, d.content_hash, d.source) for d in documents]
+        )
+        stale = [(chunk_id,) for d in documents for chunk_id in d.stale_chunk_ids]
+        if stale:
+            self._delete_lexical_rows(stale)
+            self.conn.executemany("DELETE FROM chunks WHERE id = ?", stale)
+        for d in documents:
+            row = self.conn.execute("SELECT text_version FROM documents WHERE id = ?", (d.doc_id,)).fetchone()
+            was_compressed = bool(row and row[0])
+            if self.text_storage == "compressed":
+                compressed = self._write_text_blocks(d)
+            else:
+                # Drop text a previous compressed write left behind
+                compressed = False
+                self._delete_text_blocks(d.doc_id)
+            kept = set(d.kept_chunk_ids) if compressed == was_compressed else set()
+            self._insert_chunks(d.doc_id, [c for c in d.chunks if c[0] not in kept], store_content=not compressed)
+            self._update_chunk_positions([c for c in d.chunks if c[0] in kept])
+
+    def _update_chunk_positions(self, chunks: List[ChunkRow]):
+        """Refresh index, heading, pages and offsets of chunks whose text is unchanged."""
+        self.conn.executemany(
+            "UPDATE chunks SET chunk_index = ?, heading = ?, page_start = ?, page_end = ?, char_start = ?, "
+            "char_end = ? WHERE id = ?",
+            [(index, heading, page_start, page_end, start, end, chunk_id)
+             for chunk_id, index, _, heading, page_start, page_end, start, end, _ in chunks]
+        )
+
+    def _write_text_blocks(self, document: DocumentWrite) -> bool:
+        """
+        Replace the stored text of a document with its chunks' text, each
+        character once. Returns False (and stores nothing) when the chunk
+        offsets cannot be trusted, in which case the chunks keep inline text.
+        """
+        self._delete_text_blocks(document.doc_id)
+        text = build_document_text((content, start, end) for _, _, content, _, _, _, start, end, _ in document.chunks)
+        if text is None:
+            return False
+        self.conn.executemany(
+            "INSERT INTO text_blocks (document_id, block_index, codec, data) VALUES (?, ?, ?, ?)",
+            [(document.doc_id, *block) for block in split_blocks(text)]
+        )
+        self.conn.execute(
+            "UPDATE documents SET text_version = ? WHERE id = ?", (uuid.uuid4().hex, document.doc_id)
+        )
+        return True
+
+    def _delete_text_blocks(self, doc_id: str):
+        self.conn.execute("DELETE FROM text_blocks WHERE document_id = ?", (doc_id,))
+        self.conn.execute("UPDATE documents SET text_version = NULL WHERE id = ?", (doc_id,))
+
+    def _insert_chunks(self, doc_id: str, chunks: List[ChunkRow], store_content: bool = True):
+        """
+        Insert or replace chunks and keep their lexical index rows in step.
+        The index terms always come from the chunk text; the text itself is
+        only stored in the row if store_content.
+        """
+        # A replaced chunk gets a new rowid, so drop its old index row first
+        self._delete_lexical_rows([(row[0],) for row in chunks])
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO chunks (id, document_id, chunk_index, content, heading, page_start, page_end, "
+            "char_start, char_end, content_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (chunk_id, doc_id, index, content if store_content else None, *rest)
+                for chunk_id, index, content, *rest in chunks
+            ]
+        )
+        self.conn.executemany(
+            "INSERT INTO chunks_fts (rowid, terms) SELECT rowid, ? FROM chunks WHERE id = ?",
+            [(" ".join(index_terms(content)), chunk_id) for chunk_id, _, content, *_ in chunks]
+        )
+
+    def _delete_lexical_rows(self, chunk_ids: List[Tuple[str]]):
+        self.conn.executemany(
+            "DELETE FROM chunks_fts WHERE rowid = (SELECT rowid FROM chunks WHERE id = ?)", chunk_ids
+        )
+
+    def search_lexical(self, query: str, limit: int = 20,
+                       doc_ids: Optional[List[str]] = None) -> List[Tuple[str, float]]:
+        """
+        BM25 ranking of chunks that contain any of the query terms,
+        optionally restricted to some documents.
+        Returns (chunk_id, score) pairs, best first; lower scores are better,
+        as reported by SQLite's bm25().
+        """
+        terms = list(dict.fromkeys(index_terms(query)))
+        if not terms:
+            return []
+        match = " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        doc_filter = f" AND c.document_id IN ({', '.join('?' * len(doc_ids))})" if doc_ids else ""
+        with self._reader() as conn:
+            return conn.execute(
+                "SELECT c.id, bm25(chunks_fts) AS score FROM chunks_fts JOIN chunks c ON c.rowid = chunks_fts.rowid "
+                f"WHERE chunks_fts MATCH ?{doc_filter} ORDER BY score LIMIT ?",
+                (match, *(doc_ids or []), limit)
+            ).fetchall()
+
+    def get_chunk_results(self, chunk_ids: List[str]) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+        """
+        Content and vector-store style metadata of chunks, keyed by chunk id.
+        Used to hydrate lexical hits that the vector search did not return.
+        """
+        if not chunk_ids:
+            return {}
+        placeholders = ", ".join("?" * len(chunk_ids))
+        with self._reader() as conn:
+            rows = conn.execute(
+                "SELECT c.id, c.content, c.document_id, d.filename, c.chunk_index, c.heading, c.page_start, "
+                "c.page_end, d.text_version, c.char_start, c.char_end "
+                f"FROM chunks c LEFT JOIN documents d ON d.id = c.document_id WHERE c.id IN ({placeholders})",
+                chunk_ids
+            ).fetchall()
+            texts = self._chunk_texts(conn, [(row[2], row[8], row[1], row[9], row[10]) for row in rows])
+        results = {}
+        for (chunk_id, _, doc_id, filename, index, heading, page_start, page_end, *_), content in zip(rows, texts):
+            metadata = {"doc_id": doc_id, "filename": filename, "chunk_index": index}
+            if heading:
+                metadata["heading"] = heading
+            if page_start is not None:
+                metadata["page_start"] = page_start
+                metadata["page_end"] = page_end
+            results[chunk_id] = (content, metadata)
+        return results
+
+    def get_chunk_texts(self, chunk_ids: List[str]) -> Dict[str, str]:
+        """Text of chunks keyed by chunk id, decompressing only the blocks they span."""
+        if not chunk_ids:
+            return {}
+        placeholders = ", ".join("?" * len(chunk_ids))
+        with self._reader() as conn:
+            rows = conn.execute(
+                "SELECT c.id, c.document_id, d.text_version, c.content, c.char_start, c.char_end "
+                f"FROM chunks c LEFT JOIN documents d ON d.id = c.document_id WHERE c.id IN ({placeholders})",
+                chunk_ids
+            ).fetchall()
+            texts = self._chunk_texts(conn, [row[1:] for row in rows])
+        return {row[0]: text for row, text in zip(rows, texts)}
+
+    def _chunk_texts(self, conn: sqlite3.Connection, rows: List[tuple]) -> List[Optional[str]]:
+        """
+        Text of each (doc_id, text_version, content, char_start, char_end)
+        row: inline content as is, otherwise sliced from the document's text
+        blocks, which are read and decompressed once per call (or cached).
+        """
+        needed: Dict[Tuple[str, str], set] = {}
+        for doc_id, version, content, start, end in rows:
+            if content is None and version is not None and start is not None:
+                needed.setdefault((doc_id, version), set()).update(block_range(start, end))
+        blocks: Dict[Tuple[str, str, int], str] = {}
+        for (doc_id, version), indexes in needed.items():
+            missing = []
+            for index in indexes:
+                block = self._text_blocks.get((doc_id, version, index))
+                if block is None:
+                    missing.append(index)
+                else:
+                    blocks[(doc_id, version, index)] = block
+            if missing:
+                # Matching the version keeps blocks of a newer rewrite out of this version's cache entries
+                found = conn.execute(
+                    "SELECT b.block_index, b.codec, b.data FROM text_blocks b JOIN documents d ON d.id = b.document_id "
+                    f"WHERE b.document_id = ? AND d.text_version = ? AND b.block_index IN ({', '.join('?' * len(missing))})",
+                    (doc_id, version, *missing)
+                ).fetchall()
+                for index, codec, data in found:
+                    block = decompress_block(codec, data)
+                    self._text_blocks.put((doc_id, version, index), block)
+                    blocks[(doc_id, version, index)] = block
+
+        texts = []
+        for doc_id, version, content, start, end in rows:
+            if content is not None or version is None or start is None:
+                texts.append(content)
+                continue
+            span = block_range(start, end)
+            try:
+                text = "".join(blocks[(doc_id, version, index)] for index in span)
+            except KeyError:
+                # The document was rewritten between the two queries
+                texts.append(None)
+                continue
+            offset = span.start * TEXT_BLOCK_CHARS
+            texts.append(text[start - offset:end - offset])
+        return texts
+
+    def find_document_by_hash(self, content_hash: str) -> Optional[str]:
+        """Id of a document whose file content has this hash, if any."""
+        with self._reader() as conn:
+            row = conn.execute("SELECT id FROM documents WHERE content_hash = ? LIMIT 1", (content_hash,)).fetchone()
+        return row[0] if row else None
+
+    def find_document_by_source(self, source: str) -> Optional[str]:
+        """Id of the document previously ingested from this source, if any."""
+        with self._reader() as conn:
+            row = conn.execute("SELECT id FROM documents WHERE source = ? LIMIT 1", (source,)).fetchone()
+        return row[0] if row else None
+
+    def get_generation(self) -> int:
+        """Write generation shared by every process using this database."""
+        with self._reader() as conn:
+            row = conn.execute("SELECT value FROM counters WHERE name = 'generation'").fetchone()
+        return row[0] if row else 0
+
+    def bump_generation(self):
+        self._write(self._write_generation)
+
+    def _write_generation(self):
+        self.conn.execute(
+            "INSERT INTO counters (name, value) VALUES ('generation', 1) "
+            "ON CONFLICT (name) DO UPDATE SET value = value + 1"
+        )
+
+    def get_chunk_ids(self, doc_id: str) -> List[str]:
+        with self._reader() as conn:
+            return [row[0] for row in conn.execute("SELECT id FROM chunks WHERE document_id = ?", (doc_id,))]
 
     def get_document_metadata(self, doc_id: str):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM documents WHERE id = ?", (doc_id,))
-        return cursor.fetchone()
+        with self._reader() as conn:
+            return conn.execute("SELECT * FROM documents WHERE id = ?", (doc_id,)).fetchone()
 
     def get_chunks(self, doc_id: str):
-        """Retrieve all chunks for a document ordered by index."""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT content, heading FROM chunks WHERE document_id = ? ORDER BY chunk_index", (doc_id,))
-        return cursor.fetchall()
+        """Retrieve all chunks for a document ordered by index, as (content, heading) rows."""
+        with self._reader() as conn:
+            version = conn.execute("SELECT text_version FROM documents WHERE id = ?", (doc_id,)).fetchone()
+            rows = conn.execute(
+                "SELECT content, heading, char_start, char_end FROM chunks WHERE document_id = ? ORDER BY chunk_index",
+                (doc_id,)
+            ).fetchall()
+            texts = self._chunk_texts(
+                conn, [(doc_id, version[0] if version else None, content, start, end) for content, _, start, end in rows]
+            )
+        return [(text, heading) for text, (_, heading, _, _) in zip(texts, rows)]
@@ -0,0 +1,72 @@
+import zlib
+from typing import Iterable, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Characters of document text per compressed block; a chunk read decompresses only the blocks it spans
+TEXT_BLOCK_CHARS = 32 * 1024
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 9
+
+# (text, start, end) of a chunk in the normalized document text
+ChunkSpan = Tuple[str, Optional[int], Optional[int]]
+
+
+def build_document_text(spans: Iterable[ChunkSpan]) -> Optional[str]:
+    """
+    Rebuild the document text covered by its chunks, each character stored
+    once however much chunks overlap. Text no chunk covers (the whitespace
+    between sentences, skipped heading-only sections) becomes spaces, so
+    chunk offsets stay valid. Returns None if any chunk lacks offsets or
+    does not match the rebuilt text; such documents are stored inline.
+    """
+    spans = sorted(spans, key=lambda span: (span[1] is None, span[1]))
+    parts = []
+    position = 0
+    for text, start, end in spans:
+        if start is None or end is None or end - start != len(text):
+            return None
+        if start > position:
+            parts.append(" " * (start - position))
+            position = start
+        if end > position:
+            parts.append(text[position - start:])
+            position = end
+    document = "".join(parts)
+    if any(document[start:end] != text for text, start, end in spans):
+        return None
+    return document
+
+
+def compress_block(text: str) -> Tuple[str, bytes]:
+    """(codec, data) of a block: zstd when the zstandard package is installed, zlib otherwise."""
+    raw = text.encode("utf-8")
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return "zlib", zlib.compress(raw, ZLIB_LEVEL)
+
+
+def decompress_block(codec: str, data: bytes) -> str:
+    if codec == "zlib":
+        return zlib.decompress(data).decode("utf-8")
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Text block is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    raise ValueError(f"Unknown text block codec: {codec}")
+
+
+def split_blocks(document: str) -> List[Tuple[int, str, bytes]]:
+    """(block_index, codec, data) for each TEXT_BLOCK_CHARS slice of the document."""
+    return [
+        (index, *compress_block(document[start:start + TEXT_BLOCK_CHARS]))
+        for index, start in enumerate(range(0, len(document), TEXT_BLOCK_CHARS))
+    ]
+
+
+def block_range(start: int, end: int) -> range:
+    """Indices of the blocks holding characters [start, end)."""
+    return range(start // TEXT_BLOCK_CHARS, max(end - 1, start) // TEXT_BLOCK_CHARS + 1)
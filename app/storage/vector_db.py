@@ -1,9 +1,11 @@
 import chromadb
 from chromadb.config import Settings
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import os
+import numpy as np
+from app.storage.vector_store import VectorStore
 
-class VectorDB:
+class VectorDB(VectorStore):
     def __init__(self, db_path: str = "data/vector_db"):
         """
         Initialize ChromaDB for semantic storage.
@@ -14,23 +16,53 @@ class VectorDB:
         self.client = chromadb.PersistentClient(path=db_path)
         self.collection = self.client.get_or_create_collection(name="document_chunks")
 
-    def add_chunks(self, chunks: List[str], embeddings: List[List[float]], metadatas: List[Dict[str, Any]], ids: List[str]):
+    def add_chunks(self, chunks: Optional[List[str]], embeddings: np.ndarray, metadatas: List[Dict[str, Any]], ids: List[str]):
         """
         Add chunks with their embeddings and metadata to the vector store.
+        Chroma validates embeddings as Python lists, so arrays are converted here.
         """
         self.collection.add(
-            embeddings=embeddings,
+            embeddings=embeddings.tolist() if isinstance(embeddings, np.ndarray) else embeddings,
             documents=chunks,
             metadatas=metadatas,
             ids=ids
         )
 
-    def search(self, query_embedding: List[float], n_results: int = 3) -> Dict[str, Any]:
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        """
+        Update metadata of existing chunks without touching their embeddings.
+        """
+        if ids:
+            self.collection.update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids: List[str]):
+        """
+        Remove chunks from the vector store.
+        """
+        if ids:
+            self.collection.delete(ids=ids)
+
+    def search(self, query_embedding: List[float], n_results: int = 3,
+               doc_ids: Optional[List[str]] = None) -> Dict[str, Any]:
         """
         Search for the most similar chunks based on a query embedding.
         """
         results = self.collection.query(
             query_embeddings=[query_embedding],
-            n_results=n_results
+            n_results=n_results,
+            where={"doc_id": {"$in": doc_ids}} if doc_ids else None
         )
         return results
+
+    def search_many(self, query_embeddings: List[List[float]], n_results: int = 3,
+                    doc_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Search several query embeddings in one collection query.
+        """
+        if not query_embeddings:
+            return {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        return self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where={"doc_id": {"$in": doc_ids}} if doc_ids else None
+        )
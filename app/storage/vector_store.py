@@ -0,0 +1,73 @@
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Backends selectable with VECTOR_BACKEND
+VECTOR_BACKENDS = ("chroma", "ivf")
+# Result fields holding one list per query
+PER_QUERY_KEYS = ("ids", "documents", "metadatas", "distances", "embeddings", "scores")
+
+
+class VectorStore:
+    """
+    Interface of the semantic stores used by DocumentProcessor.
+    Search results use the Chroma layout: a dict of ids, documents,
+    metadatas and distances, each a list holding one list per query.
+    """
+
+    def add_chunks(self, chunks: Optional[List[str]], embeddings: np.ndarray, metadatas: List[Dict[str, Any]],
+                   ids: List[str]):
+        """
+        Store chunks; embeddings is a float32 array with one row per chunk.
+        chunks is None when the text lives only in SQLite: searches then
+        return None documents, which the caller hydrates.
+        """
+        raise NotImplementedError
+
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    def delete(self, ids: List[str]):
+        raise NotImplementedError
+
+    def search(self, query_embedding: List[float], n_results: int = 3,
+               doc_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Nearest chunks to the query; doc_ids restricts the search to those documents."""
+        raise NotImplementedError
+
+    def search_many(self, query_embeddings: List[List[float]], n_results: int = 3,
+                    doc_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Search several queries sharing one filter; backends override this with a single call."""
+        merged: Dict[str, Any] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for query_embedding in query_embeddings:
+            result = self.search(query_embedding, n_results=n_results, doc_ids=doc_ids)
+            for key in merged:
+                merged[key].extend(result[key])
+        return merged
+
+
+def split_results(results: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Split a multi-query result into one single-query result per query."""
+    per_query = []
+    for i in range(len(results["ids"])):
+        per_query.append({
+            key: [value[i]] if key in PER_QUERY_KEYS and value is not None else value
+            for key, value in results.items()
+        })
+    return per_query
+
+
+def create_vector_store(backend: Optional[str] = None) -> VectorStore:
+    """
+    Build the configured vector store (VECTOR_BACKEND, default "chroma").
+    Backends are imported on demand so unused dependencies are never loaded.
+    """
+    backend = backend or os.getenv("VECTOR_BACKEND", "chroma")
+    if backend == "chroma":
+        from app.storage.vector_db import VectorDB
+        return VectorDB()
+    if backend == "ivf":
+        from app.storage.ivf_store import IVFVectorStore
+        return IVFVectorStore(nprobe=int(os.getenv("IVF_NPROBE", "8")))
+    raise ValueError(f"Unknown vector backend: {backend}")
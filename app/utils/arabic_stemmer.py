@@ -0,0 +1,56 @@
+import re
+from functools import lru_cache
+from typing import List
+
+from app.utils.arabic_cleaner import normalize_arabic_text
+
+# Words: runs of letters/digits (Arabic and Latin), underscores excluded
+WORD_PATTERN = re.compile(r'[^\W_]+')
+
+# Light stemming rules in the style of Light10: conjunction and article
+# prefixes, then common suffixes. Longest affixes are tried first, and a
+# rule only applies if enough of the word remains.
+CONJUNCTION_PREFIX = "و"
+ARTICLE_PREFIXES = ("وال", "بال", "كال", "فال", "لل", "ال")
+SUFFIXES = ("ها", "ان", "ات", "ون", "ين", "يه", "ية", "ه", "ة", "ي")
+
+# Function words (in normalized form) left out of the index: they occur in
+# almost every chunk, add nothing to BM25 ranking and make lookups scan
+# most of the posting lists.
+STOPWORDS = frozenset("""
+في من الي علي عن ان او ام ثم بل لا لم لن ما ماذا هل قد كان كانت يكون تكون ليس
+هذا هذه ذلك تلك هؤلاء الذي التي الذين اللذين اللتين هو هي هم هن انا نحن انت انتم
+كل بعض غير بين عند مع حتي اذا لكن لان كما مثل منذ فيه فيها منه منها عليه عليها
+به بها له لها الا و ف ب ل ك يا اي
+""".split())
+
+
+@lru_cache(maxsize=200000)
+def light_stem(word: str) -> str:
+    """
+    Strip the most frequent Arabic prefixes and suffixes from a normalized word.
+    Non-Arabic words are only lowercased.
+    """
+    word = word.lower()
+    if len(word) > 3 and word.startswith(CONJUNCTION_PREFIX):
+        word = word[1:]
+    for prefix in ARTICLE_PREFIXES:
+        if word.startswith(prefix) and len(word) - len(prefix) > 1:
+            word = word[len(prefix):]
+            break
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) > 1:
+            word = word[:-len(suffix)]
+            break
+    return word
+
+
+def index_terms(text: str) -> List[str]:
+    """
+    Terms used by the lexical index: the text goes through the "search"
+    normalization profile (diacritics and tatweel removed, alef/yeh/digits
+    unified), stopwords are dropped and each word is light-stemmed.
+    Stems are cached, since a corpus reuses a limited vocabulary.
+    """
+    text = normalize_arabic_text(text, profile="search")
+    return [light_stem(word) for word in WORD_PATTERN.findall(text) if word not in STOPWORDS]
@@ -0,0 +1,309 @@
+import bisect
+import cProfile
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Histogram buckets (upper bounds) for stage durations, document sizes and chunk counts
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+BYTES_BUCKETS = tuple(1024 * 4 ** i for i in range(11))  # 1 KB .. 1 GB
+CHUNKS_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Profiles captured on request are written here
+PROFILE_DIR = os.getenv("PROFILE_DIR", "data/profiles")
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                    for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                    for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = SECONDS_BUCKETS):
+        """Cumulative Prometheus histogram; one set of bucket counts per label combination."""
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (the last slot is +Inf), sum, count
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Count, sum and mean per label combination (labels joined with "/")."""
+        with self._lock:
+            return {
+                "/".join(key): {"count": count, "sum": total, "mean": total / count if count else 0.0}
+                for key, (_, total, count) in sorted(self._series.items())
+            }
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        PEAK_RSS_BYTES.set(peak_rss_bytes() or 0)
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "rag_stage_seconds", "Time spent in each pipeline stage, per document or query.", ("pipeline", "stage")))
+DOCUMENT_BYTES = REGISTRY.register(Histogram(
+    "rag_document_bytes", "Size of ingested files.", buckets=BYTES_BUCKETS))
+DOCUMENT_CHUNKS = REGISTRY.register(Histogram(
+    "rag_document_chunks", "Chunks produced per ingested document.", buckets=CHUNKS_BUCKETS))
+RSS_GROWTH_BYTES = REGISTRY.register(Histogram(
+    "rag_rss_growth_bytes",
+    "Increase of the process peak RSS (high-water mark) observed during one document or query.", ("pipeline",),
+    buckets=(0,) + BYTES_BUCKETS))
+ITEMS_TOTAL = REGISTRY.register(Counter(
+    "rag_items_total", "Documents and queries processed, by outcome.", ("pipeline", "status")))
+PEAK_RSS_BYTES = REGISTRY.register(Gauge(
+    "process_peak_rss_bytes", "Peak resident set size of the process."))
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak RSS of this process so far (None where the resource module is unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+class StageTrace:
+    def __init__(self, pipeline: str, label: str = ""):
+        """
+        Per-item (one document or one query) record of stage durations and
+        counts. Time for a stage may be added in several pieces (e.g. a
+        streamed loader); finish() publishes one histogram sample per stage.
+        The RSS growth it reports is how far the process-wide peak RSS rose
+        while the item ran: 0 unless the item (or anything running
+        alongside it) set a new high-water mark, so it is not the item's own
+        allocation; profile_capture traces that.
+        """
+        self.pipeline = pipeline
+        self.label = label
+        self.timings: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.started = time.perf_counter()
+        self.start_rss = peak_rss_bytes()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def count(self, name: str, value: int):
+        self.counts[name] = value
+
+    def iterate(self, items: Iterable, name: str) -> Iterator:
+        """Yield from items, charging the time spent producing each one to stage name."""
+        iterator = iter(items)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(name, time.perf_counter() - start)
+                return
+            self.add(name, time.perf_counter() - start)
+            yield item
+
+    def finish(self, status: str = "ok") -> Dict[str, object]:
+        """Publish the trace to the metrics registry and return it as a dict."""
+        total = time.perf_counter() - self.started
+        for name, seconds in self.timings.items():
+            STAGE_SECONDS.observe(seconds, pipeline=self.pipeline, stage=name)
+        STAGE_SECONDS.observe(total, pipeline=self.pipeline, stage="total")
+        ITEMS_TOTAL.inc(pipeline=self.pipeline, status=status)
+        peak = peak_rss_bytes()
+        summary = {
+            "status": status,
+            "total_seconds": total,
+            "stage_seconds": dict(self.timings),
+            **self.counts,
+            "peak_rss_bytes": peak,
+        }
+        if peak is not None:
+            PEAK_RSS_BYTES.set(peak)
+            if self.start_rss is not None:
+                summary["rss_growth_bytes"] = peak - self.start_rss
+                RSS_GROWTH_BYTES.observe(peak - self.start_rss, pipeline=self.pipeline)
+        if self.pipeline == "ingest" and status != "failed":
+            if "bytes" in self.counts:
+                DOCUMENT_BYTES.observe(self.counts["bytes"])
+            if "chunks" in self.counts:
+                DOCUMENT_CHUNKS.observe(self.counts["chunks"])
+        return summary
+
+
+def memory_stats() -> Dict[str, object]:
+    """Peak RSS of the process and the peak RSS increases observed per pipeline (for /stats)."""
+    return {"peak_rss_bytes": peak_rss_bytes(), "rss_growth_bytes": RSS_GROWTH_BYTES.stats()}
+
+
+def format_trace(summary: Dict[str, object]) -> str:
+    stages = ", ".join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in summary["stage_seconds"].items())
+    return f"{summary['total_seconds'] * 1000:.1f}ms total ({stages})"
+
+
+# cProfile and tracemalloc are process-wide, so one capture runs at a time
+_profile_lock = threading.Lock()
+
+
+@contextmanager
+def profile_capture(label: str, directory: Optional[str] = None, top: int = 25) -> Iterator[Dict[str, str]]:
+    """
+    Profile the enclosed block (CPU with cProfile, allocations with
+    tracemalloc) and write <label>.prof (load with pstats or snakeviz) and
+    <label>.mem.txt (top allocation sites) to PROFILE_DIR.
+    Yields a dict that holds the written paths once the block exits; it
+    stays empty if another capture is already running.
+    """
+    paths: Dict[str, str] = {}
+    if not _profile_lock.acquire(blocking=False):
+        logging.warning(f"⚠️  Profile capture busy, {label} runs unprofiled.")
+        yield paths
+        return
+    directory = directory or PROFILE_DIR
+    profiler = cProfile.Profile()
+    started_tracing = not tracemalloc.is_tracing()
+    try:
+        if started_tracing:
+            tracemalloc.start()
+        profiler.enable()
+        try:
+            yield paths
+        finally:
+            profiler.disable()
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+
+            os.makedirs(directory, exist_ok=True)
+            base = os.path.join(directory, f"{label}-{time.strftime('%Y%m%d-%H%M%S')}")
+            profiler.dump_stats(base + ".prof")
+            with open(base + ".mem.txt", "w", encoding="utf-8") as f:
+                f.write(f"Peak traced memory: {peak / 1024 / 1024:.1f} MB\n")
+                for stat in snapshot.statistics("lineno")[:top]:
+                    f.write(f"{stat}\n")
+            paths.update({"cpu": base + ".prof", "memory": base + ".mem.txt"})
+            logging.info(f"🧪 Profile for {label} written to {base}.prof / .mem.txt")
+    finally:
+        _profile_lock.release()
@@ -0,0 +1,16 @@
+from typing import Dict, List, Tuple
+
+# Damping constant from the original reciprocal rank fusion paper
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """
+    Merge several ranked id lists: each list contributes 1 / (k + rank) to the
+    score of the ids it contains. Returns (id, score) pairs, best first.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
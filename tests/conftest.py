@@ -0,0 +1,46 @@
+import hashlib
+import os
+import sys
+from typing import List
+
+import numpy as np
+import pytest
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.main import DocumentProcessor
+
+EMBEDDING_DIM = 16
+
+
+class FakeEmbedder:
+    """Deterministic stand-in for the sentence-transformers model: one pseudo-random vector per text."""
+
+    model_name = "fake"
+
+    def __init__(self):
+        self.cache = None
+        self.encoded: List[str] = []
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        self.encoded.extend(texts)
+        return np.array([text_vector(text) for text in texts], dtype=np.float32).reshape(len(texts), EMBEDDING_DIM)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_batch(texts).tolist()
+
+
+def text_vector(text: str) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).standard_normal(EMBEDDING_DIM).astype(np.float32)
+
+
+@pytest.fixture
+def processor(tmp_path, monkeypatch):
+    """A DocumentProcessor on the IVF store, with all its files under tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("VECTOR_BACKEND", "ivf")
+    processor = DocumentProcessor(embedder=FakeEmbedder())
+    yield processor
+    processor.sql_db.close()
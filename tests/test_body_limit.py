@@ -0,0 +1,48 @@
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.api.body_limit import BodyLimitMiddleware
+
+LIMIT = 1000
+
+
+async def echo_length(request: Request):
+    return JSONResponse({"length": len(await request.body())})
+
+
+@pytest.fixture
+def client():
+    app = Starlette(routes=[Route("/upload", echo_length, methods=["POST"]),
+                            Route("/other", echo_length, methods=["POST"])])
+    app.add_middleware(BodyLimitMiddleware, path="/upload", max_bytes=LIMIT, detail="too large")
+    return TestClient(app)
+
+
+def chunks(total, size=100):
+    for _ in range(total // size):
+        yield b"x" * size
+
+
+def test_bodies_within_the_limit_pass(client):
+    assert client.post("/upload", content=b"x" * LIMIT).json() == {"length": LIMIT}
+    assert client.post("/upload", content=chunks(LIMIT)).json() == {"length": LIMIT}
+
+
+def test_declared_length_over_the_limit(client):
+    response = client.post("/upload", content=b"x" * (LIMIT + 1))
+    assert response.status_code == 413
+    assert response.json() == {"detail": "too large"}
+
+
+def test_streamed_body_over_the_limit(client):
+    response = client.post("/upload", content=chunks(LIMIT * 3))
+    assert response.status_code == 413
+    assert response.json() == {"detail": "too large"}
+
+
+def test_other_paths_are_not_limited(client):
+    assert client.post("/other", content=b"x" * (LIMIT * 3)).json() == {"length": LIMIT * 3}
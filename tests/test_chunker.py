@@ -0,0 +1,78 @@
+import pytest
+
+from app.benchmark.corpus import CorpusGenerator
+from app.parser.chunker import PREAMBLE_HEADING, StreamingChunker, chunk_spans, chunk_text
+from app.utils.arabic_cleaner import normalize_arabic_text
+
+
+def segments(text, count):
+    """text split at spaces into about count segments, which join back to text with single spaces."""
+    words = text.split(" ")
+    size = len(words) // count + 1
+    return [" ".join(words[i:i + size]) for i in range(0, len(words), size)]
+
+
+def stream(text, count=5, **options):
+    chunker = StreamingChunker(**options)
+    chunks = []
+    for page, segment in enumerate(segments(text, count), start=1):
+        chunks.extend(chunker.feed(segment, page))
+    chunks.extend(chunker.finish())
+    return chunks
+
+
+def structured_document():
+    generator = CorpusGenerator(seed=7)
+    return normalize_arabic_text("\n".join(text for _, text in generator.document(30)))
+
+
+CASES = {
+    "many headings": structured_document(),
+    "two headings": "تمهيد قصير جدا هنا. " + "نص عادي طويل. " * 100 + "الفصل الأول " + "جملة أخرى هنا. " * 100
+                    + "الفصل الثاني " + ("جملة. " * 50).strip(),
+    "no headings": ("نص عادي طويل بدون عناوين. " * 300).strip(),
+    "preamble": "تمهيد طويل. " * 30 + "الفصل الأول " + "جملة أخرى هنا. " * 100 + "الفصل الثاني " + "جملة. " * 50
+                + "الفصل الثالث " + ("جملة. " * 50).strip(),
+}
+
+
+@pytest.mark.parametrize("name", CASES)
+@pytest.mark.parametrize("count", [1, 5, 40])
+def test_streaming_matches_chunk_text(name, count):
+    text = CASES[name]
+    chunks = stream(text, count)
+    assert [(c.start, c.end, c.heading) for c in chunks] == chunk_spans(text)
+    assert [(c.text, c.heading) for c in chunks] == chunk_text(text)
+
+
+def test_preamble_is_introduction():
+    chunks = stream(CASES["preamble"])
+    assert chunks[0].heading == PREAMBLE_HEADING
+    assert [c.heading for c in chunks[-2:]] == ["الفصل الثاني", "الفصل الثالث"]
+
+
+def test_min_headings_zero_sections_at_once():
+    headings = [c.heading for c in stream(CASES["two headings"], min_headings=0)]
+    assert list(dict.fromkeys(headings)) == [None, "الفصل الأول", "الفصل الثاني"]
+
+
+def test_styled_headings_count_towards_the_threshold():
+    body = "فقرة عادية فيها جمل كثيرة. " * 20
+
+    def run(headings):
+        chunker = StreamingChunker()
+        chunks = chunker.feed("مقدمة طويلة بما يكفي لتكون قسما مستقلا في الوثيقة. " * 3, 1, 0)
+        for i in range(headings):
+            chunks += chunker.feed(f"عنوان {i}", 1, 1)
+            chunks += chunker.feed(body, 1, 0)
+        return [c.heading for c in chunks + chunker.finish()]
+
+    assert set(run(2)) == {None}
+    assert run(3) == [PREAMBLE_HEADING, "عنوان 0", "عنوان 1", "عنوان 2"]
+
+
+def test_chunks_carry_their_pages():
+    chunks = stream(CASES["no headings"], count=5)
+    assert chunks[0].page_start == 1
+    assert chunks[-1].page_end == 5
+    assert all(c.page_start <= c.page_end for c in chunks)
@@ -0,0 +1,86 @@
+import os
+import shutil
+
+import pytest
+
+from app.benchmark.corpus import CorpusGenerator
+from app.main import chunk_ids_for
+from app.parser.document import prepare_document
+
+
+@pytest.fixture
+def paragraphs():
+    generator = CorpusGenerator(seed=3)
+    return [" ".join(generator.sentence() for _ in range(12)) for _ in range(8)]
+
+
+def write(path, paragraphs):
+    path.write_text("\n\n".join(paragraphs), encoding="utf-8")
+    return str(path)
+
+
+def stored_documents(processor):
+    with processor.sql_db._reader() as conn:
+        return conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+
+def test_same_source_with_new_content_only_embeds_changed_chunks(processor, tmp_path, paragraphs):
+    path = write(tmp_path / "report.txt", paragraphs)
+    doc_id, _ = processor.process_file(path)
+    old_ids = set(processor.sql_db.get_chunk_ids(doc_id))
+
+    path = write(tmp_path / "report.txt", paragraphs[:4] + ["فقرة جديدة مضافة في المنتصف."] + paragraphs[4:])
+    document = prepare_document(path)
+    plan = processor.plan_document(document, os.path.abspath(path))
+
+    assert plan.status == "updated"
+    assert plan.doc_id == doc_id
+    assert plan.chunk_ids == chunk_ids_for(doc_id, [c.text for c in document.chunks])
+    # Chunks around the edit change, the rest are reused
+    assert 0 < len(plan.new_indices) < len(document.chunks)
+    assert set(plan.stale_ids) == old_ids - set(plan.chunk_ids)
+
+    processor.embedder.encoded.clear()
+    assert processor.process_file(path)[0] == doc_id
+    assert processor.embedder.encoded == [document.chunks[i].text for i in plan.new_indices]
+    assert processor.sql_db.get_chunk_ids(doc_id) == plan.chunk_ids
+    assert stored_documents(processor) == 1
+
+
+def test_same_content_under_new_name_is_a_duplicate(processor, tmp_path, paragraphs):
+    path = write(tmp_path / "report.txt", paragraphs)
+    doc_id, preview = processor.process_file(path)
+    copy = tmp_path / "copy of report.txt"
+    shutil.copy(path, copy)
+
+    processor.embedder.encoded.clear()
+    assert processor.process_file(str(copy)) == (doc_id, preview)
+    assert processor.embedder.encoded == []
+    assert stored_documents(processor) == 1
+
+
+def test_new_source_is_a_new_document(processor, tmp_path, paragraphs):
+    doc_id, _ = processor.process_file(write(tmp_path / "a.txt", paragraphs[:4]))
+    plan = processor.plan_document(prepare_document(write(tmp_path / "b.txt", paragraphs[4:])), "b")
+
+    assert plan.status == "new"
+    assert plan.doc_id != doc_id
+    assert plan.new_indices == list(range(len(plan.chunk_ids)))
+    assert plan.stale_ids == []
+
+
+def test_replace_doc_id(processor, tmp_path, paragraphs):
+    doc_id, _ = processor.process_file(write(tmp_path / "a.txt", paragraphs[:4]), source="upload:a")
+    path = write(tmp_path / "b.txt", paragraphs[:3])
+
+    assert processor.process_file(path, source="upload:b", doc_id=doc_id)[0] == doc_id
+    assert processor.sql_db.get_chunk_ids(doc_id) == chunk_ids_for(doc_id, [c.text for c in prepare_document(path).chunks])
+    assert stored_documents(processor) == 1
+    with pytest.raises(ValueError):
+        processor.plan_document(prepare_document(path), "upload:c", doc_id="missing")
+
+
+def test_writes_bump_the_generation(processor, tmp_path, paragraphs):
+    generation = processor.generation
+    processor.process_file(write(tmp_path / "a.txt", paragraphs))
+    assert processor.generation > generation
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from app.storage import ivf_store
+from app.storage.ivf_store import IVFVectorStore
+
+DIM = 16
+
+
+def vectors(count, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, DIM)).astype(np.float32)
+
+
+def add(store, embeddings, prefix="c", doc_id="doc"):
+    ids = [f"{prefix}{i}" for i in range(len(embeddings))]
+    store.add_chunks([f"text {chunk_id}" for chunk_id in ids], embeddings,
+                     [{"doc_id": doc_id, "chunk_index": i} for i in range(len(ids))], ids)
+    return ids
+
+
+def top_ids(store, embeddings, **options):
+    return [ids[0] if ids else None for ids in store.search_many(embeddings.tolist(), n_results=1, **options)["ids"]]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return IVFVectorStore(str(tmp_path / "ivf"), nprobe=4, nlist=8)
+
+
+def test_search_returns_nearest_with_text_and_metadata(store):
+    embeddings = vectors(50)
+    ids = add(store, embeddings)
+
+    result = store.search(embeddings[7].tolist(), n_results=3)
+    assert result["ids"][0][0] == ids[7]
+    assert result["documents"][0][0] == f"text {ids[7]}"
+    assert result["metadatas"][0][0] == {"doc_id": "doc", "chunk_index": 7}
+    assert result["distances"][0][0] == pytest.approx(0.0, abs=1e-2)
+    assert result["distances"][0] == sorted(result["distances"][0])
+    assert top_ids(store, embeddings) == ids
+
+
+def test_doc_id_filter(store):
+    embeddings = vectors(20)
+    add(store, embeddings[:10], prefix="a", doc_id="a")
+    b_ids = add(store, embeddings[10:], prefix="b", doc_id="b")
+
+    assert top_ids(store, embeddings[:10], doc_ids=["b"])[0] in b_ids
+    assert store.search(embeddings[0].tolist(), n_results=20, doc_ids=["b"])["ids"][0] == \
+        store.search(embeddings[0].tolist(), n_results=20, doc_ids=["b", "missing"])["ids"][0]
+
+    store.update_metadata(["a0"], [{"doc_id": "b"}])
+    assert top_ids(store, embeddings[:1], doc_ids=["b"]) == ["a0"]
+
+
+def test_delete_and_replace(store):
+    embeddings = vectors(30)
+    ids = add(store, embeddings)
+
+    store.delete(ids[:5] + ["missing"])
+    assert all(chunk_id not in ids[:5] for chunk_id in top_ids(store, embeddings))
+    assert top_ids(store, embeddings[5:]) == ids[5:]
+
+    # Adding an existing id replaces its vector
+    store.add_chunks(["moved"], embeddings[:1], [{"doc_id": "doc"}], [ids[10]])
+    assert top_ids(store, embeddings[:1]) == [ids[10]]
+    assert ids[10] not in top_ids(store, embeddings[10:11])
+
+
+def test_trained_index_finds_nearest(store, monkeypatch):
+    monkeypatch.setattr(ivf_store, "MIN_TRAIN_SIZE", 200)
+    centers = vectors(8, seed=1) * 4
+    embeddings = (np.repeat(centers, 50, axis=0) + vectors(400, seed=2)).astype(np.float32)
+    ids = add(store, embeddings)
+
+    assert store.centroids is not None
+    assert top_ids(store, embeddings, nprobe=8) == ids
+    # Probing fewer lists still finds most vectors in their own cluster
+    assert np.mean(np.array(top_ids(store, embeddings)) == np.array(ids)) > 0.9
+
+
+def test_compaction_keeps_results(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(ivf_store, "COMPACT_MIN_ROWS", 16)
+    embeddings = vectors(40)
+    ids = add(store, embeddings)
+
+    store.delete(ids[:30])
+    assert store.rows == 10
+    assert store.segment > 0
+    assert top_ids(store, embeddings[30:]) == ids[30:]
+
+    reopened = IVFVectorStore(str(tmp_path / "ivf"), nprobe=4, nlist=8)
+    assert top_ids(reopened, embeddings[30:]) == ids[30:]
+
+    # Writes from another handle on the same directory are picked up
+    more = vectors(5, seed=3)
+    more_ids = add(reopened, more, prefix="m")
+    assert top_ids(store, more) == more_ids
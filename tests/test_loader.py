@@ -0,0 +1,57 @@
+import zipfile
+
+from app.parser.loader import iter_document
+from app.utils.arabic_cleaner import normalize_arabic_text
+
+W = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+MC = 'xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006"'
+
+STYLES = f"""<?xml version="1.0" encoding="UTF-8"?>
+<w:styles {W}>
+  <w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/></w:style>
+  <w:style w:type="paragraph" w:styleId="Heading1"><w:name w:val="heading 1"/></w:style>
+  <w:style w:type="paragraph" w:styleId="Chapter"><w:name w:val="Chapter"/><w:basedOn w:val="Heading1"/></w:style>
+</w:styles>"""
+
+
+def paragraph(text, style=None):
+    properties = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ""
+    return f"<w:p>{properties}<w:r><w:t>{text}</w:t></w:r></w:p>"
+
+
+def text_box(choice, fallback):
+    return (f"<w:p><w:r><mc:AlternateContent {MC}>"
+            f"<mc:Choice Requires=\"wps\"><w:drawing><w:txbxContent>{paragraph(choice)}</w:txbxContent></w:drawing></mc:Choice>"
+            f"<mc:Fallback><w:pict><w:txbxContent>{paragraph(fallback)}</w:txbxContent></w:pict></mc:Fallback>"
+            f"</mc:AlternateContent></w:r></w:p>")
+
+
+def write_docx(path, body):
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("word/styles.xml", STYLES)
+        archive.writestr("word/document.xml", f'<?xml version="1.0" encoding="UTF-8"?>'
+                                              f"<w:document {W}><w:body>{body}</w:body></w:document>")
+    return str(path)
+
+
+def test_docx_headings_tables_and_text_boxes(tmp_path):
+    table = ("<w:tbl><w:tr>"
+             f"<w:tc>{paragraph('خلية أولى')}</w:tc><w:tc>{paragraph('خلية ثانية')}</w:tc>"
+             "</w:tr></w:tbl>")
+    path = write_docx(tmp_path / "a.docx", paragraph("الباب الأول", "Chapter") + paragraph("نص الفقرة.")
+                      + text_box("داخل الصندوق", "داخل الصندوق") + table)
+
+    # The text box is read once, from its Choice
+    assert [(s.text, s.heading_level) for s in iter_document(path)] == [
+        (normalize_arabic_text(text), level) for text, level in [
+            ("الباب الأول", 1),
+            ("نص الفقرة.", 0),
+            ("داخل الصندوق", 0),
+            ("خلية أولى | خلية ثانية", 0),
+        ]
+    ]
+
+
+def test_docx_without_heading_styles_leaves_detection_to_the_chunker(tmp_path):
+    path = write_docx(tmp_path / "a.docx", paragraph("الفصل الأول") + paragraph("نص الفقرة."))
+    assert [s.heading_level for s in iter_document(path)] == [None, None]
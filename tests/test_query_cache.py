@@ -0,0 +1,22 @@
+from app.api.query_cache import QueryCache
+
+
+def test_results_from_an_older_generation_are_misses():
+    cache = QueryCache()
+    key = cache.result_key([0.1, 0.2], 3, "vector", "سؤال")
+    cache.put_result(key, 1, {"ids": [["a"]]}, 0.01)
+
+    assert cache.get_result(key, 1) == {"ids": [["a"]]}
+    assert cache.get_result(key, 2) is None
+    # The stale entry is dropped, not served again
+    assert cache.get_result(key, 1) is None
+    assert cache.stats()["results"]["invalidated"] == 1
+
+
+def test_result_key():
+    key = QueryCache.result_key([0.1, 0.2], 3, "vector", "سؤال")
+    # Vector results only depend on the embedding
+    assert key == QueryCache.result_key([0.1, 0.2], 3, "vector", "سؤال آخر")
+    assert key != QueryCache.result_key([0.1, 0.2], 5, "vector", "سؤال")
+    assert QueryCache.result_key(None, 3, "lexical", "سؤال") != QueryCache.result_key(None, 3, "lexical", "آخر")
+    assert QueryCache.result_key([0.1], 3, "vector", "", ["b", "a"]) == QueryCache.result_key([0.1], 3, "vector", "", ["a", "b"])
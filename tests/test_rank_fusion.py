@@ -0,0 +1,16 @@
+import pytest
+
+from app.utils.rank_fusion import RRF_K, reciprocal_rank_fusion
+
+
+def test_ids_ranked_by_both_lists_come_first():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a", "d"]])
+
+    assert [item_id for item_id, _ in fused] == ["a", "c", "b", "d"]
+    assert dict(fused)["a"] == pytest.approx(1 / (RRF_K + 1) + 1 / (RRF_K + 2))
+    assert dict(fused)["d"] == pytest.approx(1 / (RRF_K + 3))
+
+
+def test_empty_rankings():
+    assert reciprocal_rank_fusion([]) == []
+    assert reciprocal_rank_fusion([[], ["a"]]) == [("a", pytest.approx(1 / (RRF_K + 1)))]